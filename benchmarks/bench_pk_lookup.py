@@ -0,0 +1,56 @@
+"""
+按主键查询开销对比: sql_filter 每次构建语句 vs 预构建的绑定参数语句(key_lookup_statement)
+
+    python benchmarks/bench_pk_lookup.py
+"""
+
+import timeit
+
+from sqlalchemy import Column, String, create_engine, text
+from sqlalchemy.orm import Session
+
+from bc_fastkit.crud import CRUDBase
+from bc_fastkit.crud.core.query import sql_filter
+from bc_fastkit.model import BaseModel
+
+
+class BenchModel(BaseModel):
+    __tablename__ = "bench_pk_lookup"
+    name = Column(String(32), nullable=False, default="")
+
+
+DDL = """
+CREATE TABLE bench_pk_lookup (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(32) NOT NULL DEFAULT '',
+    create_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+    update_time DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def legacy_get(db: Session, id):
+    return sql_filter(
+        q={"id": id}, query=db.query(BenchModel), model=BenchModel
+    ).first()
+
+
+def main(n: int = 20000):
+    engine = create_engine("sqlite://")
+    # 模型的 server_default 是 MySQL 语法, sqlite 下手工建表
+    with engine.begin() as conn:
+        conn.execute(text(DDL))
+    handler = CRUDBase(BenchModel)
+    with Session(engine) as db:
+        db.add_all([BenchModel(name=f"n{i}") for i in range(100)])
+        db.commit()
+        assert legacy_get(db, 42).id == handler.get(db, 42).id == 42
+        legacy = timeit.timeit(lambda: legacy_get(db, 42), number=n)
+        cached = timeit.timeit(lambda: handler.get(db, 42), number=n)
+    print(f"sql_filter:    {legacy / n * 1e6:.1f} us/op")
+    print(f"cached select: {cached / n * 1e6:.1f} us/op")
+    print(f"speedup:       {legacy / cached:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
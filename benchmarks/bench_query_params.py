@@ -0,0 +1,70 @@
+"""
+CommonQueryParams 解析开销对比: 旧实现(每次编译正则/无缓存/json 标准库) vs 当前实现
+
+    python benchmarks/bench_query_params.py
+"""
+
+import json
+import re
+import timeit
+
+from bc_fastkit.common.query import CommonQueryParams
+
+Q = json.dumps(
+    {
+        "cno": "SO2024",
+        "customerId": [1, 2, 3],
+        "createTime": {"between": ["2024-01-01", "2024-12-31"]},
+        "itemState": {"in": [1, 2]},
+        "remark": "",
+        "sk": "abc",
+        "items": [{"skuId": 1, "warehouseId": 2}],
+    }
+)
+ORDER_BY = "-createTime,customerId"
+
+
+def legacy_hump2underline(hunp_str):
+    p = re.compile(r"([a-z]|\d)([A-Z])")
+    return re.sub(p, r"\1_\2", hunp_str).lower()
+
+
+def legacy_underline2hump(underline_str):
+    return re.sub(r"(_\w)", lambda x: x.group(1)[1].upper(), underline_str)
+
+
+def legacy_deep(data, convert):
+    return {
+        convert(k): legacy_deep(v, convert) if isinstance(v, dict) else v
+        for k, v in data.items()
+    }
+
+
+def legacy_parse():
+    q = {
+        k: v
+        for k, v in legacy_deep(json.loads(Q), legacy_hump2underline).items()
+        if v != "" and not (isinstance(v, list) and len(v) == 0)
+    }
+    order_by = [
+        (i[0] + legacy_hump2underline(i[1:])) if i[0] in "+-" else i
+        for i in ORDER_BY.split(",")
+    ]
+    return legacy_deep(q, legacy_underline2hump), order_by
+
+
+def current_parse():
+    common = CommonQueryParams(q=Q, orderBy=ORDER_BY)
+    return common.to_dict(), common.order_by
+
+
+def main(number: int = 20000):
+    legacy = min(timeit.repeat(legacy_parse, number=number, repeat=5))
+    current = min(timeit.repeat(current_parse, number=number, repeat=5))
+    print(f"legacy : {legacy / number * 1e6:8.2f} us/request")
+    print(f"current: {current / number * 1e6:8.2f} us/request")
+    print(f"saved  : {(legacy - current) / number * 1e6:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,88 @@
+import asyncio
 from functools import wraps
 from typing import List, Optional, Type
 
 from fastapi import APIRouter, HTTPException
 from fastapi.routing import APIRoute
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
 from ..crud import AsyncCRUDBase, CRUDBase
-from ..schema import BaseSchema, CRUSchema
-from .base import CRUDRequestHandler
+from ..schema import (
+    BaseSchema,
+    BulkItemResultSchema,
+    CRUSchema,
+    create_bulk_result_schema,
+    create_changes_response_schema,
+)
+from .base import WRITE_RESPONSE_REQUERY, CRUDRequestHandler
+from .cache import ResponseCache
+from .executor import SessionExecutor, get_session_executor
+from .retry import RetryPolicy
 
 COMMIT_SESSION_METHODS = {"PUT", "POST", "DELETE"}
 
 
-def commit_session(f):
+async def run_session(db: Session | AsyncSession, fn):
+    if isinstance(db, AsyncSession):
+        return await fn()
+    return await get_session_executor(db).run(db, fn)
+
+
+def commit_session(f, retry_policy: Optional[RetryPolicy] = None):
     @wraps(f)
     async def wrapper(*args, **kargs):
-        response = await f(*args, **kargs)
         db = kargs.get("db")
-        if db:
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await f(*args, **kargs)
+            except Exception as e:
+                if db and retry_policy and retry_policy.should_retry(e, attempt):
+                    await run_session(db, db.rollback)
+                    await asyncio.sleep(retry_policy.backoff(attempt))
+                    continue
+                raise
+            if not db:
+                return response
             try:
-                if isinstance(db, AsyncSession):
-                    await db.commit()
-                else:
-                    db.commit()
+                await run_session(db, db.commit)
+                return response
             except Exception as e:
-                if isinstance(db, AsyncSession):
-                    await db.rollback()
-                else:
-                    db.rollback()
+                await run_session(db, db.rollback)
+                if retry_policy and retry_policy.should_retry(
+                    e, attempt, committing=True
+                ):
+                    await asyncio.sleep(retry_policy.backoff(attempt))
+                    continue
                 raise HTTPException(status_code=400, detail=e.args[0])
-        return response
 
     return wrapper
 
 
 class CommitSessionRoute(APIRoute):
+    # 瞬时错误(死锁/锁等待超时)的重试策略, 为 None 时不重试
+    retry_policy: Optional[RetryPolicy] = None
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if set(kwargs["methods"]) & COMMIT_SESSION_METHODS:
-            self.endpoint = commit_session(self.endpoint)
+            self.endpoint = commit_session(self.endpoint, self.retry_policy)
 
 
-def create_commit_session_router(*args, **kwargs) -> "CRUDRouter":
-    kwargs["route_class"] = CommitSessionRoute
+def create_commit_session_router(
+    *args, retry_policy: Optional[RetryPolicy] = None, **kwargs
+) -> "CRUDRouter":
+    kwargs["route_class"] = (
+        type(
+            "RetryCommitSessionRoute",
+            (CommitSessionRoute,),
+            {"retry_policy": retry_policy},
+        )
+        if retry_policy
+        else CommitSessionRoute
+    )
     return CRUDRouter(*args, **kwargs)
 
 
@@ -61,11 +101,41 @@ class CRUDRouter(APIRouter):
         post_response_model: Optional[BaseSchema] = None,
         put_response_model: Optional[BaseSchema] = None,
         delete_response_model: Optional[BaseSchema] = None,
+        lean: bool = False,
+        cache_ttl: Optional[float] = None,
+        cache_maxsize: int = 256,
+        executor: Optional[SessionExecutor] = None,
+        bulk: bool = False,
+        changes: bool = False,
+        write_response: str = WRITE_RESPONSE_REQUERY,
+        serialize_once: bool = False,
+        statement_timeout: Optional[float] = None,
+        cancel_on_disconnect: bool = False,
+        use_primary: bool = False,
     ):
         methods = [m.upper() for m in methods] if methods else list(self.CRUD_METHODS)
 
         def decorator(cls: Type[CRUDRequestHandler]):
-            request_handler = cls(handler, schema, session_dep)
+            request_handler = cls(
+                handler,
+                schema,
+                session_dep,
+                lean=lean,
+                response_cache=(
+                    ResponseCache(ttl=cache_ttl, maxsize=cache_maxsize)
+                    if cache_ttl
+                    else None
+                ),
+                get_response_model=get_response_model,
+                executor=executor,
+                write_response=write_response,
+                serialize_once=serialize_once,
+                post_response_model=post_response_model,
+                put_response_model=put_response_model,
+                statement_timeout=statement_timeout,
+                cancel_on_disconnect=cancel_on_disconnect,
+                use_primary=use_primary,
+            )
             if "GET" in methods:
                 self.add_api_route(
                     path=path,
@@ -94,6 +164,47 @@ class CRUDRouter(APIRouter):
                     response_model=delete_response_model or int,
                     methods=["DELETE"],
                 )
+            if bulk:
+                self.add_bulk_routes(path, request_handler, methods)
+            if changes:
+                self.add_changes_route(path, request_handler)
             return request_handler
 
         return decorator
+
+    def add_bulk_routes(
+        self, path: str, request_handler: CRUDRequestHandler, methods: List[str]
+    ):
+        """{path}/bulk: 数组形式的批量新增/更新/删除, 单个事务, 返回逐条状态"""
+        bulk_path = f"{path.rstrip('/')}/bulk"
+        response_model = List[create_bulk_result_schema(request_handler.schema.R)]
+        if "POST" in methods:
+            self.add_api_route(
+                path=bulk_path,
+                endpoint=request_handler.bulk_post,
+                response_model=response_model,
+                methods=["POST"],
+            )
+        if "PUT" in methods:
+            self.add_api_route(
+                path=bulk_path,
+                endpoint=request_handler.bulk_put,
+                response_model=response_model,
+                methods=["PUT"],
+            )
+        if "DELETE" in methods:
+            self.add_api_route(
+                path=bulk_path,
+                endpoint=request_handler.bulk_delete,
+                response_model=List[BulkItemResultSchema],
+                methods=["DELETE"],
+            )
+
+    def add_changes_route(self, path: str, request_handler: CRUDRequestHandler):
+        """{path}/changes?watermark=: 按 (update_time, id) 增量同步, 包括已删除的行"""
+        self.add_api_route(
+            path=f"{path.rstrip('/')}/changes",
+            endpoint=request_handler.changes,
+            response_model=create_changes_response_schema(request_handler.schema.R),
+            methods=["GET"],
+        )
@@ -1,13 +1,43 @@
 import inspect
-from typing import Any, TypeVar
+from typing import Any, Hashable, List, Optional, Type, TypeVar
 
-from fastapi import Depends
+from fastapi import Body, Depends, HTTPException, Query, Request, Response
+from pydantic_core import to_json
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ..common.query import QUERY_TYPE_OVERALL, CommonQueryParams
+from ..common.query import (
+    LIST_DEFERRED_QUERY_TYPES,
+    QUERY_TYPE_OVERALL,
+    CommonQueryParams,
+)
 from ..crud import AsyncCRUDBase, CRUDBase
-from ..schema import BaseSchema, CRUSchema, QueryResponseSchema
+from ..crud.core.query import decode_watermark
+from ..db import on_model_committed, use_primary
+from ..schema import (
+    BaseSchema,
+    CRUSchema,
+    QueryResponseSchema,
+    RowEncoder,
+    create_partial_schema,
+    create_query_response_schema,
+    date_parser,
+    dump_json,
+    get_row_encoder,
+)
+from .cache import ResponseCache, etag_matches
+from .cancel import STATEMENT_TIMEOUT_KEY, run_cancellable
+from .executor import SessionExecutor, get_session_executor
+
+# 写操作后的响应方式: 重新查询 / 内存中补全 complete_query_result / 直接返回写入的实体
+WRITE_RESPONSE_REQUERY = "requery"
+WRITE_RESPONSE_COMPLETE = "complete"
+WRITE_RESPONSE_ENTITY = "entity"
+WRITE_RESPONSE_STRATEGIES = (
+    WRITE_RESPONSE_REQUERY,
+    WRITE_RESPONSE_COMPLETE,
+    WRITE_RESPONSE_ENTITY,
+)
 
 HandlerType = TypeVar("HandlerType", bound=CRUDBase)
 SessionType = TypeVar("SessionType", bound=Session | AsyncSession)
@@ -29,17 +59,140 @@ class CRUDRequestHandler:
         handler: CRUDBase | AsyncCRUDBase,
         schema: CRUSchema,
         session_dep,
+        lean: bool = False,
+        response_cache: Optional[ResponseCache] = None,
+        get_response_model: Optional[Type] = None,
+        executor: Optional[SessionExecutor] = None,
+        write_response: str = WRITE_RESPONSE_REQUERY,
+        serialize_once: bool = False,
+        post_response_model: Optional[Type] = None,
+        put_response_model: Optional[Type] = None,
+        statement_timeout: Optional[float] = None,
+        cancel_on_disconnect: bool = False,
+        use_primary: bool = False,
     ) -> None:
+        if write_response not in WRITE_RESPONSE_STRATEGIES:
+            raise ValueError(f"不支持的 write_response: {write_response}")
         self.handler = handler
         self.schema = schema
         self.session_dep = session_dep
+        self.lean = lean
+        self.response_cache = response_cache
+        self.get_response_model = get_response_model or schema.QR
+        self.post_response_model = post_response_model or schema.R
+        self.put_response_model = put_response_model or schema.R
+        self.executor = executor
+        self.write_response = write_response
+        self.serialize_once = serialize_once
+        self.statement_timeout = statement_timeout
+        self.cancel_on_disconnect = cancel_on_disconnect
+        self.use_primary = use_primary
+        if lean:
+            # schema 不支持 lean 编码时在注册路由时报错
+            self.get_row_encoder()
+        if response_cache is not None:
+            if self.scopes_query() and (
+                type(self).cache_key_extra is CRUDRequestHandler.cache_key_extra
+            ):
+                raise ValueError(
+                    f"{handler} 重写了 complete_query, 查询结果可能因调用方而不同, 缓存需重写 cache_key_extra"
+                )
+            # 任何途径(其他 handler/服务/后台任务)写入该模型的事务提交后缓存失效
+            on_model_committed(self.model, response_cache.clear)
+
+    def get_row_encoder(self, fields: Optional[List[str]] = None) -> RowEncoder:
+        return get_row_encoder(self.get_response_schema(fields), self.model)
+
+    def normalize_fields(self, fields: Optional[List[str]]) -> Optional[List[str]]:
+        """只保留 schema.R 中的字段并按 schema 的顺序排列, 相同的字段集合共用缓存; 没有有效字段时不裁剪"""
+        if not fields:
+            return None
+        wanted = set(fields)
+        return [f for f in self.schema.R.model_fields if f in wanted] or None
+
+    def get_list_fields(self, common: CommonQueryParams) -> Optional[List[str]]:
+        """
+        列表响应序列化的字段: 指定了 fields 时为 fields
+        否则 search_limit 延迟加载 list_deferred 大字段的查询类型去掉这些字段, 只裁剪序列化, 不影响查询加载的列
+        """
+        fields = self.normalize_fields(common.fields)
+        if fields:
+            return fields
+        if common.query_typ not in LIST_DEFERRED_QUERY_TYPES:
+            return None
+        deferred = set(self.model.list_deferred_column_names)
+        if not deferred & set(self.schema.R.model_fields):
+            return None
+        return [f for f in self.schema.R.model_fields if f not in deferred]
+
+    def get_load_fields(self, common: CommonQueryParams) -> Optional[List[str]]:
+        """指定了 fields 时查询加载的字段: 裁剪后 schema 的全部字段, 包括其基类声明的字段"""
+        fields = self.normalize_fields(common.fields)
+        if not fields:
+            return None
+        return list(self.get_response_schema(fields).model_fields)
+
+    def get_response_schema(self, fields: Optional[List[str]] = None) -> Type:
+        fields = self.normalize_fields(fields)
+        if not fields:
+            return self.schema.R
+        return create_partial_schema(self.schema.R, tuple(fields))
 
     @property
     def model(self):
         return self.handler.model
 
+    async def call(self, db: Session | AsyncSession, fn, *args, **kwargs):
+        """同步 session 的调用放到线程池中执行(同一请求固定同一线程), 异步 session 直接 await"""
+        if self.statement_timeout:
+            db.info[STATEMENT_TIMEOUT_KEY] = self.statement_timeout
+        if self.use_primary:
+            use_primary(db)
+        if isinstance(db, AsyncSession):
+            return await maybe_await(fn(*args, **kwargs))
+        executor = self.executor or get_session_executor(db)
+        return await executor.run(db, fn, *args, **kwargs)
+
+    def scopes_query(self) -> bool:
+        """handler 重写了 complete_query(如按用户/租户过滤)"""
+        return type(self.handler).complete_query not in (
+            CRUDBase.complete_query,
+            AsyncCRUDBase.complete_query,
+        )
+
+    def cache_key_extra(self, request: Request) -> Hashable:
+        """
+        响应缓存 key 中区分调用方的部分, 默认为 Authorization 和 Cookie 请求头
+        查询结果因调用方而不同(如依赖或 complete_query 按租户/用户过滤)时重写, 返回对应的标识
+        """
+        return request.headers.get("authorization"), request.headers.get("cookie")
+
     @property
     def get(self):
+        if self.response_cache is not None:
+
+            async def cached_fn(
+                request: Request,
+                db: self.session_dep,  # type: ignore
+                common=Depends(CommonQueryParams),
+            ) -> Any:
+                return await self.guard(
+                    request, db, self.respond_get_cached(request, db, common)
+                )
+
+            return cached_fn
+
+        if self.cancel_on_disconnect:
+
+            async def cancellable_fn(
+                request: Request,
+                db: self.session_dep,  # type: ignore
+                common=Depends(CommonQueryParams),
+            ) -> Any:
+                return await self.guard(request, db, self.respond_get(db, common))
+
+            return cancellable_fn
+
         async def fn(
             db: self.session_dep,  # type: ignore
             common=Depends(CommonQueryParams),
@@ -48,6 +201,12 @@ class CRUDRequestHandler:
 
         return fn
 
+    async def guard(self, request: Request, db: Session | AsyncSession, aw):
+        """cancel_on_disconnect 时客户端断开即中止正在执行的查询"""
+        if self.cancel_on_disconnect:
+            return await run_cancellable(request, db, aw)
+        return await aw
+
     @property
     def post(self):
         async def fn(
@@ -78,25 +237,165 @@ class CRUDRequestHandler:
 
         return fn
 
+    @property
+    def bulk_post(self):
+        async def fn(
+            data: List[self.schema.C],  # type: ignore
+            db: self.session_dep,  # type: ignore
+        ) -> Any:
+            return await self.respond_bulk_post(db, obj_ins=data)
+
+        return fn
+
+    @property
+    def bulk_put(self):
+        async def fn(
+            data: List[self.schema.U],  # type: ignore
+            db: self.session_dep,  # type: ignore
+        ) -> Any:
+            return await self.respond_bulk_put(db, obj_ins=data)
+
+        return fn
+
+    @property
+    def bulk_delete(self):
+        async def fn(
+            db: self.session_dep,  # type: ignore
+            ids: List[int] = Body(...),
+        ) -> Any:
+            return await self.respond_bulk_delete(db, ids=ids)
+
+        return fn
+
+    @property
+    def changes(self):
+        async def fn(
+            db: self.session_dep,  # type: ignore
+            watermark: Optional[str] = None,
+            limit: int = Query(500, ge=1, le=5000),
+        ) -> Any:
+            return await self.respond_changes(db, watermark=watermark, limit=limit)
+
+        return fn
+
+    async def respond_changes(
+        self, db: Session | AsyncSession, *, watermark: Optional[str], limit: int
+    ):
+        if watermark:
+            try:
+                decode_watermark(watermark)
+            except ValueError:
+                raise HTTPException(
+                    status_code=400, detail=f"错误的watermark:{watermark}"
+                )
+        data, new_watermark = await self.call(
+            db,
+            self.handler.search_changed_since,
+            db,
+            watermark=watermark,
+            limit=limit,
+            typ=QUERY_TYPE_OVERALL,
+        )
+        return {
+            "data_source": data,
+            "watermark": new_watermark,
+            "has_more": len(data) == limit,
+        }
+
     async def respond_get(
         self,
         db: Session | AsyncSession,
         common: CommonQueryParams = CommonQueryParams(),
     ):
-        res = self.handler.search_limit(
+        if self.lean:
+            return await self.respond_get_lean(db, common)
+        fields = self.get_list_fields(common)
+        data, total = await self.call(
+            db,
+            self.handler.search_limit,
             db,
             q=common.q,
             typ=common.query_typ,
             skip=common.skip,
             limit=common.limit,
+            fields=self.get_load_fields(common),
         )
-        data, total = await maybe_await(res)
-        return QueryResponseSchema(
+        content = dict(
             data_source=data,
             total=total,
             query=common.to_dict(),
             update_time=common.update_time,
         )
+        if fields:
+            # 按 fields 裁剪的响应不符合 response_model, 直接序列化返回
+            return self.render(
+                create_query_response_schema(self.get_response_schema(fields)),
+                content,
+            )
+        if self.serialize_once:
+            return self.render(self.get_response_model, content)
+        return QueryResponseSchema(**content)
+
+    async def respond_get_cached(
+        self,
+        request: Request,
+        db: Session | AsyncSession,
+        common: CommonQueryParams,
+    ) -> Response:
+        """命中缓存时不访问数据库, If-None-Match 与 ETag 一致时返回 304"""
+        key = (request.url.path, common.cache_key(), self.cache_key_extra(request))
+        entry = self.response_cache.get(key)
+        if entry is None:
+            # 查询期间有写提交(缓存已失效)时, 查询结果可能是提交前的数据, 不写入缓存
+            generation = self.response_cache.generation
+            res = await self.respond_get(db, common)
+            entry = self.response_cache.set(
+                key, self.render_get_response(res), generation=generation
+            )
+        headers = {"ETag": entry.etag}
+        if etag_matches(entry.etag, request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        return Response(
+            content=entry.body, media_type="application/json", headers=headers
+        )
+
+    def render_get_response(self, res: Any) -> bytes:
+        if isinstance(res, Response):
+            return res.body
+        return dump_json(self.get_response_model, res)
+
+    def render(self, response_model: Any, content: Any) -> Response:
+        """按 response_model 一次校验并输出 JSON, 跳过 FastAPI 对返回值的再次校验和序列化"""
+        return Response(
+            content=dump_json(response_model, content), media_type="application/json"
+        )
+
+    async def respond_get_lean(
+        self,
+        db: Session | AsyncSession,
+        common: CommonQueryParams,
+    ) -> Response:
+        """只查 schema.R 的列, 行元组经预编译编码器直接写成响应体"""
+        encoder = self.get_row_encoder(self.get_list_fields(common))
+        rows, total = await self.call(
+            db,
+            self.handler.search_limit,
+            db,
+            q=common.q,
+            typ=common.query_typ,
+            skip=common.skip,
+            limit=common.limit,
+            lean=True,
+            columns=encoder.columns,
+        )
+        content = {
+            "dataSource": encoder.encode(rows),
+            "total": total,
+            "query": common.to_dict(),
+            "updateTime": date_parser(common.update_time),
+            "message": "",
+        }
+        return Response(content=to_json(content), media_type="application/json")
 
     async def respond_post(
         self,
@@ -104,23 +403,18 @@ class CRUDRequestHandler:
         *,
         obj_in,
     ):
-        entity = await maybe_await(
-            self.handler.create(
-                db,
-                obj_in={
-                    **inner_json_encoder(obj_in),
-                },
-            )
+        entity = await self.call(
+            db,
+            self.handler.create,
+            db,
+            obj_in={
+                **inner_json_encoder(obj_in),
+            },
         )
-        if isinstance(entity, list):
-            res = self.handler.search(
-                db, q={"id": [e.id for e in entity]}, typ=QUERY_TYPE_OVERALL
-            )
-        else:
-            res = self.handler.search_one(
-                db, q={"id": entity.id}, typ=QUERY_TYPE_OVERALL
-            )
-        return await maybe_await(res)
+        res = await self.respond_written(db, entity)
+        if self.serialize_once:
+            return self.render(self.post_response_model, res)
+        return res
 
     async def respond_put(
         self,
@@ -128,14 +422,118 @@ class CRUDRequestHandler:
         *,
         obj_in,
     ):
-        entity = await maybe_await(
-            self.handler.update(
+        entity = await self.call(
+            db,
+            self.handler.update,
+            db,
+            obj_in=inner_json_encoder(obj_in),
+        )
+        res = await self.respond_written(db, entity)
+        if self.serialize_once:
+            return self.render(self.put_response_model, res)
+        return res
+
+    async def respond_written(self, db: Session | AsyncSession, entity):
+        """
+        按 write_response 生成写操作的响应
+        requery: 以 QUERY_TYPE_OVERALL 重新查询, 包含 complete_query 中的关联信息
+        complete: 不再查询, 直接对写入的实体执行 complete_query_result
+        entity: 直接返回写入的实体(create 已 refresh, update 已重新查询, 包括数据库生成的 update_time 等列)
+        """
+        if self.write_response == WRITE_RESPONSE_ENTITY:
+            return entity
+        entities = entity if isinstance(entity, list) else [entity]
+        if self.write_response == WRITE_RESPONSE_COMPLETE:
+            data = await self.call(
                 db,
-                obj_in=inner_json_encoder(obj_in),
+                self.handler.complete_query_result,
+                db,
+                entities,
+                typ=QUERY_TYPE_OVERALL,
             )
+            return data if isinstance(entity, list) else data[0]
+        if isinstance(entity, list):
+            return await self.call(
+                db,
+                self.handler.search,
+                db,
+                q={"id": {"in": [e.id for e in entities]}},
+                typ=QUERY_TYPE_OVERALL,
+            )
+        return await self.call(
+            db,
+            self.handler.search_one,
+            db,
+            q={"id": entity.id},
+            typ=QUERY_TYPE_OVERALL,
         )
-        res = self.handler.search_one(db, q={"id": entity.id}, typ=QUERY_TYPE_OVERALL)
-        return await maybe_await(res)
 
     async def respond_delete(self, db: Session | AsyncSession, *, id: int):
-        return await maybe_await(self.handler.remove(db, id=id))
+        return await self.call(db, self.handler.remove, db, id=id)
+
+    async def respond_bulk_post(self, db: Session | AsyncSession, *, obj_ins):
+        entities = await self.call(
+            db,
+            self.handler.bulk_create,
+            db,
+            obj_ins=[inner_json_encoder(obj_in) for obj_in in obj_ins],
+        )
+        return await self.respond_bulk_result(db, entities, message="未创建")
+
+    async def respond_bulk_put(self, db: Session | AsyncSession, *, obj_ins):
+        entities = await self.call(
+            db,
+            self.handler.bulk_update,
+            db,
+            obj_ins=[inner_json_encoder(obj_in) for obj_in in obj_ins],
+        )
+        return await self.respond_bulk_result(
+            db, entities, message="不存在", ids=[obj_in.id for obj_in in obj_ins]
+        )
+
+    async def respond_bulk_delete(self, db: Session | AsyncSession, *, ids: List[int]):
+        removed = await self.call(db, self.handler.bulk_remove, db, ids=ids)
+        return [
+            {
+                "index": idx,
+                "id": ids[idx],
+                "success": r is not None,
+                "message": "" if r is not None else "不存在",
+            }
+            for idx, r in enumerate(removed)
+        ]
+
+    async def respond_bulk_result(
+        self,
+        db: Session | AsyncSession,
+        entities: List[Any],
+        message: str,
+        ids: Optional[List[int]] = None,
+    ):
+        """一次 search 取回写入结果, 按输入顺序返回逐条状态"""
+        saved_ids = [e.id for e in entities if e is not None]
+        data = (
+            await self.call(
+                db,
+                self.handler.search,
+                db,
+                q={"id": {"in": saved_ids}},
+                typ=QUERY_TYPE_OVERALL,
+            )
+            if saved_ids
+            else []
+        )
+        data_dict = {d.id: d for d in data}
+        return [
+            (
+                {"index": idx, "id": e.id, "data": data_dict.get(e.id)}
+                if e is not None
+                else {
+                    "index": idx,
+                    "id": ids[idx] if ids else None,
+                    "success": False,
+                    "message": message,
+                }
+            )
+            for idx, e in enumerate(entities)
+        ]
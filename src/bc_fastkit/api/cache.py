@@ -0,0 +1,75 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, NamedTuple, Optional
+
+
+class CacheEntry(NamedTuple):
+    body: bytes
+    etag: str
+    expire_at: float
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """If-None-Match 使用弱比较, 支持逗号分隔的多个值和 *"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in if_none_match.split(","))
+
+
+class ResponseCache:
+    """
+    GET 响应缓存: 有界 LRU + TTL, 缓存序列化后的响应体及其强 ETag
+    写入对应模型的事务提交后调用 clear 使整体失效(见 db.on_model_committed), 只在本进程内生效
+    """
+
+    def __init__(self, ttl: float = 5, maxsize: int = 256) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # 每次 clear 加一, 用于丢弃失效前开始的查询结果
+        self.generation = 0
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry.expire_at <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(
+        self, key: Hashable, body: bytes, generation: Optional[int] = None
+    ) -> CacheEntry:
+        """generation 为查询开始时的 self.generation, 之后发生过 clear 时只返回不缓存"""
+        entry = CacheEntry(body, make_etag(body), time.monotonic() + self.ttl)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return entry
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return entry
+
+    def clear(self, *args: Any, **kwargs: Any) -> None:
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import Engine, event, text
+from sqlalchemy.engine import Connection, Dialect
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from ..db import INHERITED_INFO_KEYS
+
+logger = logging.getLogger(__name__)
+
+# session.info 中的键: 语句超时(秒) / 是否记录连接线程 id / 当前事务各连接的 {engine: MySQL 线程 id}
+STATEMENT_TIMEOUT_KEY = "bc_fastkit.statement_timeout"
+CANCELLABLE_KEY = "bc_fastkit.cancellable"
+CONNECTION_THREAD_ID_KEY = "bc_fastkit.connection_thread_ids"
+INHERITED_INFO_KEYS.add(STATEMENT_TIMEOUT_KEY)
+# 语句级 execution option: 语句超时(秒), 由 apply_statement_timeout 设置
+STATEMENT_TIMEOUT_OPTION = "bc_fastkit.statement_timeout"
+
+MYSQL_DIALECTS = ("mysql", "mariadb")
+
+
+def get_connection_thread_id(connection: Connection) -> Optional[int]:
+    """MySQL 连接的服务端线程 id, 兼容 pymysql/mysqlclient(thread_id()) 和 aiomysql(server_thread_id)"""
+    if connection.dialect.name not in MYSQL_DIALECTS:
+        return None
+    driver_connection = connection.connection.driver_connection
+    thread_id = getattr(driver_connection, "thread_id", None)
+    if callable(thread_id):
+        return thread_id()
+    server_thread_id = getattr(driver_connection, "server_thread_id", None)
+    if server_thread_id:
+        return server_thread_id[0]
+    return None
+
+
+@event.listens_for(Session, "after_begin")
+def record_connection_thread_id(session: Session, transaction, connection: Connection):
+    """读写分离时一个事务可能有主库和从库两个连接, 线程 id 按 engine 分别记录"""
+    if not session.info.get(CANCELLABLE_KEY):
+        return
+    thread_id = get_connection_thread_id(connection)
+    if thread_id is not None:
+        session.info.setdefault(CONNECTION_THREAD_ID_KEY, {})[
+            connection.engine
+        ] = thread_id
+
+
+@event.listens_for(Session, "after_transaction_end")
+def clear_connection_thread_id(session: Session, transaction):
+    # 连接归还连接池后可能被其他请求使用, 不能再 KILL
+    if transaction.parent is None:
+        session.info.pop(CONNECTION_THREAD_ID_KEY, None)
+
+
+def is_mariadb(dialect: Dialect) -> bool:
+    # mysql:// 连接到 MariaDB 时 dialect.name 仍为 mysql
+    return dialect.name == "mariadb" or getattr(dialect, "is_mariadb", False)
+
+
+def with_statement_timeout(statement: str, dialect: Dialect, timeout: float) -> str:
+    """
+    MySQL 在最外层 SELECT 加 MAX_EXECUTION_TIME 优化器提示
+    MariaDB 忽略该提示, 改为 SET STATEMENT max_statement_time=... FOR 包裹整条语句
+    """
+    if is_mariadb(dialect):
+        return f"SET STATEMENT max_statement_time={timeout:g} FOR {statement}"
+    head = statement.lstrip()
+    if head[:6].upper() != "SELECT":
+        return statement
+    return f"SELECT /*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */{head[6:]}"
+
+
+@event.listens_for(Session, "do_orm_execute")
+def apply_statement_timeout(state: ORMExecuteState):
+    """MySQL/MariaDB 的 SELECT 记录语句超时, 由 add_statement_timeout 改写最终 SQL, 超时由服务端中止"""
+    timeout = state.session.info.get(STATEMENT_TIMEOUT_KEY)
+    if not timeout or not state.is_select:
+        return
+    bind = state.session.get_bind(**state.bind_arguments)
+    if bind.dialect.name not in MYSQL_DIALECTS:
+        return
+    state.update_execution_options(**{STATEMENT_TIMEOUT_OPTION: timeout})
+
+
+@event.listens_for(Engine, "before_cursor_execute", retval=True)
+def add_statement_timeout(conn, cursor, statement, parameters, context, executemany):
+    # 改写编译后的 SQL: Query.count() 等包裹子查询的语句也加在最外层
+    timeout = (
+        context.execution_options.get(STATEMENT_TIMEOUT_OPTION) if context else None
+    )
+    if timeout:
+        statement = with_statement_timeout(statement, conn.dialect, timeout)
+    return statement, parameters
+
+
+async def kill_query(db: Session | AsyncSession) -> bool:
+    """在连接所属的 engine 上另开连接执行 KILL QUERY, 中止 db 当前事务各连接上正在执行的语句"""
+    thread_ids = dict(db.info.get(CONNECTION_THREAD_ID_KEY) or {})
+    killed = False
+    for engine, thread_id in thread_ids.items():
+        sql = text(f"KILL QUERY {int(thread_id)}")
+        try:
+            if isinstance(db, AsyncSession):
+                async with AsyncEngine(engine).connect() as conn:
+                    await conn.execute(sql)
+            else:
+
+                def kill():
+                    with engine.connect() as conn:
+                        conn.execute(sql)
+
+                await asyncio.get_running_loop().run_in_executor(None, kill)
+            killed = True
+        except Exception:
+            logger.warning("KILL QUERY %s 失败", thread_id, exc_info=True)
+    return killed
+
+
+async def run_cancellable(
+    request: Request,
+    db: Session | AsyncSession,
+    aw: Awaitable[Any],
+    poll_interval: float = 0.2,
+    cancel_timeout: float = 1,
+) -> Any:
+    """
+    执行 aw 的同时检查客户端是否断开, 断开时中止数据库语句并返回 499
+    同步 session 的语句被 KILL 后等待工作线程结束, 避免关闭仍在使用中的 session
+    异步 session 在 KILL 后仍未结束时取消任务(驱动层取消)
+    """
+    db.info[CANCELLABLE_KEY] = True
+    task = asyncio.ensure_future(aw)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=poll_interval)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            break
+    await kill_query(db)
+    if isinstance(db, AsyncSession):
+        done, _ = await asyncio.wait({task}, timeout=cancel_timeout)
+        if not done:
+            task.cancel()
+    await asyncio.wait({task})
+    if not task.cancelled() and task.exception() is not None:
+        logger.info("客户端断开, 已中止查询: %r", task.exception())
+    return Response(status_code=499)
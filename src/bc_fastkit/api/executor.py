@@ -0,0 +1,130 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+SESSION_WORKER_KEY = "bc_fastkit.session_worker"
+
+
+class ExecutorStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.active = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    @property
+    def pending(self) -> int:
+        return self.submitted - self.completed - self.failed - self.active
+
+    def on_submit(self) -> None:
+        with self._lock:
+            self.submitted += 1
+
+    def on_start(self, wait: float) -> None:
+        with self._lock:
+            self.active += 1
+            self.wait_time_total += wait
+            self.wait_time_max = max(self.wait_time_max, wait)
+
+    def on_done(self, ok: bool) -> None:
+        with self._lock:
+            self.active -= 1
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def to_dict(self) -> dict:
+        started = self.completed + self.failed + self.active
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "active": self.active,
+            "pending": self.pending,
+            "wait_time_avg": self.wait_time_total / started if started else 0.0,
+            "wait_time_max": self.wait_time_max,
+        }
+
+
+class SessionExecutor:
+    """
+    同步 session 调用的有界线程池, 避免阻塞的数据库 I/O 占用事件循环
+    每个工作线程是独立的单线程 executor, 同一个 session 首次分配后固定在该线程上执行
+    """
+
+    def __init__(
+        self, max_workers: Optional[int] = None, thread_name_prefix: str = "bc-db"
+    ) -> None:
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self._workers: List[ThreadPoolExecutor] = [
+            ThreadPoolExecutor(1, thread_name_prefix=f"{thread_name_prefix}-{i}")
+            for i in range(self.max_workers)
+        ]
+        self._loads: List[int] = [0] * self.max_workers
+        self._lock = threading.Lock()
+        self.stats = ExecutorStats()
+
+    def _worker_index(self, db: Session) -> int:
+        pinned = db.info.get(SESSION_WORKER_KEY)
+        if pinned is not None and pinned[0] is self:
+            return pinned[1]
+        with self._lock:
+            idx = min(range(self.max_workers), key=self._loads.__getitem__)
+        db.info[SESSION_WORKER_KEY] = (self, idx)
+        return idx
+
+    async def run(self, db: Session, fn: Callable, *args, **kwargs) -> Any:
+        idx = self._worker_index(db)
+        submitted_at = time.perf_counter()
+
+        def task():
+            self.stats.on_start(time.perf_counter() - submitted_at)
+            ok = False
+            try:
+                rs = fn(*args, **kwargs)
+                ok = True
+                return rs
+            finally:
+                self.stats.on_done(ok)
+                with self._lock:
+                    self._loads[idx] -= 1
+
+        with self._lock:
+            self._loads[idx] += 1
+        self.stats.on_submit()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._workers[idx], task
+        )
+
+    def shutdown(self, wait: bool = True) -> None:
+        for worker in self._workers:
+            worker.shutdown(wait=wait)
+
+
+_default_executor: Optional[SessionExecutor] = None
+
+
+def get_session_executor(db: Optional[Session] = None) -> SessionExecutor:
+    """优先返回 session 已固定的 executor, 否则返回(按需创建的)默认 executor"""
+    global _default_executor
+    if db is not None:
+        pinned = db.info.get(SESSION_WORKER_KEY)
+        if pinned is not None:
+            return pinned[0]
+    if _default_executor is None:
+        _default_executor = SessionExecutor()
+    return _default_executor
+
+
+def set_session_executor(executor: SessionExecutor) -> None:
+    global _default_executor
+    _default_executor = executor
@@ -0,0 +1,72 @@
+import random
+import threading
+from typing import Iterable, Optional
+
+from sqlalchemy.exc import DBAPIError
+
+# MySQL: 1213 死锁, 1205 锁等待超时
+MYSQL_DEADLOCK = 1213
+MYSQL_LOCK_WAIT_TIMEOUT = 1205
+DEFAULT_TRANSIENT_CODES = (MYSQL_DEADLOCK, MYSQL_LOCK_WAIT_TIMEOUT)
+
+
+def get_error_code(e: BaseException) -> Optional[int]:
+    """取 DBAPI 异常的错误码(pymysql/aiomysql 为 args[0])"""
+    orig = e.orig if isinstance(e, DBAPIError) else e
+    args = getattr(orig, "args", None)
+    if args and isinstance(args[0], int):
+        return args[0]
+    return None
+
+
+class RetryPolicy:
+    """
+    事务重试策略: 死锁/锁等待超时等瞬时错误回滚后重新执行整个接口事务
+    - 连接失效只在提交前发生时重试; COMMIT 时连接失效无法确定是否已提交, 重试非幂等写可能重复写入
+    - 重试会再次执行接口和 hook, hook 中事务外的副作用(如调用外部服务)需自行保证幂等;
+      call_after_commit 登记的回调只在提交成功后执行一次
+    退避时间为 [0, min(max_delay, base_delay * 2 ** n)] 内的随机值(full jitter)
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.05,
+        max_delay: float = 1.0,
+        transient_codes: Iterable[int] = DEFAULT_TRANSIENT_CODES,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.transient_codes = frozenset(transient_codes)
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.giveups = 0
+
+    def is_transient(self, e: BaseException, committing: bool = False) -> bool:
+        """committing: 异常发生在 COMMIT 时"""
+        if isinstance(e, DBAPIError) and e.connection_invalidated:
+            return not committing
+        return get_error_code(e) in self.transient_codes
+
+    def should_retry(
+        self, e: BaseException, attempt: int, committing: bool = False
+    ) -> bool:
+        """attempt 从 1 开始; 瞬时错误且未达上限时返回 True 并计数"""
+        if not self.is_transient(e, committing):
+            return False
+        with self._lock:
+            if attempt >= self.max_attempts:
+                self.giveups += 1
+                return False
+            self.retries += 1
+        return True
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"retries": self.retries, "giveups": self.giveups}
@@ -0,0 +1,65 @@
+from decimal import Decimal
+from typing import List, Tuple
+
+from .typing import D
+
+# 价格类型: 不含税价 / 含税价
+TAX_TYP_TAX_EXCLUDE = 0
+TAX_TYP_TAX_CONTAIN = 1
+
+
+def compute_item_prices(
+    items: List[D], tax_typ: int
+) -> Tuple[List[Decimal], List[Decimal]]:
+    """
+    逐条计算明细的 (不含税价, 含税价)
+    - 明细没有 price 而有 untaxed_price: 含税价 = 不含税价 * (1 + 税率)
+    - 含税价类型: 不含税价 = price / (1 + 税率), 含税价 = price
+    - 否则: 不含税价 = price, 含税价 = price * (1 + 税率)
+    与原 BillPriceMixIn 的计算完全一致: 不舍入, 使用当前 Decimal 上下文;
+    税率为 int/float 时 1 + 税率 / 100 按 float 计算后转为 Decimal
+    """
+    untaxed: List[Decimal] = []
+    taxed: List[Decimal] = []
+    for i in items:
+        rate = Decimal((1 + i["tax_rate"] / 100))
+        if "price" not in i and "untaxed_price" in i:
+            u = i["untaxed_price"]
+            t = u * rate
+        elif tax_typ == TAX_TYP_TAX_CONTAIN:
+            u = i["price"] / rate
+            t = i["price"]
+        else:
+            u = i["price"]
+            t = i["price"] * rate
+        untaxed.append(u)
+        taxed.append(t)
+    return untaxed, taxed
+
+
+def compute_bill_prices(obj_in: D) -> D:
+    """
+    计算单据明细价格和表头金额, 写回 obj_in
+    明细: untaxed_price / taxed_price, 并带上表头的 currency_id/currency_rate/discount/tax_typ
+    表头: 未指定时 untaxed_amount / taxed_amount = discount * sum(明细价格 * 数量)
+    """
+    items = obj_in["items"]
+    untaxed, taxed = compute_item_prices(items, obj_in["tax_typ"])
+    shared = {
+        k: obj_in[k]
+        for k in ("currency_id", "currency_rate", "discount", "tax_typ")
+        if k in obj_in
+    }
+    for i, u, t in zip(items, untaxed, taxed):
+        i.update(shared)
+        i["untaxed_price"] = u
+        i["taxed_price"] = t
+    if not obj_in.get("untaxed_amount"):
+        obj_in["untaxed_amount"] = obj_in["discount"] * sum(
+            [u * i["quantity"] for u, i in zip(untaxed, items)]
+        )
+    if not obj_in.get("taxed_amount"):
+        obj_in["taxed_amount"] = obj_in["discount"] * sum(
+            [t * i["quantity"] for t, i in zip(taxed, items)]
+        )
+    return obj_in
@@ -2,13 +2,21 @@ import json
 from datetime import datetime
 from typing import List, Optional
 
-from .uitls import deep_hump2underline, deep_underline2hump, hump2underline
+from .uitls import (
+    deep_hump2underline,
+    deep_underline2hump,
+    hump2underline,
+    json_loads,
+    underline2hump,
+)
 
 QUERY_TYPE_SIMPLE = 0
 QUERY_TYPE_OVERALL = 1
 QUERY_TYPE_WORKBENCH = 2
 QUERY_TYPE_AGGREGATION = 4
 QUERY_TYPE_PRINT = 5
+# 列表查询延迟加载 list_deferred 大字段的查询类型
+LIST_DEFERRED_QUERY_TYPES = (QUERY_TYPE_SIMPLE, QUERY_TYPE_OVERALL)
 
 
 class CommonQueryParams:
@@ -21,26 +29,27 @@ class CommonQueryParams:
         limit: int = 20,
         orderBy: Optional[str] = None,
         typ: int = QUERY_TYPE_SIMPLE,
+        fields: Optional[str] = None,
     ):
-        self.q = (
-            q
-            if isinstance(q, dict)
-            else (
-                {
-                    k: v
-                    for k, v in deep_hump2underline(json.loads(q)).items()
-                    if v != "" and not (isinstance(v, list) and len(v) == 0)
-                }
-                if q
-                else {}
-            )
-        )
+        self.q = q if isinstance(q, dict) else self._parse_q(q)
         self.skip = skip
         self.limit = limit
         self.order_by = self._parse_order_by(orderBy)
         self.typ = typ
+        self.fields = self._parse_fields(fields)
         self.update_time = datetime.now()
 
+    @staticmethod
+    def _parse_q(q: Optional[str]) -> dict:
+        """解析前端传入的 q json 字符串, key 驼峰转蛇形, 去掉空字符串和空列表条件"""
+        if not q:
+            return {}
+        return {
+            k: v
+            for k, v in deep_hump2underline(json_loads(q)).items()
+            if v != "" and v != []
+        }
+
     @staticmethod
     def _parse_order_by(orderBy: Optional[str]) -> Optional[List[str]]:
         """解析前端传入的 orderBy 逗号分隔字符串, 如 '-sharpe,fitness', 字段名驼峰转蛇形"""
@@ -57,14 +66,44 @@ class CommonQueryParams:
                 result.append(hump2underline(item))
         return result or None
 
+    @staticmethod
+    def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+        """解析前端传入的 fields 逗号分隔字符串, 如 'id,name,createTime', 字段名驼峰转蛇形"""
+        if not fields:
+            return None
+        result = []
+        for item in fields.split(","):
+            item = item.strip()
+            if item:
+                result.append(hump2underline(item))
+        return result or None
+
     @property
     def query_typ(self):
         return self.typ
 
+    def cache_key(self) -> str:
+        """规范化后的查询参数, 用作响应缓存 key"""
+        return json.dumps(
+            {
+                "q": self.q,
+                "skip": self.skip,
+                "limit": self.limit,
+                "typ": self.typ,
+                "order_by": self.order_by,
+                "fields": self.fields,
+            },
+            sort_keys=True,
+            default=str,
+        )
+
     def to_dict(self):
-        return {
+        rs = {
             "q": deep_underline2hump(self.q),
             "skip": self.skip,
             "limit": self.limit,
             "typ": self.typ,
         }
+        if self.fields:
+            rs["fields"] = [underline2hump(f) for f in self.fields]
+        return rs
@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 
 
 class ClassPropertyDescriptor(object):
@@ -30,19 +31,25 @@ def classproperty(func):
     return ClassPropertyDescriptor(func)
 
 
+# 匹配小写字母(或数字)和大写字母的分界位置
+HUMP_RE = re.compile(r"([a-z]|\d)([A-Z])")
+UNDERLINE_RE = re.compile(r"(_\w)")
+# key 的词汇量很小, 有界缓存即可覆盖
+KEY_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
 def hump2underline(hunp_str):
     """
     驼峰形式字符串转成下划线形式
     :param hunp_str: 驼峰形式字符串
     :return: 字母全小写的下划线形式字符串
     """
-    # 匹配正则，匹配小写字母和大写字母的分界位置
-    p = re.compile(r"([a-z]|\d)([A-Z])")
     # 这里第二个参数使用了正则分组的后向引用
-    sub = re.sub(p, r"\1_\2", hunp_str).lower()
-    return sub
+    return HUMP_RE.sub(r"\1_\2", hunp_str).lower()
 
 
+@lru_cache(maxsize=KEY_CACHE_SIZE)
 def underline2hump(underline_str):
     """
     下划线形式字符串转成驼峰形式
@@ -50,19 +57,27 @@ def underline2hump(underline_str):
     :return: 驼峰形式字符串
     """
     # 这里re.sub()函数第二个替换参数用到了一个匿名回调函数，回调函数的参数x为一个匹配对象，返回值为一个处理后的字符串
-    sub = re.sub(r"(_\w)", lambda x: x.group(1)[1].upper(), underline_str)
-    return sub
+    return UNDERLINE_RE.sub(lambda x: x.group(1)[1].upper(), underline_str)
+
+
+def _deep_convert(data, convert):
+    if isinstance(data, dict):
+        return {convert(k): _deep_convert(v, convert) for k, v in data.items()}
+    if isinstance(data, list):
+        return [_deep_convert(v, convert) for v in data]
+    return data
 
 
 def deep_hump2underline(data: dict):
-    rs = {}
-    for k, v in data.items():
-        rs[hump2underline(k)] = deep_hump2underline(v) if isinstance(v, dict) else v
-    return rs
+    return _deep_convert(data, hump2underline)
 
 
 def deep_underline2hump(data: dict):
-    rs = {}
-    for k, v in data.items():
-        rs[underline2hump(k)] = deep_underline2hump(v) if isinstance(v, dict) else v
-    return rs
+    return _deep_convert(data, underline2hump)
+
+
+# orjson 为可选依赖(bc-fastkit[fast])
+try:
+    from orjson import loads as json_loads  # noqa: F401
+except ImportError:  # pragma: no cover
+    from json import loads as json_loads  # noqa: F401
@@ -1,5 +1,29 @@
 from .base import CRUDBase, CRUDHookMixin
 from .base.async_base import AsyncCRUDBase
+from .base.mixin.async_item import AsyncCRUDItemMixin
+from .base.mixin.async_price import AsyncBillPriceMixIn
+from .base.mixin.async_relation import AsyncCRUDRelationMixin
+from .base.mixin.async_subject import AsyncCUDSubjectMixin
+from .base.mixin.item import CRUDItemMixin
+from .base.mixin.price import BillPriceMixIn
+from .base.mixin.relation import CRUDRelationMixin, Relation
+from .base.mixin.subject import CRUDEvent, CUDSubjectMixin, create_crud_event_bus
 from .core.typing import ModelType
 
-__all__ = ["CRUDBase", "ModelType", "CRUDHookMixin", "AsyncCRUDBase"]
+__all__ = [
+    "CRUDBase",
+    "ModelType",
+    "CRUDHookMixin",
+    "AsyncCRUDBase",
+    "CRUDRelationMixin",
+    "AsyncCRUDRelationMixin",
+    "Relation",
+    "CRUDItemMixin",
+    "AsyncCRUDItemMixin",
+    "BillPriceMixIn",
+    "AsyncBillPriceMixIn",
+    "CUDSubjectMixin",
+    "AsyncCUDSubjectMixin",
+    "CRUDEvent",
+    "create_crud_event_bus",
+]
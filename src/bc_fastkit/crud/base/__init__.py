@@ -1,22 +1,51 @@
 # type: ignore
-from datetime import date
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 from typing import Any, Dict, Generator, List, Optional, Tuple, Type
 
-from sqlalchemy.orm import Query, Session
+from sqlalchemy import func, select
+from sqlalchemy.orm import Query, Session, defer, load_only
 
-from ...common.query import QUERY_TYPE_OVERALL, QUERY_TYPE_SIMPLE
+from ...common.query import (
+    LIST_DEFERRED_QUERY_TYPES,
+    QUERY_TYPE_OVERALL,
+    QUERY_TYPE_SIMPLE,
+)
 from ...common.typing import DATE_FORMAT, DATETIME_FORMAT, D, date_re, datetime_re
+from ...db import (
+    USE_PRIMARY_OPTION,
+    can_create_sibling,
+    create_sibling_session,
+    has_uncommitted_writes,
+)
 from ...model import BaseModel
+from ...utils.singleflight import SingleFlight
 from ..core.cud import (
     ModelType,
     db_create,
     db_create_or_update,
+    db_multi_add,
     db_multi_create,
+    db_multi_remove,
+    db_multi_update,
     db_remove,
     db_update,
 )
-from ..core.query import sql_filter, uniform_regexp_string
+from ..core.query import (
+    KEY_PARAM,
+    KEYS_PARAM,
+    changed_since_statement,
+    chunked,
+    encode_watermark,
+    group_rows,
+    index_rows,
+    key_lookup_statement,
+    search_key,
+    sql_fetch_by_keys,
+    sql_filter,
+    uniform_regexp_string,
+    unique_ids,
+)
 
 # from .mixin.subject import CUDSubjectMixin
 from .mixin.hook import CRUDHookMixin
@@ -26,38 +55,137 @@ class CRUDBase(
     # CUDSubjectMixin[ModelType],
     CRUDHookMixin[ModelType],
 ):
+    # 并发的相同 lean search_limit 合并为一次数据库执行
+    coalesce_search = False
+    # 读写分离时该 handler 的读也走主库
+    use_primary = False
+    # gets 单条 IN 语句的最大 id 数
+    gets_chunk_size = 1000
+    # search_changed_since 只返回早于数据库当前时间这么多秒的变更, 0 时不限制
+    # update_time 是语句执行时间而不是提交时间, 需不小于最长写事务的时长, 否则这类事务的行可能被跳过
+    changes_settle_seconds = 1
+    # after_update 收到的 prev: True 时为更新前实体的非持久化副本(copy()), False 时为 to_dict()
+    # AsyncCRUDBase 默认为 False
+    prev_as_entity = True
+
     def __init__(self, model: Type[ModelType]):
         self.model = model
 
+    def get_update_prev(self, entity: ModelType) -> Any:
+        """after_update 收到的 prev, 见 prev_as_entity"""
+        return entity.copy() if self.prev_as_entity else entity.to_dict()
+
+    def base_query(self, db: Session, *entities) -> Query:
+        """所有查询的起点, use_primary 时标记为强制走主库(读写分离)"""
+        query = db.query(*(entities or (self.model,)))
+        if self.use_primary:
+            query = query.execution_options(**{USE_PRIMARY_OPTION: True})
+        return query
+
+    def key_statement(
+        self, column: str = "id", many=False, for_update=False, columns=()
+    ):
+        return key_lookup_statement(
+            self.model,
+            column,
+            many=many,
+            for_update=for_update,
+            execution_options=((USE_PRIMARY_OPTION, True),) if self.use_primary else (),
+            columns=tuple(columns),
+        )
+
     def get(self, db: Session, id: Any) -> Optional[ModelType]:
-        return sql_filter(
-            q={"id": id}, query=db.query(self.model), model=self.model
-        ).first()
-
-    def gets(self, db: Session, ids: List[int] = None) -> List[ModelType]:
-        return sql_filter(
-            q={"id": ids} if ids is not None else {},
-            query=db.query(self.model),
-            model=self.model,
-        ).all()
+        if id is None:
+            return None
+        return db.execute(self.key_statement(), {KEY_PARAM: id}).scalars().first()
 
-    def gets_dict(self, db: Session, ids: List[int] = None) -> Dict[int, ModelType]:
-        entities = self.gets(db, ids)
+    def gets(
+        self, db: Session, ids: List[int] = None, allow_full_table: bool = False
+    ) -> List[ModelType]:
+        """
+        按 ids 批量查询, ids 去重后按 gets_chunk_size 分块执行 IN 查询, 结果按 ids 顺序返回
+        ids 为 None 时查询全表, 需显式 allow_full_table=True
+        """
+        if ids is None:
+            if not allow_full_table:
+                raise ValueError(
+                    f"{self.model.__name__}.gets 未指定 ids, 全表查询需 allow_full_table=True"
+                )
+            return sql_filter(q={}, query=self.base_query(db), model=self.model).all()
+        ids = unique_ids(ids)
+        entity_dict = {}
+        for chunk in chunked(ids, self.gets_chunk_size):
+            for e in db.execute(
+                self.key_statement(many=True), {KEYS_PARAM: chunk}
+            ).scalars():
+                entity_dict[e.id] = e
+        return [entity_dict[id] for id in ids if id in entity_dict]
+
+    def gets_dict(
+        self, db: Session, ids: List[int] = None, allow_full_table: bool = False
+    ) -> Dict[int, ModelType]:
+        entities = self.gets(db, ids, allow_full_table=allow_full_table)
         return {e.id: e for e in entities}
 
+    def fetch_by_keys(
+        self,
+        db: Session,
+        column: str,
+        keys: List[Any],
+        columns: Optional[List[str]] = None,
+    ) -> List[Any]:
+        """按 column IN keys 分块查询, columns 不为空时返回只含 column 及这些列的 Row"""
+        return sql_fetch_by_keys(
+            db,
+            self.key_statement(column, many=True, columns=columns or ()),
+            keys,
+            self.gets_chunk_size,
+            scalars=not columns,
+        )
+
+    def group_by(
+        self,
+        db: Session,
+        column: str,
+        keys: List[Any],
+        columns: Optional[List[str]] = None,
+    ) -> Dict[Any, List[Any]]:
+        """
+        批量补全关联数据: 一次(分块)查询得到 {key: [row]}, 如
+        item_handler.group_by(db, "bill_id", [d.id for d in data])
+        """
+        return group_rows(self.fetch_by_keys(db, column, keys, columns), column)
+
+    def index_by(
+        self,
+        db: Session,
+        column: str,
+        keys: List[Any],
+        columns: Optional[List[str]] = None,
+    ) -> Dict[Any, Any]:
+        """一次(分块)查询得到 {key: row}, key 重复时保留第一条"""
+        return index_rows(self.fetch_by_keys(db, column, keys, columns), column)
+
     def lock(self, db: Session, id: Any) -> Optional[ModelType]:
         return (
-            sql_filter(q={"id": id}, query=db.query(self.model), model=self.model)
-            .populate_existing()
-            .with_for_update()
+            db.execute(
+                self.key_statement(for_update=True),
+                {KEY_PARAM: id},
+                execution_options={"populate_existing": True},
+            )
+            .scalars()
             .one()
         )
 
     def get_by_cno(self, db: Session, cno: Any) -> Optional[ModelType]:
-        if hasattr(self.model, "cno"):
-            return sql_filter(
-                q={"cno": cno}, query=db.query(self.model), model=self.model
-            ).first()
+        if hasattr(self.model, "cno") and cno is not None:
+            if isinstance(cno, str):
+                cno = cno.strip()
+            return (
+                db.execute(self.key_statement("cno"), {KEY_PARAM: cno})
+                .scalars()
+                .first()
+            )
 
     def query_sk(self, query: Query, sk: str) -> Query:
         return query
@@ -69,8 +197,18 @@ class CRUDBase(
                 query = self.query_sk(query, uniform_regexp_string(sk))
         return super().complete_query(db, query, typ, **kwargs)
 
-    def query(self, db: Session, q: D, typ=QUERY_TYPE_SIMPLE, **kwargs) -> Query:
-        query = self.complete_query(db, db.query(self.model), typ, q=q, **kwargs)
+    def query(
+        self,
+        db: Session,
+        q: D,
+        typ=QUERY_TYPE_SIMPLE,
+        fields: List[str] = None,
+        **kwargs,
+    ) -> Query:
+        query = self.complete_query(db, self.base_query(db), typ, q=q, **kwargs)
+        columns = self.get_field_columns(fields)
+        if columns:
+            query = query.options(load_only(*columns))
         return sql_filter(q, query, self.model)
 
     def search_limit(
@@ -81,9 +219,73 @@ class CRUDBase(
         typ=QUERY_TYPE_SIMPLE,
         skip=0,
         limit=9999,
+        lean=False,
+        columns: List[str] = None,
+        fields: List[str] = None,
+        **kwargs,
+    ) -> Tuple[List[ModelType], int]:
+        """
+        coalesce_search=True 时, 并发的相同 lean 查询共享一次执行
+        共享的查询在独立的 session(create_sibling_session)中执行, 结果为行元组, 不属于任何请求的 session
+        db 有未提交的写时不合并, 以便读到自己的写; ORM 实体结果也不合并
+        """
+        params = dict(
+            order_by=order_by,
+            typ=typ,
+            skip=skip,
+            limit=limit,
+            lean=lean,
+            columns=columns,
+            fields=fields,
+            **kwargs,
+        )
+        if (
+            not self.coalesce_search
+            or not lean
+            or not can_create_sibling(db)
+            or has_uncommitted_writes(db)
+        ):
+            return self.do_search_limit(db, q, **params)
+
+        def fn():
+            with create_sibling_session(db) as sibling:
+                return self.do_search_limit(sibling, q, **params)
+
+        (data, total), _ = self.search_singleflight.do(
+            search_key(self.model, q=q, **params), fn
+        )
+        return list(data), total
+
+    def do_search_limit(
+        self,
+        db: Session,
+        q: D,
+        order_by: List[Any] = None,
+        typ=QUERY_TYPE_SIMPLE,
+        skip=0,
+        limit=9999,
+        lean=False,
+        columns: List[str] = None,
+        fields: List[str] = None,
         **kwargs,
     ) -> Tuple[List[ModelType], int]:
-        query = self.query(db, q, typ)
+        """
+        lean=True 时只查询 columns 列(默认全部列), 直接返回行元组,
+        不实例化 ORM 对象也不执行 complete_query_result, 仅适用于只读列表
+        fields 不为空时只加载其中的列(load_only), 否则列表查询延迟加载 list_deferred 大字段
+        """
+        query = self.query(db, q, typ, fields=fields)
+        if lean:
+            data = (
+                query.with_entities(*self.get_lean_columns(columns))
+                .order_by(*(order_by or self.get_query_order(typ, q)))
+                .offset(skip)
+                .limit(limit)
+                .all()
+            )
+            return data, query.count()
+        if not fields:
+            query = self.defer_list_columns(query, typ)
         data = (
             query.order_by(*(order_by or self.get_query_order(typ, q)))
             .offset(skip)
@@ -140,6 +342,36 @@ class CRUDBase(
             if len(data) < batch_size:
                 break
 
+    def changes_cutoff(self, db: Session) -> Optional[datetime]:
+        if not self.changes_settle_seconds:
+            return None
+        stmt = select(func.current_timestamp()).execution_options(
+            **{USE_PRIMARY_OPTION: True}
+        )
+        now = db.execute(stmt).scalar()
+        return now - timedelta(seconds=self.changes_settle_seconds)
+
+    def search_changed_since(
+        self,
+        db: Session,
+        watermark: Optional[str] = None,
+        limit: int = 500,
+        typ=QUERY_TYPE_SIMPLE,
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """
+        增量同步: 返回 watermark 之后变更的行(按 update_time, id 排序, 包括 is_deleted 的行)和新的 watermark
+        没有变更时返回原 watermark; 返回条数等于 limit 时可能还有更多
+        总是在主库查询: 从库延迟超过 changes_settle_seconds 时, 迟到的行会落在已返回的 watermark 之前
+        开启时间超过 changes_settle_seconds 的写事务, 提交的行同样可能被跳过
+        """
+        stmt = changed_since_statement(
+            self.model, watermark, self.changes_cutoff(db), limit
+        ).execution_options(**{USE_PRIMARY_OPTION: True})
+        data = list(db.execute(stmt).scalars().all())
+        if data:
+            watermark = encode_watermark(data[-1].update_time, data[-1].id)
+        return self.complete_query_result(db=db, data=data, typ=typ), watermark
+
     def search_one(
         self, db: Session, q: D, order_by: List[Any] = None, typ=QUERY_TYPE_SIMPLE
     ) -> ModelType:
@@ -159,6 +391,31 @@ class CRUDBase(
     def get_query_order(self, typ, q):
         return [self.model.id.desc()]
 
+    @property
+    def search_singleflight(self) -> SingleFlight:
+        if not hasattr(self, "_search_singleflight"):
+            self._search_singleflight = SingleFlight()
+        return self._search_singleflight
+
+    def get_lean_columns(self, columns: List[str] = None) -> List[Any]:
+        return [getattr(self.model, c) for c in (columns or self.model.column_names)]
+
+    def defer_list_columns(self, query: Query, typ=QUERY_TYPE_SIMPLE) -> Query:
+        names = self.model.list_deferred_column_names
+        if names and typ in LIST_DEFERRED_QUERY_TYPES:
+            query = query.options(*[defer(getattr(self.model, c)) for c in names])
+        return query
+
+    def get_field_columns(self, fields: Optional[List[str]]) -> List[Any]:
+        """
+        fields 对应的列(总是包含 id), 用于 load_only
+        fields 中有非列字段(property 等可能用到其他列)时返回空, 不裁剪, 避免逐行延迟加载
+        """
+        names = self.model.column_names
+        if not fields or any(f not in names for f in fields):
+            return []
+        return [self.model.id] + [getattr(self.model, f) for f in fields if f != "id"]
+
     def create(self, db: Session, *, obj_in: D) -> ModelType:
         obj_in = self.before_create(db, obj_in=obj_in)
         if obj_in is None:
@@ -200,7 +457,7 @@ class CRUDBase(
         entity = self.get(db, id=obj_in["id"])
         if not entity:
             return
-        prev = entity.copy()
+        prev = self.get_update_prev(entity)
         entity = db_update(db, obj_in=obj_in, model=self.model)
         return self.after_update(db, obj_in=obj_in, entity=entity, prev=prev)
 
@@ -218,6 +475,72 @@ class CRUDBase(
         self.before_remove(db, id=id)
         return self.after_remove(db, id=db_remove(db, id=id, model=self.model))
 
+    def bulk_create(
+        self, db: Session, *, obj_ins: List[D]
+    ) -> List[Optional[ModelType]]:
+        """
+        批量新增: 逐条执行 before/after hook, 一次 flush 写入
+        返回与 obj_ins 一一对应的实体, before_create 返回空的条目为 None
+        """
+        prepared = [self.before_create(db, obj_in=obj_in) for obj_in in obj_ins]
+        entities = iter(
+            db_multi_add(db, obj_ins=[obj for obj in prepared if obj], model=self.model)
+        )
+        return [
+            self.after_create(db, obj_in=obj, entity=next(entities)) if obj else None
+            for obj in prepared
+        ]
+
+    def bulk_update(
+        self, db: Session, *, obj_ins: List[D]
+    ) -> List[Optional[ModelType]]:
+        """
+        批量更新: 一次查询取更新前数据, 一次 executemany 更新, 一次查询取回结果
+        返回与 obj_ins 一一对应的实体, 不存在的条目为 None
+        """
+        prepared = [self.before_update(db, obj_in=obj_in) for obj_in in obj_ins]
+        ids = [o["id"] for o in prepared if o]
+        prevs = {
+            id: self.get_update_prev(e)
+            for id, e in (self.gets_dict(db, ids) if ids else {}).items()
+        }
+        db_multi_update(
+            db,
+            obj_ins=[o for o in prepared if o and o["id"] in prevs],
+            model=self.model,
+        )
+        if not prevs:
+            return [None] * len(prepared)
+        entity_dict = {
+            e.id: e
+            for e in self.base_query(db)
+            .filter(self.model.id.in_(list(prevs)))
+            .populate_existing()
+            .all()
+        }
+        return [
+            (
+                self.after_update(
+                    db, obj_in=o, entity=entity_dict[o["id"]], prev=prevs[o["id"]]
+                )
+                if o and o["id"] in prevs
+                else None
+            )
+            for o in prepared
+        ]
+
+    def bulk_remove(self, db: Session, *, ids: List[Any]) -> List[Optional[Any]]:
+        """批量删除, 返回与 ids 一一对应的结果, 不存在的条目为 None"""
+        if not ids:
+            return []
+        existing = self.gets_dict(db, list(set(ids)))
+        targets = [id for id in dict.fromkeys(ids) if id in existing]
+        for id in targets:
+            self.before_remove(db, id=id)
+        db_multi_remove(db, ids=targets, model=self.model)
+        removed = {id: self.after_remove(db, id=id) for id in targets}
+        return [removed.get(id) for id in ids]
+
     def get_update_changes(self, db: Session, obj_in: D, raw=False):
         entity = self.get(db, obj_in["id"])
         return get_entity_update_from_obj_in(obj_in, entity, raw=raw)
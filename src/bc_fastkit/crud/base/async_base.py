@@ -1,21 +1,54 @@
 # type: ignore
+import asyncio
+from datetime import datetime, timedelta
 from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple, Type
 
-from sqlalchemy import func, select
+from sqlalchemy import func, inspect, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer, load_only
 from sqlalchemy.sql import Select
 
-from ...common.query import QUERY_TYPE_OVERALL, QUERY_TYPE_SIMPLE
+from ...common.query import (
+    LIST_DEFERRED_QUERY_TYPES,
+    QUERY_TYPE_OVERALL,
+    QUERY_TYPE_SIMPLE,
+)
 from ...common.typing import D
+from ...db import (
+    USE_PRIMARY_OPTION,
+    can_create_sibling,
+    create_sibling_session,
+    has_uncommitted_writes,
+)
+from ...utils.singleflight import AsyncSingleFlight
 from ..core.async_cud import (
     db_async_create,
     db_async_create_or_update,
+    db_async_multi_add,
     db_async_multi_create,
+    db_async_multi_remove,
+    db_async_multi_update,
     db_async_remove,
     db_async_update,
 )
-from ..core.async_query import async_sql_filter, async_sql_page_filter
-from ..core.query import uniform_regexp_string
+from ..core.async_query import (
+    async_sql_fetch_by_keys,
+    async_sql_filter,
+    async_sql_page_filter,
+)
+from ..core.query import (
+    KEY_PARAM,
+    KEYS_PARAM,
+    changed_since_statement,
+    chunked,
+    encode_watermark,
+    group_rows,
+    index_rows,
+    key_lookup_statement,
+    search_key,
+    uniform_regexp_string,
+    unique_ids,
+)
 from ..core.typing import ModelType
 from .mixin.async_hook import AsyncCRUDHookMixin
 
@@ -23,45 +56,187 @@ from .mixin.async_hook import AsyncCRUDHookMixin
 class AsyncCRUDBase(
     AsyncCRUDHookMixin[ModelType],
 ):
+    # 并发的相同 lean search_limit 合并为一次数据库执行
+    coalesce_search = False
+    # 读写分离时该 handler 的读也走主库
+    use_primary = False
+    # gets 单条 IN 语句的最大 id 数 / concurrent=True 时的分块并发查询数
+    gets_chunk_size = 1000
+    gets_concurrency = 4
+    # search_changed_since 只返回早于数据库当前时间这么多秒的变更, 0 时不限制
+    # update_time 是语句执行时间而不是提交时间, 需不小于最长写事务的时长, 否则这类事务的行可能被跳过
+    changes_settle_seconds = 1
+    # after_update 收到的 prev: True 时为更新前实体的非持久化副本(copy()), False 时为 to_dict()
+    # CRUDBase 默认为 True
+    prev_as_entity = False
+
     def __init__(self, model: Type[ModelType]):
         self.model = model
 
-    async def get(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
-        stmt = async_sql_filter(
-            q={"id": id}, query=select(self.model), model=self.model
+    def get_update_prev(self, entity: ModelType) -> Any:
+        """after_update 收到的 prev, 见 prev_as_entity"""
+        return entity.copy() if self.prev_as_entity else entity.to_dict()
+
+    def base_select(self, *entities) -> Select:
+        """所有查询的起点, use_primary 时标记为强制走主库(读写分离)"""
+        stmt = select(*(entities or (self.model,)))
+        if self.use_primary:
+            stmt = stmt.execution_options(**{USE_PRIMARY_OPTION: True})
+        return stmt
+
+    def key_statement(
+        self, column: str = "id", many=False, for_update=False, columns=()
+    ):
+        return key_lookup_statement(
+            self.model,
+            column,
+            many=many,
+            for_update=for_update,
+            execution_options=((USE_PRIMARY_OPTION, True),) if self.use_primary else (),
+            columns=tuple(columns),
         )
-        result = await db.execute(stmt)
+
+    async def get(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
+        if id is None:
+            return None
+        result = await db.execute(self.key_statement(), {KEY_PARAM: id})
         return result.scalars().first()
 
-    async def gets(self, db: AsyncSession, ids: List[int] = None) -> List[ModelType]:
-        stmt = async_sql_filter(
-            q={"id": ids} if ids is not None else {},
-            query=select(self.model),
-            model=self.model,
-        )
-        result = await db.execute(stmt)
-        return list(result.scalars().all())
+    async def gets(
+        self,
+        db: AsyncSession,
+        ids: List[int] = None,
+        allow_full_table: bool = False,
+        concurrent: bool = False,
+    ) -> List[ModelType]:
+        """
+        按 ids 批量查询, ids 去重后按 gets_chunk_size 分块执行 IN 查询, 结果按 ids 顺序返回
+        ids 为 None 时查询全表, 需显式 allow_full_table=True
+        concurrent=True 时多个分块在连接池的多个连接上并发查询(gets_concurrency 个),
+        这些连接不在 db 的事务中: 读到的是各自查询时已提交的数据, 不是 db 当前事务的快照;
+        db 有未提交的写时仍在 db 上顺序查询
+        """
+        if ids is None:
+            if not allow_full_table:
+                raise ValueError(
+                    f"{self.model.__name__}.gets 未指定 ids, 全表查询需 allow_full_table=True"
+                )
+            stmt = async_sql_filter(q={}, query=self.base_select(), model=self.model)
+            result = await db.execute(stmt)
+            return list(result.scalars().all())
+        ids = unique_ids(ids)
+        chunks = list(chunked(ids, self.gets_chunk_size))
+        if (
+            concurrent
+            and len(chunks) > 1
+            and self.gets_concurrency > 1
+            and can_create_sibling(db)
+            and not has_uncommitted_writes(db)
+        ):
+            entities = await self.gets_concurrently(db, chunks)
+        else:
+            entities = []
+            for chunk in chunks:
+                result = await db.execute(
+                    self.key_statement(many=True), {KEYS_PARAM: chunk}
+                )
+                entities.extend(result.scalars().all())
+        entity_dict = {e.id: e for e in entities}
+        return [entity_dict[id] for id in ids if id in entity_dict]
+
+    async def gets_concurrently(
+        self, db: AsyncSession, chunks: List[List[Any]]
+    ) -> List[ModelType]:
+        """
+        每个分块在独立 session 上查询(并发数 gets_concurrency), 结果 merge 回 db 不再访问数据库
+        db 中已有的同一实体保持不变, 不会被覆盖
+        """
+        semaphore = asyncio.Semaphore(self.gets_concurrency)
+
+        async def fetch(chunk):
+            async with semaphore:
+                async with create_sibling_session(db) as sibling:
+                    result = await sibling.execute(
+                        self.key_statement(many=True), {KEYS_PARAM: chunk}
+                    )
+                    return list(result.scalars().all())
+
+        results = await asyncio.gather(*[fetch(chunk) for chunk in chunks])
+
+        def merge(session):
+            merged = []
+            for entities in results:
+                for e in entities:
+                    existing = session.identity_map.get(inspect(e).key)
+                    merged.append(
+                        existing
+                        if existing is not None
+                        else session.merge(e, load=False)
+                    )
+            return merged
+
+        return await db.run_sync(merge)
 
     async def gets_dict(
-        self, db: AsyncSession, ids: List[int] = None
+        self,
+        db: AsyncSession,
+        ids: List[int] = None,
+        allow_full_table: bool = False,
+        concurrent: bool = False,
     ) -> Dict[int, ModelType]:
-        entities = await self.gets(db, ids)
+        entities = await self.gets(
+            db, ids, allow_full_table=allow_full_table, concurrent=concurrent
+        )
         return {e.id: e for e in entities}
 
-    async def lock(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
-        stmt = async_sql_filter(
-            q={"id": id}, query=select(self.model), model=self.model
+    async def fetch_by_keys(
+        self,
+        db: AsyncSession,
+        column: str,
+        keys: List[Any],
+        columns: Optional[List[str]] = None,
+    ) -> List[Any]:
+        """按 column IN keys 分块查询, columns 不为空时返回只含 column 及这些列的 Row"""
+        return await async_sql_fetch_by_keys(
+            db,
+            self.key_statement(column, many=True, columns=columns or ()),
+            keys,
+            self.gets_chunk_size,
+            scalars=not columns,
         )
-        stmt = stmt.with_for_update()
-        result = await db.execute(stmt)
+
+    async def group_by(
+        self,
+        db: AsyncSession,
+        column: str,
+        keys: List[Any],
+        columns: Optional[List[str]] = None,
+    ) -> Dict[Any, List[Any]]:
+        """
+        批量补全关联数据: 一次(分块)查询得到 {key: [row]}, 如
+        item_handler.group_by(db, "bill_id", [d.id for d in data])
+        """
+        return group_rows(await self.fetch_by_keys(db, column, keys, columns), column)
+
+    async def index_by(
+        self,
+        db: AsyncSession,
+        column: str,
+        keys: List[Any],
+        columns: Optional[List[str]] = None,
+    ) -> Dict[Any, Any]:
+        """一次(分块)查询得到 {key: row}, key 重复时保留第一条"""
+        return index_rows(await self.fetch_by_keys(db, column, keys, columns), column)
+
+    async def lock(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
+        result = await db.execute(self.key_statement(for_update=True), {KEY_PARAM: id})
         return result.scalars().first()
 
     async def get_by_cno(self, db: AsyncSession, cno: Any) -> Optional[ModelType]:
-        if hasattr(self.model, "cno"):
-            stmt = async_sql_filter(
-                q={"cno": cno}, query=select(self.model), model=self.model
-            )
-            result = await db.execute(stmt)
+        if hasattr(self.model, "cno") and cno is not None:
+            if isinstance(cno, str):
+                cno = cno.strip()
+            result = await db.execute(self.key_statement("cno"), {KEY_PARAM: cno})
             return result.scalars().first()
 
     def query_sk(self, query: Select, sk: str) -> Select:
@@ -77,9 +252,17 @@ class AsyncCRUDBase(
         return await super().complete_query(db, query, typ, **kwargs)
 
     async def query(
-        self, db: AsyncSession, q: D, typ=QUERY_TYPE_SIMPLE, **kwargs
+        self,
+        db: AsyncSession,
+        q: D,
+        typ=QUERY_TYPE_SIMPLE,
+        fields: List[str] = None,
+        **kwargs,
     ) -> Select:
-        stmt = await self.complete_query(db, select(self.model), typ, q=q, **kwargs)
+        stmt = await self.complete_query(db, self.base_select(), typ, q=q, **kwargs)
+        columns = self.get_field_columns(fields)
+        if columns:
+            stmt = stmt.options(load_only(*columns))
         return async_sql_filter(q, stmt, self.model)
 
     def parse_order_by(self, order_by: List[Any]) -> List[Any]:
@@ -107,9 +290,66 @@ class AsyncCRUDBase(
         typ=QUERY_TYPE_SIMPLE,
         skip=0,
         limit=9999,
+        lean=False,
+        columns: List[str] = None,
+        fields: List[str] = None,
         **kwargs,
     ) -> Tuple[List[ModelType], int]:
-        stmt = await self.query(db, q, typ)
+        """
+        coalesce_search=True 时, 并发的相同 lean 查询共享一次执行
+        共享的查询在独立的 session(create_sibling_session)中执行, 结果为行元组, 不属于任何请求的 session
+        db 有未提交的写时不合并, 以便读到自己的写; ORM 实体结果也不合并
+        """
+        params = dict(
+            order_by=order_by,
+            typ=typ,
+            skip=skip,
+            limit=limit,
+            lean=lean,
+            columns=columns,
+            fields=fields,
+            **kwargs,
+        )
+        if (
+            not self.coalesce_search
+            or not lean
+            or not can_create_sibling(db)
+            or has_uncommitted_writes(db)
+        ):
+            return await self.do_search_limit(db, q, **params)
+
+        async def fn():
+            async with create_sibling_session(db) as sibling:
+                return await self.do_search_limit(sibling, q, **params)
+
+        (data, total), _ = await self.search_singleflight.do(
+            search_key(self.model, q=q, **params), fn
+        )
+        return list(data), total
+
+    async def do_search_limit(
+        self,
+        db: AsyncSession,
+        q: D,
+        order_by: List[Any] = None,
+        typ=QUERY_TYPE_SIMPLE,
+        skip=0,
+        limit=9999,
+        lean=False,
+        columns: List[str] = None,
+        fields: List[str] = None,
+        **kwargs,
+    ) -> Tuple[List[ModelType], int]:
+        """
+        lean=True 时只查询 columns 列(默认全部列), 直接返回行元组,
+        不实例化 ORM 对象也不执行 complete_query_result, 仅适用于只读列表
+        fields 不为空时只加载其中的列(load_only), 否则列表查询延迟加载 list_deferred 大字段
+        """
+        stmt = await self.query(db, q, typ, fields=fields)
+        if lean:
+            stmt = stmt.with_only_columns(*self.get_lean_columns(columns))
+        elif not fields:
+            stmt = self.defer_list_columns(stmt, typ)
         data, total = await async_sql_page_filter(
             db=db,
             q={},
@@ -122,7 +362,10 @@ class AsyncCRUDBase(
                 if order_by
                 else self.get_query_order(typ, q)
             ),
+            lean=lean,
         )
+        if lean:
+            return data, total
         return (
             await self.complete_query_result(db=db, data=data, typ=typ, q=q, **kwargs),
             total,
@@ -165,6 +408,37 @@ class AsyncCRUDBase(
             if len(data) < batch_size:
                 break
 
+    async def changes_cutoff(self, db: AsyncSession) -> Optional[datetime]:
+        if not self.changes_settle_seconds:
+            return None
+        stmt = select(func.current_timestamp()).execution_options(
+            **{USE_PRIMARY_OPTION: True}
+        )
+        now = (await db.execute(stmt)).scalar()
+        return now - timedelta(seconds=self.changes_settle_seconds)
+
+    async def search_changed_since(
+        self,
+        db: AsyncSession,
+        watermark: Optional[str] = None,
+        limit: int = 500,
+        typ=QUERY_TYPE_SIMPLE,
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """
+        增量同步: 返回 watermark 之后变更的行(按 update_time, id 排序, 包括 is_deleted 的行)和新的 watermark
+        没有变更时返回原 watermark; 返回条数等于 limit 时可能还有更多
+        总是在主库查询: 从库延迟超过 changes_settle_seconds 时, 迟到的行会落在已返回的 watermark 之前
+        开启时间超过 changes_settle_seconds 的写事务, 提交的行同样可能被跳过
+        """
+        stmt = changed_since_statement(
+            self.model, watermark, await self.changes_cutoff(db), limit
+        ).execution_options(**{USE_PRIMARY_OPTION: True})
+        data = list((await db.execute(stmt)).scalars().all())
+        if data:
+            watermark = encode_watermark(data[-1].update_time, data[-1].id)
+        data = await self.complete_query_result(db=db, data=data, typ=typ)
+        return data, watermark
+
     async def search_one(
         self, db: AsyncSession, q: D, order_by: List[Any] = None, typ=QUERY_TYPE_SIMPLE
     ) -> Optional[ModelType]:
@@ -182,13 +456,42 @@ class AsyncCRUDBase(
 
     async def search_total(self, db: AsyncSession, q: D) -> int:
         stmt = await self.query(db, q)
-        count_stmt = select(func.count()).select_from(stmt.subquery())
+        count_stmt = (
+            select(func.count())
+            .select_from(stmt.subquery())
+            .execution_options(**stmt.get_execution_options())
+        )
         result = await db.execute(count_stmt)
         return result.scalar() or 0
 
     def get_query_order(self, typ, q):
         return [self.model.id.desc()]
 
+    @property
+    def search_singleflight(self) -> AsyncSingleFlight:
+        if not hasattr(self, "_search_singleflight"):
+            self._search_singleflight = AsyncSingleFlight()
+        return self._search_singleflight
+
+    def get_lean_columns(self, columns: List[str] = None) -> List[Any]:
+        return [getattr(self.model, c) for c in (columns or self.model.column_names)]
+
+    def defer_list_columns(self, query: Select, typ=QUERY_TYPE_SIMPLE) -> Select:
+        names = self.model.list_deferred_column_names
+        if names and typ in LIST_DEFERRED_QUERY_TYPES:
+            query = query.options(*[defer(getattr(self.model, c)) for c in names])
+        return query
+
+    def get_field_columns(self, fields: Optional[List[str]]) -> List[Any]:
+        """
+        fields 对应的列(总是包含 id), 用于 load_only
+        fields 中有非列字段(property 等可能用到其他列)时返回空, 不裁剪, 避免逐行延迟加载
+        """
+        names = self.model.column_names
+        if not fields or any(f not in names for f in fields):
+            return []
+        return [self.model.id] + [getattr(self.model, f) for f in fields if f != "id"]
+
     async def create(self, db: AsyncSession, *, obj_in: D) -> ModelType:
         obj_in = await self.before_create(db, obj_in=obj_in)
         if obj_in is None:
@@ -228,13 +531,7 @@ class AsyncCRUDBase(
         entity = await self.get(db, id=obj_in["id"])
         if not entity:
             return
-        # Use a copy helper for prev?
-        # In current CRUDBase it uses entity.copy(). Assuming BaseModel has copy()
-        # SQLAlchemy objects might need manual copy for 'prev' if they are tracked.
-        # For simplicity, we fetch it or use the one we have.
-        # But wait, db_async_update might modify the session object.
-        # Let's try to get a snapshot.
-        prev = entity.to_dict() if hasattr(entity, "to_dict") else None
+        prev = self.get_update_prev(entity)
 
         updated_entity = await db_async_update(db, obj_in=obj_in, model=self.model)
         return await self.after_update(
@@ -256,6 +553,79 @@ class AsyncCRUDBase(
         removed_id = await db_async_remove(db, id=id, model=self.model)
         return await self.after_remove(db, id=removed_id)
 
+    async def bulk_create(
+        self, db: AsyncSession, *, obj_ins: List[D]
+    ) -> List[Optional[ModelType]]:
+        """
+        批量新增: 逐条执行 before/after hook, 一次 flush 写入
+        返回与 obj_ins 一一对应的实体, before_create 返回空的条目为 None
+        """
+        prepared = [await self.before_create(db, obj_in=obj_in) for obj_in in obj_ins]
+        entities = iter(
+            await db_async_multi_add(
+                db, obj_ins=[obj for obj in prepared if obj], model=self.model
+            )
+        )
+        rs = []
+        for obj in prepared:
+            rs.append(
+                await self.after_create(db, obj_in=obj, entity=next(entities))
+                if obj
+                else None
+            )
+        return rs
+
+    async def bulk_update(
+        self, db: AsyncSession, *, obj_ins: List[D]
+    ) -> List[Optional[ModelType]]:
+        """
+        批量更新: 一次查询取更新前数据, 一次 executemany 更新, 一次查询取回结果
+        返回与 obj_ins 一一对应的实体, 不存在的条目为 None
+        """
+        prepared = [await self.before_update(db, obj_in=obj_in) for obj_in in obj_ins]
+        ids = [o["id"] for o in prepared if o]
+        prevs = {
+            id: self.get_update_prev(e)
+            for id, e in ((await self.gets_dict(db, ids)) if ids else {}).items()
+        }
+        await db_async_multi_update(
+            db,
+            obj_ins=[o for o in prepared if o and o["id"] in prevs],
+            model=self.model,
+        )
+        if not prevs:
+            return [None] * len(prepared)
+        result = await db.execute(
+            self.base_select()
+            .filter(self.model.id.in_(list(prevs)))
+            .execution_options(populate_existing=True)
+        )
+        entity_dict = {e.id: e for e in result.scalars().all()}
+        rs = []
+        for o in prepared:
+            rs.append(
+                await self.after_update(
+                    db, obj_in=o, entity=entity_dict[o["id"]], prev=prevs[o["id"]]
+                )
+                if o and o["id"] in prevs
+                else None
+            )
+        return rs
+
+    async def bulk_remove(
+        self, db: AsyncSession, *, ids: List[Any]
+    ) -> List[Optional[Any]]:
+        """批量删除, 返回与 ids 一一对应的结果, 不存在的条目为 None"""
+        if not ids:
+            return []
+        existing = await self.gets_dict(db, list(set(ids)))
+        targets = [id for id in dict.fromkeys(ids) if id in existing]
+        for id in targets:
+            await self.before_remove(db, id=id)
+        await db_async_multi_remove(db, ids=targets, model=self.model)
+        removed = {id: await self.after_remove(db, id=id) for id in targets}
+        return [removed.get(id) for id in ids]
+
     async def get_update_changes(self, db: AsyncSession, obj_in: D, raw=False):
         entity = await self.get(db, obj_in["id"])
         from .base import get_entity_update_from_obj_in
@@ -0,0 +1,35 @@
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ....common.price import compute_bill_prices
+from ....common.typing import D
+from .async_hook import AsyncCRUDHookMixin, ModelType
+
+
+class AsyncBillPriceMixIn(AsyncCRUDHookMixin[ModelType]):
+    """
+    create/update 时按表头的币种/折扣/价格类型批量计算明细价格和表头金额
+    计算见 common.price.compute_bill_prices(与原实现相同的 Decimal 逐条计算, 不舍入)
+    """
+
+    PRICE_ATTRS = ["currency_id", "items", "discount", "tax_typ"]
+
+    async def get_currency_rate(
+        self, db: AsyncSession, currency_id: int
+    ) -> Optional[Decimal]:
+        """币种汇率, 返回 None 时沿用 obj_in 中的 currency_rate"""
+        return None
+
+    async def complement_obj_in(self, db: AsyncSession, *, obj_in: D) -> D:
+        obj_in = await super().complement_obj_in(db, obj_in=obj_in)
+        return await self.update_obj_in_meta_price(db, obj_in=obj_in)
+
+    async def update_obj_in_meta_price(self, db: AsyncSession, obj_in: D) -> D:
+        if not all(i in obj_in for i in self.PRICE_ATTRS):
+            return obj_in
+        rate = await self.get_currency_rate(db, obj_in["currency_id"])
+        if rate is not None:
+            obj_in["currency_rate"] = rate
+        return compute_bill_prices(obj_in)
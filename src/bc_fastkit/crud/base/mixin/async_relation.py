@@ -0,0 +1,76 @@
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ....common.query import QUERY_TYPE_OVERALL, QUERY_TYPE_SIMPLE
+from ....common.typing import D
+from ...core.async_cud import db_async_multi_replace
+from ...core.async_query import async_sql_fetch_by_keys
+from ...core.query import group_rows, key_lookup_statement
+from .async_hook import AsyncCRUDHookMixin, ModelType
+from .relation import Relation, attach_relation
+
+
+class AsyncCRUDRelationMixin(AsyncCRUDHookMixin[ModelType]):
+    """
+    QUERY_TYPE_OVERALL 查询结果按 relations 批量挂载子表: 每个关联一次(分块) IN 查询
+    create/update 的 obj_in 中带有关联键(列表)时, 子表按差异批量替换
+    """
+
+    relations: Sequence[Relation] = ()
+    # 子表 IN 查询单条语句的最大 id 数
+    relation_chunk_size = 1000
+
+    async def get_relation_dict(
+        self, db: AsyncSession, relation: Relation, ids: List[int]
+    ) -> Dict[int, List[Any]]:
+        rows = await async_sql_fetch_by_keys(
+            db,
+            key_lookup_statement(relation.model, relation.column_name, many=True),
+            ids,
+            self.relation_chunk_size,
+        )
+        return group_rows(rows, relation.column_name)
+
+    async def complete_query_result(
+        self, db: AsyncSession, data: Any, typ=QUERY_TYPE_SIMPLE, **kwargs
+    ) -> Any:
+        data = await super().complete_query_result(db, data, typ, **kwargs)
+        if typ == QUERY_TYPE_OVERALL and data and self.relations:
+            ids = [d.id for d in data]
+            for r in self.relations:
+                mapping = await self.get_relation_dict(db, r, ids)
+                for d in data:
+                    attach_relation(d, r.attr_name, mapping.get(d.id, []))
+        return data
+
+    async def create_or_update_relations(
+        self, db: AsyncSession, *, obj_in: D, entity: ModelType
+    ):
+        for r in self.relations:
+            objs = obj_in.get(r.attr_name)
+            if not isinstance(objs, list):
+                continue
+            old_dict = await self.get_relation_dict(db, r, [entity.id])
+            await db_async_multi_replace(
+                db,
+                old_entities=old_dict.get(entity.id, []),
+                new_objs=[{**o, r.column_name: entity.id} for o in objs],
+                model=r.model,
+                return_created=False,
+                unique_columns=r.unique_columns,
+            )
+
+    async def after_create(
+        self, db: AsyncSession, *, obj_in: D, entity: ModelType
+    ) -> ModelType:
+        entity = await super().after_create(db, obj_in=obj_in, entity=entity)
+        await self.create_or_update_relations(db, obj_in=obj_in, entity=entity)
+        return entity
+
+    async def after_update(
+        self, db: AsyncSession, *, obj_in: D, entity: ModelType, prev: ModelType
+    ) -> ModelType:
+        entity = await super().after_update(db, obj_in=obj_in, entity=entity, prev=prev)
+        await self.create_or_update_relations(db, obj_in=obj_in, entity=entity)
+        return entity
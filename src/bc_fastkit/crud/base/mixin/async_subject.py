@@ -0,0 +1,33 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ....common.typing import D
+from .async_hook import AsyncCRUDHookMixin, ModelType
+from .subject import (
+    CRUD_EVENT_AFTER_CREATE,
+    CRUD_EVENT_AFTER_UPDATE,
+    CRUD_EVENT_BEFORE_REMOVE,
+    CRUDSubjectBase,
+)
+
+
+class AsyncCUDSubjectMixin(CRUDSubjectBase, AsyncCRUDHookMixin[ModelType]):
+    async def after_create(
+        self, db: AsyncSession, *, obj_in: D, entity: ModelType
+    ) -> ModelType:
+        entity = await super().after_create(db, obj_in=obj_in, entity=entity)
+        self.notify(db, CRUD_EVENT_AFTER_CREATE, entity.id, entity, obj_in=obj_in)
+        return entity
+
+    async def after_update(
+        self, db: AsyncSession, *, obj_in: D, entity: ModelType, prev: ModelType
+    ) -> ModelType:
+        entity = await super().after_update(db, obj_in=obj_in, entity=entity, prev=prev)
+        self.notify(
+            db, CRUD_EVENT_AFTER_UPDATE, entity.id, entity, prev=prev, obj_in=obj_in
+        )
+        return entity
+
+    async def before_remove(self, db: AsyncSession, *, id: int) -> int:
+        id = await super().before_remove(db, id=id)
+        self.notify(db, CRUD_EVENT_BEFORE_REMOVE, id)
+        return id
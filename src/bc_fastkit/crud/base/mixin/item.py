@@ -0,0 +1,37 @@
+from typing import List, Sequence
+
+from sqlalchemy.orm import Session
+
+from ....common.typing import D
+from .hook import ModelType
+from .relation import CRUDRelationMixin, Relation, attach_relation
+
+
+class CRUDItemMixin(CRUDRelationMixin[ModelType]):
+    """
+    表头/明细(model.ITEM_MODEL)的 CRUD, 与 create_item_cru_schema 生成的 schema 配合
+    obj_in["items"] 中的明细批量写入(新增/差异更新/删除各一次), 写入后一次查询挂载到表头
+    """
+
+    ITEM_ATTR_NAME = "items"
+    # 明细中关联表头 id 的列
+    ITEM_COLUMN_NAME = "bill_id"
+
+    @property
+    def item_relation(self) -> Relation:
+        return Relation(
+            self.ITEM_ATTR_NAME, self.model.ITEM_MODEL, self.ITEM_COLUMN_NAME
+        )
+
+    @property
+    def relations(self) -> Sequence[Relation]:
+        # 保留 MRO 中其他关联 mixin 的 relations; 子类增加关联时同样以 super().relations 为基础
+        return [*super().relations, self.item_relation]
+
+    def get_items(self, db: Session, id: int) -> List[ModelType]:
+        return self.get_relation_dict(db, self.item_relation, [id]).get(id, [])
+
+    def create_or_update_relations(self, db: Session, *, obj_in: D, entity: ModelType):
+        super().create_or_update_relations(db, obj_in=obj_in, entity=entity)
+        if isinstance(obj_in.get(self.ITEM_ATTR_NAME), list):
+            attach_relation(entity, self.ITEM_ATTR_NAME, self.get_items(db, entity.id))
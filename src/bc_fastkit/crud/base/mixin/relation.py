@@ -1,114 +1,96 @@
-# from typing import List, Optional, Type, Dict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Type
 
-# from sqlalchemy.orm.session import Session
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 
-# from app.common import QUERY_TYPE_OVERALL
-# from app.core.typing import D
-# from app.utils.search import sql_filter
-# from app.model import Relation
+from ....common.query import QUERY_TYPE_OVERALL, QUERY_TYPE_SIMPLE
+from ....common.typing import D
+from ...core.cud import db_multi_replace
+from ...core.query import group_rows, key_lookup_statement, sql_fetch_by_keys
+from .hook import CRUDHookMixin, ModelType
 
-# from .hook import CRUDHookMixin, ModelType
-# from ...core.cud import db_multi_replacement_update
 
+class Relation(NamedTuple):
+    """
+    一对多关联
+    attr_name: 查询结果上挂载子表数据的属性名, 同时是 obj_in 中子表数据的键
+    model: 子表模型
+    column_name: 子表中关联主表 id 的列
+    unique_columns: 替换子表时配对新旧数据的唯一约束列, 见 plan_replacement
+    """
 
-# class CRUDRelationMixin(CRUDHookMixin[ModelType]):
-#     @property
-#     def relation_dict(self) -> Dict[str, Relation]:
-#         return self.model.relation_dict
+    attr_name: str
+    model: Type[Any]
+    column_name: str
+    unique_columns: Optional[List[str]] = None
 
-#     def create_or_update_all_relations(
-#         self, db: Session, *, obj_in: D, entity: ModelType
-#     ):
-#         for k, m in self.relation_dict.items():
-#             if isinstance(obj_in.get(k, None), list):
-#                 self.create_or_update_relations(
-#                     db,
-#                     cond={m.column_name: entity.id},
-#                     mappings=obj_in[k],
-#                     model=m.relation_model,
-#                 )
 
-#     def after_create(self, db: Session, *, obj_in: D, entity: ModelType):
-#         entity = super().after_create(db, obj_in=obj_in, entity=entity)
-#         self.create_or_update_all_relations(db, obj_in=obj_in, entity=entity)
-#         return entity
+def attach_relation(entity: Any, attr_name: str, value: Any) -> None:
+    """映射属性用 set_committed_value 避免产生变更, 其余直接 setattr"""
+    if attr_name in inspect(type(entity)).attrs:
+        set_committed_value(entity, attr_name, value)
+    else:
+        setattr(entity, attr_name, value)
 
-#     def after_update(
-#         self, db: Session, *, obj_in: D, entity: ModelType, prev: ModelType
-#     ):
-#         entity = super().after_update(db, obj_in=obj_in, entity=entity, prev=prev)
-#         self.create_or_update_all_relations(db, obj_in=obj_in, entity=entity)
-#         return entity
 
-#     def complete_query_result(self, db: Session, data, typ=..., **kwargs):
-#         data = super().complete_query_result(db, data, typ, **kwargs)
-#         if typ == QUERY_TYPE_OVERALL:
-#             ids = [d.id for d in data]
-#             for r in self.relation_dict.values():
-#                 if r.is_one_to_many:
-#                     target = self.get_mapping_dict(db, r.attr_name, ids)
-#                     for d in data:
-#                         setattr(d, r.attr_name, target.get(d.id, []))
-#         return data
+class CRUDRelationMixin(CRUDHookMixin[ModelType]):
+    """
+    QUERY_TYPE_OVERALL 查询结果按 relations 批量挂载子表: 每个关联一次(分块) IN 查询
+    create/update 的 obj_in 中带有关联键(列表)时, 子表按差异批量替换
+    """
 
-#     def create_or_update_relations(
-#         cls,
-#         db: Session,
-#         cond: D,
-#         mappings: Optional[D],
-#         model: Type[ModelType],
-#         old_relations: List[ModelType] = None,
-#     ):
-#         # TODO confirm id
-#         if mappings is None:
-#             return
-#         for m in mappings:
-#             for k, v in cond.items():
-#                 m[k] = v
-#         if old_relations is None:
-#             old_relations = sql_filter(cond, db.query(model), model=model).all()
-#         db_multi_replacement_update(
-#             db, old_entities=old_relations, new_objs=mappings, model=model
-#         )
+    relations: Sequence[Relation] = ()
+    # 子表 IN 查询单条语句的最大 id 数
+    relation_chunk_size = 1000
 
-#     def get_mapping_dict(
-#         self,
-#         db: Session,
-#         relation_key: str,
-#         entity_ids: List[int],
-#     ) -> D:
-#         relation = self.relation_dict[relation_key]
-#         model = (
-#             relation.peer_model if relation.is_one_to_many else relation.mapping_model
-#         )
-#         rs = sql_filter(
-#             {relation.column_name: entity_ids} if entity_ids else {},
-#             db.query(model),
-#             model=model,
-#         ).all()
-#         d = {}
-#         for r in rs:
-#             d.setdefault(getattr(r, relation.column_name), []).append(r)
-#         return d
+    def get_relation_dict(
+        self, db: Session, relation: Relation, ids: List[int]
+    ) -> Dict[int, List[Any]]:
+        rows = sql_fetch_by_keys(
+            db,
+            key_lookup_statement(relation.model, relation.column_name, many=True),
+            ids,
+            self.relation_chunk_size,
+        )
+        return group_rows(rows, relation.column_name)
 
-#     def get_mapping_peer_dict(
-#         self,
-#         db: Session,
-#         relation_key: str,
-#         entity_ids: List[int] = None,
-#     ) -> D:
-#         relation = self.relation_dict[relation_key]
-#         query = db.query(relation.mapping_model, relation.peer_model).join(
-#             relation.peer_model,
-#             relation.peer_model.id
-#             == getattr(relation.mapping_model, relation.peer_column_name),
-#         )
-#         rs = sql_filter(
-#             {relation.column_name: entity_ids} if entity_ids else {},
-#             query,
-#             model=relation.mapping_model,
-#         ).all()
-#         d = {}
-#         for m, t in rs:
-#             d.setdefault(getattr(m, relation.column_name), []).append((m, t))
-#         return d
+    def complete_query_result(
+        self, db: Session, data: Any, typ=QUERY_TYPE_SIMPLE, **kwargs
+    ) -> Any:
+        data = super().complete_query_result(db, data, typ, **kwargs)
+        if typ == QUERY_TYPE_OVERALL and data and self.relations:
+            ids = [d.id for d in data]
+            for r in self.relations:
+                mapping = self.get_relation_dict(db, r, ids)
+                for d in data:
+                    attach_relation(d, r.attr_name, mapping.get(d.id, []))
+        return data
+
+    def create_or_update_relations(self, db: Session, *, obj_in: D, entity: ModelType):
+        for r in self.relations:
+            objs = obj_in.get(r.attr_name)
+            if not isinstance(objs, list):
+                continue
+            db_multi_replace(
+                db,
+                old_entities=self.get_relation_dict(db, r, [entity.id]).get(
+                    entity.id, []
+                ),
+                new_objs=[{**o, r.column_name: entity.id} for o in objs],
+                model=r.model,
+                return_created=False,
+                unique_columns=r.unique_columns,
+            )
+
+    def after_create(self, db: Session, *, obj_in: D, entity: ModelType) -> ModelType:
+        entity = super().after_create(db, obj_in=obj_in, entity=entity)
+        self.create_or_update_relations(db, obj_in=obj_in, entity=entity)
+        return entity
+
+    def after_update(
+        self, db: Session, *, obj_in: D, entity: ModelType, prev: ModelType
+    ) -> ModelType:
+        entity = super().after_update(db, obj_in=obj_in, entity=entity, prev=prev)
+        self.create_or_update_relations(db, obj_in=obj_in, entity=entity)
+        return entity
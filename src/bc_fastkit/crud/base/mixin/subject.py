@@ -1,140 +1,162 @@
-# from typing import Iterable, Union
-
-# from fastapi import HTTPException, status
-# from sqlalchemy.orm import Session
-
-# from app.common.bill import BillEventEnum
-# from app.common.event import CRUDEventEnum, Enum
-
-# from app.model import BaseBillModel
-# from app.core.pattern import Subject, Observer
-# from app.core.typing import D
-# from .hook import CRUDHookMixin
-# from ...core import ModelType, BillModelType
-
-
-# class CUDSubjectMixin(Subject, CRUDHookMixin[ModelType]):
-#     DEFAULT_EVENTS = [
-#         CRUDEventEnum.after_create,
-#         CRUDEventEnum.after_update,
-#         CRUDEventEnum.before_remove,
-#     ]
-
-#     @property
-#     def observers(self):
-#         if not hasattr(self, "_observers"):
-#             self._observers = {}
-#         return self._observers
-
-#     def attach(
-#         self,
-#         observer: Observer,
-#         events: Union[Enum, Iterable[Enum]] = None,
-#     ) -> None:
-#         events = self.DEFAULT_EVENTS if events is None else events
-#         if isinstance(events, Enum):
-#             events = [events]
-#         for event in events:
-#             self.observers.setdefault(event, []).append(observer)
-
-#     def detach(self, observer: Observer, *args, **kwargs) -> None:
-#         return
-
-#     def notify(self, event: CRUDEventEnum, *args, **kwargs) -> None:
-#         for observer in self.observers.get(event, []):
-#             observer.update(self, event, *args, **kwargs)
-
-#     def after_create(self, db: Session, *, obj_in: D, entity: ModelType):
-#         self.notify(CRUDEventEnum.after_create, db, obj_in=obj_in, entity=entity)
-#         return super().after_create(db, obj_in=obj_in, entity=entity)
-
-#     def after_update(
-#         self, db: Session, *, obj_in: D, entity: ModelType, prev: ModelType
-#     ):
-#         self.notify(
-#             CRUDEventEnum.after_update, db, obj_in=obj_in, entity=entity, prev=prev
-#         )
-#         return super().after_update(db, obj_in=obj_in, entity=entity, prev=prev)
-
-#     def before_remove(self, db: Session, *, id: int) -> int:
-#         self.notify(CRUDEventEnum.before_remove, db, id=id)
-#         return super().before_remove(db, id=id)
-
-
-# class BillSubjectMixin(CUDSubjectMixin[BillModelType]):
-#     DEFAULT_EVENTS = (
-#         BillEventEnum.commit,
-#         BillEventEnum.audit_fail,
-#         BillEventEnum.audit_pass,
-#         BillEventEnum.modify_pass,
-#         BillEventEnum.close,
-#         BillEventEnum.update_item_hold_quantity,
-#         BillEventEnum.cancel,
-#     )
-
-#     def on_commit(self, db: Session, bill: BillModelType):
-#         self.notify(BillEventEnum.commit, db, bill)
-
-#     def on_audit_pass(self, db: Session, bill: BillModelType):
-#         self.notify(BillEventEnum.audit_pass, db, bill)
-
-#     def on_audit_fail(self, db: Session, bill: BillModelType):
-#         self.notify(BillEventEnum.audit_fail, db, bill)
-
-#     def on_modify_pass(self, db: Session, bill: BillModelType):
-#         self.notify(BillEventEnum.modify_pass, db, bill)
-
-#     def on_close(self, db: Session, bill: BillModelType):
-#         self.notify(BillEventEnum.close, db, bill)
-
-#     def on_cancel(self, db: Session, bill: BillModelType):
-#         self.notify(BillEventEnum.cancel, db, bill)
-
-#     def on_state_change(
-#         self, db: Session, bill: BillModelType, state: int, prev_state: int
-#     ):
-#         # 超级管理员可以控制，权限限制转移
-#         # if prev_state >= BaseBillModel.STATE_CLOSED:
-#         #     raise HTTPException(
-#         #         status_code=status.HTTP_400_BAD_REQUEST, detail="当前状态不支持改变"
-#         #     )
-#         if state == BaseBillModel.STATE_COMMIT:
-#             self.on_commit(db, bill=bill)
-#         elif state == BaseBillModel.STATE_AUDITED:
-#             if prev_state == BaseBillModel.STATE_MODIFY_COMMIT:
-#                 self.on_modify_pass(db, bill=bill)
-#             elif prev_state < BaseBillModel.STATE_COMMIT:
-#                 self.on_commit(db, bill=bill)
-#                 self.on_audit_pass(db, bill=bill)
-#             else:
-#                 self.on_audit_pass(db, bill=bill)
-#         elif state == BaseBillModel.STATE_REJECTED:
-#             self.on_audit_fail(db, bill=bill)
-#         elif state == BaseBillModel.STATE_CLOSED:
-#             self.on_close(db, bill=bill)
-#         elif state == BaseBillModel.STATE_CANCELLED:
-#             if not self.model.CANCELABLE:
-#                 raise HTTPException(
-#                     status_code=status.HTTP_400_BAD_REQUEST, detail="内部调用异常：此类单据不支持取消"
-#                 )
-#             elif prev_state < BaseBillModel.STATE_COMMIT:
-#                 raise HTTPException(
-#                     status_code=status.HTTP_400_BAD_REQUEST, detail="未提交单据不支持取消"
-#                 )
-#             else:
-#                 self.on_cancel(db, bill)
-
-#     def before_remove(self, db: Session, *, id: int):
-#         rs = super().before_remove(db, id=id)
-#         self.notify(BillEventEnum.delete, db, id)
-#         return rs
-
-#     def after_update(
-#         self, db: Session, *, obj_in: D, entity: BillModelType, prev: BillModelType
-#     ):
-#         entity = super().after_update(db, obj_in=obj_in, entity=entity, prev=prev)
-#         if obj_in.get("state") is not None and obj_in["state"] != prev.state:
-#             self.on_state_change(
-#                 db, bill=entity, state=entity.state, prev_state=prev.state
-#             )
-#         return entity
+from typing import Any, Iterable, NamedTuple, Optional, Sequence, Type
+
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ....common.typing import D
+from ....db import call_after_commit
+from ....utils.event_bus import AsyncEventBus, Subscriber
+from .hook import CRUDHookMixin, ModelType
+
+CRUD_EVENT_AFTER_CREATE = "after_create"
+CRUD_EVENT_AFTER_UPDATE = "after_update"
+CRUD_EVENT_BEFORE_REMOVE = "before_remove"
+
+# session.info 中的键: 本次提交中待发布的事件
+PENDING_EVENTS_KEY = "bc_fastkit.pending_events"
+
+
+class CRUDEvent(NamedTuple):
+    """
+    data/prev 为实体列值的快照(不触发延迟加载), 事件在 session 关闭后处理, 不携带 ORM 实体
+    """
+
+    event: str
+    model: Type[Any]
+    id: int
+    data: Optional[D] = None
+    prev: Optional[D] = None
+    obj_in: Optional[D] = None
+
+    @property
+    def topic(self):
+        return (self.model, self.event)
+
+
+def crud_event_topic(e: CRUDEvent):
+    return e.topic
+
+
+def create_crud_event_bus(**kwargs) -> AsyncEventBus[CRUDEvent]:
+    """按 (model, event) 分发的事件总线, 参数见 AsyncEventBus"""
+    return AsyncEventBus(topic=crud_event_topic, **kwargs)
+
+
+def entity_snapshot(entity: Any) -> Optional[D]:
+    if entity is None or isinstance(entity, dict):
+        return entity
+    state = inspect(entity)
+    return {
+        c.key: state.dict[c.key]
+        for c in state.mapper.column_attrs
+        if c.key in state.dict
+    }
+
+
+def add_pending_event(
+    db: Session | AsyncSession, bus: AsyncEventBus, e: CRUDEvent
+) -> None:
+    """
+    事件随所在事务(或 savepoint)提交: 由 call_after_commit 在最外层事务提交后放入待发布列表,
+    回滚(包括 savepoint 回滚)或未提交就关闭时丢弃
+    """
+    info = db.info
+    call_after_commit(
+        db, lambda: info.setdefault(PENDING_EVENTS_KEY, []).append((bus, e))
+    )
+
+
+# 在 call_after_commit 的监听器(导入 db 时注册)之后执行, 同一次提交的事件按 bus 一次发布
+@event.listens_for(Session, "after_commit")
+def publish_pending_events(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    by_bus: dict = {}
+    for bus, e in session.info.pop(PENDING_EVENTS_KEY, []):
+        by_bus.setdefault(bus, []).append(e)
+    for bus, events in by_bus.items():
+        bus.publish(events)
+
+
+class CRUDSubjectBase:
+    """
+    写操作事件在事务提交后发布到 event_bus, 由后台任务批量交给订阅者, 不增加写请求的耗时
+    订阅者接收同一 model/事件的事件列表: attach(subscriber, events)
+    """
+
+    DEFAULT_EVENTS: Sequence[str] = (
+        CRUD_EVENT_AFTER_CREATE,
+        CRUD_EVENT_AFTER_UPDATE,
+        CRUD_EVENT_BEFORE_REMOVE,
+    )
+    event_bus: Optional[AsyncEventBus[CRUDEvent]] = None
+    model: Type[Any]
+
+    def attach(
+        self, subscriber: Subscriber, events: Optional[Iterable[str] | str] = None
+    ) -> None:
+        assert self.event_bus is not None, "未配置 event_bus"
+        events = self.DEFAULT_EVENTS if events is None else events
+        if isinstance(events, str):
+            events = [events]
+        for e in events:
+            self.event_bus.subscribe((self.model, e), subscriber)
+
+    def detach(
+        self, subscriber: Subscriber, events: Optional[Iterable[str] | str] = None
+    ) -> None:
+        if self.event_bus is None:
+            return
+        events = self.DEFAULT_EVENTS if events is None else events
+        if isinstance(events, str):
+            events = [events]
+        for e in events:
+            self.event_bus.unsubscribe((self.model, e), subscriber)
+
+    def notify(
+        self,
+        db: Session | AsyncSession,
+        event_name: str,
+        id: int,
+        entity: Any = None,
+        *,
+        prev: Any = None,
+        obj_in: Optional[D] = None,
+    ) -> None:
+        bus = self.event_bus
+        if bus is None or not bus.subscribers.get((self.model, event_name)):
+            return
+        add_pending_event(
+            db,
+            bus,
+            CRUDEvent(
+                event_name,
+                self.model,
+                id,
+                entity_snapshot(entity),
+                entity_snapshot(prev),
+                dict(obj_in) if obj_in is not None else None,
+            ),
+        )
+
+
+class CUDSubjectMixin(CRUDSubjectBase, CRUDHookMixin[ModelType]):
+    def after_create(self, db: Session, *, obj_in: D, entity: ModelType) -> ModelType:
+        entity = super().after_create(db, obj_in=obj_in, entity=entity)
+        self.notify(db, CRUD_EVENT_AFTER_CREATE, entity.id, entity, obj_in=obj_in)
+        return entity
+
+    def after_update(
+        self, db: Session, *, obj_in: D, entity: ModelType, prev: ModelType
+    ) -> ModelType:
+        entity = super().after_update(db, obj_in=obj_in, entity=entity, prev=prev)
+        self.notify(
+            db, CRUD_EVENT_AFTER_UPDATE, entity.id, entity, prev=prev, obj_in=obj_in
+        )
+        return entity
+
+    def before_remove(self, db: Session, *, id: int) -> int:
+        id = super().before_remove(db, id=id)
+        self.notify(db, CRUD_EVENT_BEFORE_REMOVE, id)
+        return id
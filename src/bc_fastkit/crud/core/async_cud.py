@@ -1,10 +1,19 @@
-from typing import Any, List, Type
+from typing import Any, List, Optional, Type
 
-from sqlalchemy import delete, select, update
+from sqlalchemy import delete, func, select, update
 from sqlalchemy.dialects.mysql import insert as dialect_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...common.typing import D
+from ...db import mark_written
+from ...db.outbox import (
+    OUTBOX_OP_CREATE,
+    OUTBOX_OP_REMOVE,
+    OUTBOX_OP_UPDATE,
+    async_record_changes,
+    is_outbox_enabled,
+)
+from .cud import conflict_statement, plan_replacement, removed_ids_statement
 from .typing import ModelType
 
 
@@ -18,6 +27,7 @@ async def db_async_create(
         db.add(db_obj)
         await db.flush()
         await db.refresh(db_obj)
+        await async_record_changes(db, model, OUTBOX_OP_CREATE, [db_obj.id])
     except Exception as e:
         await db.rollback()
         raise e
@@ -29,13 +39,27 @@ async def db_async_create_or_update(
 ):
     try:
         values = {k: v for k, v in obj_in.items() if k in model.creatable_column_names}
+        existed = False
+        if is_outbox_enabled(model):
+            # 不能用影响行数区分新增/更新: 驱动默认开启 CLIENT_FOUND_ROWS, 值未变的更新也返回 1
+            conflict = conflict_statement(model, values)
+            existed = (
+                conflict is not None
+                and (await db.execute(conflict)).first() is not None
+            )
 
         update_values = {
             k: v for k, v in obj_in.items() if k in model.mutable_column_names
         }
+        if is_outbox_enabled(model):
+            # 更新时 lastrowid 也返回该行 id
+            update_values["id"] = func.last_insert_id(model.id)
         stmt = dialect_insert(model).values(**values)  # type: ignore
         stmt = stmt.on_duplicate_key_update(**update_values)
-        await db.execute(stmt)
+        result = await db.execute(stmt)
+        if is_outbox_enabled(model) and result.lastrowid:
+            op = OUTBOX_OP_UPDATE if existed else OUTBOX_OP_CREATE
+            await async_record_changes(db, model, op, [result.lastrowid])
     except Exception as e:
         await db.rollback()
         raise e
@@ -50,12 +74,20 @@ async def db_async_update(
             stmt = update(model).where(model.id == obj_in["id"]).values(d)
             await db.execute(stmt)
             await db.flush()
+            await async_record_changes(
+                db, model, OUTBOX_OP_UPDATE, [obj_in["id"]], [list(d)]
+            )
     except Exception as e:
         await db.rollback()
         raise e
 
     # Re-fetch the object
-    result = await db.execute(select(model).where(model.id == obj_in["id"]))
+    # populate_existing: 覆盖 identity map 中的旧值, 包括数据库更新的 update_time(ON UPDATE)等列
+    result = await db.execute(
+        select(model)
+        .where(model.id == obj_in["id"])
+        .execution_options(populate_existing=True)
+    )
     return result.scalars().first()
 
 
@@ -67,18 +99,112 @@ async def db_async_multi_create(
         for obj_in in obj_ins
     ]
     try:
-        # Use simple insert for multiple values if driver supports it
-        # bulk_insert_mappings is not directly available on AsyncSession in the same way
-        # db.execute(insert(model), obj_in_datas) is preferred for SQLAlchemy 2.0 async
-        from sqlalchemy import insert
+        if is_outbox_enabled(model):
+            # 变更记录需要新增的 id: 支持 RETURNING 的数据库一次批量插入并回填,
+            # MySQL 不支持 RETURNING, 退化为逐条 INSERT 取 lastrowid(不构造 ORM 实体), 大批量时明显变慢
+            await db.run_sync(
+                lambda session: session.bulk_insert_mappings(
+                    model, obj_in_datas, return_defaults=True  # type: ignore
+                )
+            )
+            await async_record_changes(
+                db, model, OUTBOX_OP_CREATE, [d["id"] for d in obj_in_datas]
+            )
+            # bulk_insert_mappings 不触发 flush/ORM 语句事件
+            mark_written(db, model)
+        else:
+            # Use simple insert for multiple values if driver supports it
+            # bulk_insert_mappings is not directly available on AsyncSession in the same way
+            # db.execute(insert(model), obj_in_datas) is preferred for SQLAlchemy 2.0 async
+            from sqlalchemy import insert
 
-        await db.execute(insert(model), obj_in_datas)
+            await db.execute(insert(model), obj_in_datas)
         await db.flush()
     except Exception as e:
         await db.rollback()
         raise e
 
 
+async def db_async_multi_add(
+    db: AsyncSession, *, obj_ins: List[D], model: Type[ModelType]
+) -> List[ModelType]:
+    """批量新增并回填 id, 一次 flush, 不逐条 refresh"""
+    try:
+        db_objs = [
+            model(
+                **{k: v for k, v in obj_in.items() if k in model.creatable_column_names}
+            )  # type: ignore
+            for obj_in in obj_ins
+        ]
+        db.add_all(db_objs)
+        await db.flush()
+        await async_record_changes(db, model, OUTBOX_OP_CREATE, [o.id for o in db_objs])
+    except Exception as e:
+        await db.rollback()
+        raise e
+    return db_objs
+
+
+async def db_async_multi_update(
+    db: AsyncSession, *, obj_ins: List[D], model: Type[ModelType]
+):
+    """按主键批量更新(executemany), 各条可更新不同的列"""
+    rows = []
+    for obj_in in obj_ins:
+        d = {k: v for k, v in obj_in.items() if k in model.mutable_column_names}
+        if d:
+            rows.append({"id": obj_in["id"], **d})
+    if not rows:
+        return
+    try:
+        await db.execute(update(model), rows)
+        await db.flush()
+        await async_record_changes(
+            db,
+            model,
+            OUTBOX_OP_UPDATE,
+            [r["id"] for r in rows],
+            [[k for k in r if k != "id"] for r in rows],
+        )
+    except Exception as e:
+        await db.rollback()
+        raise e
+
+
+async def db_async_multi_remove(
+    db: AsyncSession, *, ids: List[Any], model: Type[ModelType]
+) -> List[Any]:
+    if not ids:
+        return ids
+    if model.is_fake_delete and model.unique_column_names:
+        # 唯一键需要逐条重命名
+        return [await db_async_remove(db, id=id, model=model) for id in ids]
+    removed_ids = (
+        (await db.scalars(removed_ids_statement(model, ids))).all()
+        if is_outbox_enabled(model)
+        else []
+    )
+    if model.is_fake_delete:
+        await db.execute(
+            update(model)
+            .where(model.id.in_(ids))
+            .values(is_deleted=1)
+            .execution_options(synchronize_session=False)
+        )
+    elif model.is_real_delete:
+        await db.execute(
+            delete(model)
+            .where(model.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        await db.rollback()
+        raise ValueError(f"模型{model}未配置删除方式")
+    await db.flush()
+    await async_record_changes(db, model, OUTBOX_OP_REMOVE, removed_ids)
+    return ids
+
+
 async def db_async_remove(db: AsyncSession, *, id: Any, model: Type[ModelType]) -> Any:
     if model.is_fake_delete:
         d: Any = {"is_deleted": 1}
@@ -100,12 +226,48 @@ async def db_async_remove(db: AsyncSession, *, id: Any, model: Type[ModelType])
                 val = getattr(entity, unique_column)
                 d[unique_column] = f"{val}{model.FAKE_DELETE_UK_SUFFIX}{delete_no:03d}"
 
-        await db.execute(update(model).where(model.id == id).values(d))
+        # 已删除的行不再重命名, 也不重复记录删除
+        result = await db.execute(
+            update(model).where(model.id == id, model.is_deleted == 0).values(d)
+        )
     elif model.is_real_delete:
-        await db.execute(delete(model).where(model.id == id))
+        result = await db.execute(delete(model).where(model.id == id))
     else:
         await db.rollback()
         raise ValueError(f"模型{model}未配置删除方式")
 
     await db.flush()
+    if result.rowcount:
+        await async_record_changes(db, model, OUTBOX_OP_REMOVE, [id])
     return id
+
+
+async def db_async_multi_replace(
+    db: AsyncSession,
+    *,
+    old_entities: List[ModelType],
+    new_objs: List[D],
+    model: Type[ModelType],
+    return_created: bool = True,
+    unique_columns: Optional[List[str]] = None,
+) -> List[ModelType]:
+    """
+    按 plan_replacement 批量替换子表: 一次删除 + 一次 executemany 更新 + 一次新增
+    返回新增的实体; 被更新/删除的旧实体会被 expire, 之后读取时重新加载
+    return_created=False 时新增不回填 id(MySQL 无 RETURNING, 回填 id 需逐条 INSERT), 返回空列表
+    """
+    updates, creates, remove_ids = plan_replacement(
+        old_entities, new_objs, model, unique_columns
+    )
+    await db_async_multi_remove(db, ids=remove_ids, model=model)
+    await db_async_multi_update(db, obj_ins=updates, model=model)
+    changed = set(remove_ids) | {u["id"] for u in updates}
+    for e in old_entities:
+        if e.id in changed:
+            db.expire(e)
+    if not creates:
+        return []
+    if not return_created:
+        await db_async_multi_create(db, obj_ins=creates, model=model)
+        return []
+    return await db_async_multi_add(db, obj_ins=creates, model=model)
@@ -1,9 +1,10 @@
-from typing import Any, Dict, List, Optional, Tuple, Type
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
 
 from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import Select
 
-from .query import uniform_regexp_string
+from .query import KEYS_PARAM, chunked, uniform_regexp_string, unique_ids
 from .typing import ModelType
 
 
@@ -93,18 +94,39 @@ async def async_sql_page_filter(
     skip: int,
     limit: int,
     order_by: Optional[List[Any]] = None,
+    lean: bool = False,
 ) -> Tuple[List[Any], int]:
     order_by = order_by or [model.id.desc()]
     query = async_sql_filter(q=q, query=query, model=model)
 
     # Get total count first
-    count_stmt = select(func.count()).select_from(query.subquery())
+    count_stmt = (
+        select(func.count())
+        .select_from(query.subquery())
+        .execution_options(**query.get_execution_options())
+    )
     count_result = await db.execute(count_stmt)
     total = count_result.scalar() or 0
 
     # Get paginated results
     paginated_stmt = query.order_by(*order_by).offset(skip).limit(limit)
     res = await db.execute(paginated_stmt)
-    data = res.scalars().all()
+    # lean 模式返回行元组, 否则返回 ORM 实体
+    data = res.all() if lean else res.scalars().all()
 
     return list(data), total
+
+
+async def async_sql_fetch_by_keys(
+    db: AsyncSession,
+    stmt: Select,
+    keys: Iterable[Any],
+    chunk_size: int,
+    scalars=True,
+) -> List[Any]:
+    """执行 key_lookup_statement(many=True) 语句, keys 去重后分块绑定到 KEYS_PARAM"""
+    rows: List[Any] = []
+    for chunk in chunked(unique_ids(keys), chunk_size):
+        result = await db.execute(stmt, {KEYS_PARAM: chunk})
+        rows.extend(result.scalars().all() if scalars else result.all())
+    return rows
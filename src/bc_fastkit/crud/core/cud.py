@@ -1,10 +1,19 @@
-from typing import Any, List, Type
+from typing import Any, List, Optional, Tuple, Type
 
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, and_, delete, func, or_, select, update
 from sqlalchemy.dialects.mysql import insert as dialect_insert
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
 
 from ...common.typing import D
+from ...db import mark_written
+from ...db.outbox import (
+    OUTBOX_OP_CREATE,
+    OUTBOX_OP_REMOVE,
+    OUTBOX_OP_UPDATE,
+    is_outbox_enabled,
+    record_changes,
+)
 from .typing import ModelType
 
 
@@ -16,22 +25,61 @@ def db_create(db: Session, *, obj_in: D, model: Type[ModelType]) -> ModelType:
         db.add(db_obj)
         db.flush()
         db.refresh(db_obj)
+        record_changes(db, model, OUTBOX_OP_CREATE, [db_obj.id])
     except Exception as e:
         db.rollback()
         raise e
     return db_obj
 
 
+def unique_key_columns(model: Type[ModelType]) -> List[List[str]]:
+    """主键及各唯一约束/唯一索引的列名"""
+    table = model.__table__  # type: ignore
+    keys = [[c.name for c in table.primary_key.columns]]
+    keys += [
+        [c.name for c in u.columns]
+        for u in table.constraints
+        if isinstance(u, UniqueConstraint)
+    ]
+    keys += [[c.name for c in i.columns] for i in table.indexes if i.unique]
+    return keys
+
+
+def conflict_statement(model: Type[ModelType], values: D) -> Optional[Select]:
+    """ON DUPLICATE KEY UPDATE 会命中的已有行: values 包含的某个主键/唯一键全部相等"""
+    table = model.__table__  # type: ignore
+    clauses = [
+        and_(*[table.c[c] == values[c] for c in columns])
+        for columns in unique_key_columns(model)
+        if all(c in values for c in columns)
+    ]
+    if not clauses:
+        return None
+    return select(table.c.id).where(or_(*clauses)).limit(1)
+
+
 def db_create_or_update(db: Session, *, obj_in: D, model: Type[ModelType]):
     try:
         values = {k: v for k, v in obj_in.items() if k in model.creatable_column_names}
+        existed = False
+        if is_outbox_enabled(model):
+            # 不能用影响行数区分新增/更新: 驱动默认开启 CLIENT_FOUND_ROWS, 值未变的更新也返回 1
+            # 与并发的同键新增竞争时可能记为新增, 两种记录都带实体 id
+            conflict = conflict_statement(model, values)
+            existed = conflict is not None and db.execute(conflict).first() is not None
 
         update_values = {
             k: v for k, v in obj_in.items() if k in model.mutable_column_names
         }
+        if is_outbox_enabled(model):
+            # 更新时 lastrowid 也返回该行 id
+            update_values["id"] = func.last_insert_id(model.id)
         stmt = dialect_insert(model).values(**values)  # type: ignore
         stmt = stmt.on_duplicate_key_update(**update_values)
-        db.execute(stmt)
+        result = db.execute(stmt)
+        if is_outbox_enabled(model) and result.lastrowid:
+            op = OUTBOX_OP_UPDATE if existed else OUTBOX_OP_CREATE
+            record_changes(db, model, op, [result.lastrowid])
     except Exception as e:
         db.rollback()
         raise e
@@ -43,10 +91,12 @@ def db_update(db: Session, *, obj_in: D, model: Type[ModelType]) -> ModelType |
         if d:
             db.query(model).filter(model.id == obj_in["id"]).update(d)
             db.flush()
+            record_changes(db, model, OUTBOX_OP_UPDATE, [obj_in["id"]], [list(d)])
     except Exception as e:
         db.rollback()
         raise e
-    return db.query(model).get(obj_in["id"])
+    # populate_existing: 覆盖 identity map 中的旧值, 包括数据库更新的 update_time(ON UPDATE)等列
+    return db.query(model).populate_existing().filter(model.id == obj_in["id"]).first()
 
 
 def db_multi_create(db: Session, *, obj_ins: List[D], model: Type[ModelType]):
@@ -55,13 +105,107 @@ def db_multi_create(db: Session, *, obj_ins: List[D], model: Type[ModelType]):
         for obj_in in obj_ins
     ]
     try:
-        db.bulk_insert_mappings(model, obj_in_datas)  # type: ignore
+        if is_outbox_enabled(model):
+            # 变更记录需要新增的 id: 支持 RETURNING 的数据库一次批量插入并回填,
+            # MySQL 不支持 RETURNING, 退化为逐条 INSERT 取 lastrowid(不构造 ORM 实体), 大批量时明显变慢
+            db.bulk_insert_mappings(model, obj_in_datas, return_defaults=True)  # type: ignore
+            record_changes(db, model, OUTBOX_OP_CREATE, [d["id"] for d in obj_in_datas])
+        else:
+            db.bulk_insert_mappings(model, obj_in_datas)  # type: ignore
+        # bulk_insert_mappings 不触发 flush/ORM 语句事件
+        mark_written(db, model)
         db.flush()
     except Exception as e:
         db.rollback()
         raise e
 
 
+def db_multi_add(
+    db: Session, *, obj_ins: List[D], model: Type[ModelType]
+) -> List[ModelType]:
+    """批量新增并回填 id, 一次 flush, 不逐条 refresh"""
+    try:
+        db_objs = [
+            model(
+                **{k: v for k, v in obj_in.items() if k in model.creatable_column_names}
+            )  # type: ignore
+            for obj_in in obj_ins
+        ]
+        db.add_all(db_objs)
+        db.flush()
+        record_changes(db, model, OUTBOX_OP_CREATE, [o.id for o in db_objs])
+    except Exception as e:
+        db.rollback()
+        raise e
+    return db_objs
+
+
+def db_multi_update(db: Session, *, obj_ins: List[D], model: Type[ModelType]):
+    """按主键批量更新(executemany), 各条可更新不同的列"""
+    rows = []
+    for obj_in in obj_ins:
+        d = {k: v for k, v in obj_in.items() if k in model.mutable_column_names}
+        if d:
+            rows.append({"id": obj_in["id"], **d})
+    if not rows:
+        return
+    try:
+        db.execute(update(model), rows)
+        db.flush()
+        record_changes(
+            db,
+            model,
+            OUTBOX_OP_UPDATE,
+            [r["id"] for r in rows],
+            [[k for k in r if k != "id"] for r in rows],
+        )
+    except Exception as e:
+        db.rollback()
+        raise e
+
+
+def removed_ids_statement(model: Type[ModelType], ids: List[Any]) -> Select:
+    """变更记录只包含实际删除的行: 存在且(假删除时)未删除, 加锁避免与并发的删除重复记录"""
+    stmt = select(model.id).where(model.id.in_(ids))
+    if model.is_fake_delete:
+        stmt = stmt.where(model.is_deleted == 0)
+    return stmt.with_for_update()
+
+
+def db_multi_remove(
+    db: Session, *, ids: List[int], model: Type[ModelType]
+) -> List[int]:
+    if not ids:
+        return ids
+    if model.is_fake_delete and model.unique_column_names:
+        # 唯一键需要逐条重命名
+        return [db_remove(db, id=id, model=model) for id in ids]
+    removed_ids = (
+        db.scalars(removed_ids_statement(model, ids)).all()
+        if is_outbox_enabled(model)
+        else []
+    )
+    if model.is_fake_delete:
+        db.execute(
+            update(model)
+            .where(model.id.in_(ids))
+            .values(is_deleted=1)
+            .execution_options(synchronize_session=False)
+        )
+    elif model.is_real_delete:
+        db.execute(
+            delete(model)
+            .where(model.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        db.rollback()
+        raise ValueError(f"模型{model}未配置删除方式")
+    db.flush()
+    record_changes(db, model, OUTBOX_OP_REMOVE, removed_ids)
+    return ids
+
+
 def db_remove(db: Session, *, id: int, model: Type[ModelType]) -> int:
     if model.is_fake_delete:
         d: Any = {"is_deleted": 1}
@@ -81,14 +225,20 @@ def db_remove(db: Session, *, id: int, model: Type[ModelType]) -> int:
                 d[unique_column] = (
                     f"{getattr(entity, unique_column)}{model.FAKE_DELETE_UK_SUFFIX}{delete_no:03d}"
                 )
-        db.query(model).filter(model.id == id).update(d)
+        # 已删除的行不再重命名, 也不重复记录删除
+        removed = (
+            db.query(model).filter(model.id == id, model.is_deleted == 0).update(d)
+        )
     elif model.is_real_delete:
         obj = db.query(model).get(id)
         db.delete(obj)
+        removed = 1
     else:
         db.rollback()
         raise ValueError(f"模型{model}未配置删除方式")
     db.flush()
+    if removed:
+        record_changes(db, model, OUTBOX_OP_REMOVE, [id])
     return id
 
 
@@ -143,7 +293,111 @@ def db_multi_replacement_update(
         db.query(model).filter(model.id.in_([m.id for m in remove_entities])).update(
             {"is_deleted": 1}
         )
+    record_changes(db, model, OUTBOX_OP_REMOVE, [m.id for m in remove_entities])
     db_multi_create(db, obj_ins=create_objs, model=model)
     for idx, m in enumerate(update_entities):
         new_objs[idx]["id"] = m.id
         db_update(db, obj_in=new_objs[idx], model=model)
+
+
+def replacement_key_columns(
+    model: Type[ModelType], unique_columns: Optional[List[str]] = None
+) -> List[str]:
+    """plan_replacement 配对使用的唯一约束列: 指定的 unique_columns, 或模型唯一的 UniqueConstraint"""
+    if unique_columns is not None:
+        return list(unique_columns)
+    unique_keys = [
+        u
+        for u in model.__table__.constraints  # type: ignore
+        if isinstance(u, UniqueConstraint)  # type: ignore
+    ]
+    if len(unique_keys) > 1:
+        raise ValueError(f"模型{model}有多个唯一约束, 需指定 unique_columns")
+    return [c.name for c in unique_keys[0].columns] if unique_keys else []
+
+
+def plan_replacement(
+    old_entities: List[ModelType],
+    new_objs: List[D],
+    model: Type[ModelType],
+    unique_columns: Optional[List[str]] = None,
+) -> Tuple[List[D], List[D], List[int]]:
+    """
+    子表整体替换的差异计划, 返回 (更新, 新增, 删除 id)
+    新数据依次按 id / 唯一约束列 与旧数据配对, 剩余的按顺序复用旧行;
+    唯一约束列为 unique_columns, 未指定时为模型的唯一约束(有多个时报错), 空列表表示不按唯一约束配对
+    更新只包含值有变化的列, 无变化的行不更新
+    """
+    column_names = replacement_key_columns(model, unique_columns)
+    olds = {e.id: e for e in old_entities}
+    pairs: List[Tuple[ModelType, D]] = []
+    rest: List[D] = []
+    for n in new_objs:
+        old = olds.pop(n["id"], None) if n.get("id") is not None else None
+        if old is not None:
+            pairs.append((old, n))
+        else:
+            rest.append(n)
+    if column_names:
+        by_unique = {
+            tuple(getattr(e, c) for c in column_names): e for e in olds.values()
+        }
+        unmatched = []
+        for n in rest:
+            old = by_unique.pop(tuple(n.get(c) for c in column_names), None)
+            if old is not None:
+                olds.pop(old.id)
+                pairs.append((old, n))
+            else:
+                unmatched.append(n)
+        rest = unmatched
+    reusable = list(olds.values())
+    pairs.extend(zip(reusable, rest))
+    creates = rest[len(reusable) :]
+    remove_ids = [e.id for e in reusable[len(rest) :]]
+    updates = []
+    for old, n in pairs:
+        d = {
+            k: v
+            for k, v in n.items()
+            if k in model.mutable_column_names
+            and getattr(old, k) != model.transfer_column_value(k, v)
+        }
+        if d:
+            updates.append({**d, "id": old.id})
+    return (
+        updates,
+        [{k: v for k, v in n.items() if k != "id"} for n in creates],
+        remove_ids,
+    )
+
+
+def db_multi_replace(
+    db: Session,
+    *,
+    old_entities: List[ModelType],
+    new_objs: List[D],
+    model: Type[ModelType],
+    return_created: bool = True,
+    unique_columns: Optional[List[str]] = None,
+) -> List[ModelType]:
+    """
+    按 plan_replacement 批量替换子表: 一次删除 + 一次 executemany 更新 + 一次新增
+    返回新增的实体; 被更新/删除的旧实体会被 expire, 之后读取时重新加载
+    return_created=False 时新增不回填 id(MySQL 无 RETURNING, 回填 id 需逐条 INSERT), 返回空列表
+    """
+    updates, creates, remove_ids = plan_replacement(
+        old_entities, new_objs, model, unique_columns
+    )
+    db_multi_remove(db, ids=remove_ids, model=model)
+    db_multi_update(db, obj_ins=updates, model=model)
+    changed = set(remove_ids) | {u["id"] for u in updates}
+    for e in old_entities:
+        if e.id in changed:
+            db.expire(e)
+    if not creates:
+        return []
+    if not return_created:
+        db_multi_create(db, obj_ins=creates, model=model)
+        return []
+    return db_multi_add(db, obj_ins=creates, model=model)
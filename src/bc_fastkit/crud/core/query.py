@@ -1,7 +1,11 @@
-from typing import Any, Dict, List, Optional, Tuple, Type
+import json
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple, Type
 
-from sqlalchemy import or_
-from sqlalchemy.orm import Query
+from sqlalchemy import bindparam, or_, select
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql import Select
 
 from .typing import BaseModel, ModelType
 
@@ -131,3 +135,123 @@ def sql_page_filter(
     query = sql_filter(q=q, query=query, model=model)
     rs = query.order_by(*order_by).offset(skip).limit(limit).all()
     return rs, query.count()
+
+
+def search_key(model: Type[ModelType], **params: Any) -> Hashable:
+    """查询参数规范化为可哈希 key, 用于合并并发的相同查询"""
+    return (model, json.dumps(params, sort_keys=True, default=str))
+
+
+# 按键查询语句的绑定参数名
+KEY_PARAM = "key_value"
+KEYS_PARAM = "key_values"
+
+
+@lru_cache(maxsize=None)
+def key_lookup_statement(
+    model: Type[ModelType],
+    column: str = "id",
+    many: bool = False,
+    for_update: bool = False,
+    execution_options: Tuple[Tuple[str, Any], ...] = (),
+    columns: Tuple[str, ...] = (),
+) -> Select:
+    """
+    按单列等值(many 时为 IN)查询的预构建语句, 每个 model 只构建一次
+    值通过绑定参数 KEY_PARAM / KEYS_PARAM 传入, 语句本身不变, 命中 SQLAlchemy 编译缓存
+    假删除过滤与 sql_filter 一致; columns 不为空时只查询 column 及这些列
+    many 时按 (column, id) 排序
+    """
+    col = getattr(model, column)
+    entities = (
+        [getattr(model, c) for c in dict.fromkeys((column, *columns))]
+        if columns
+        else [model]
+    )
+    stmt = select(*entities).where(
+        col.in_(bindparam(KEYS_PARAM, expanding=True))
+        if many
+        else col == bindparam(KEY_PARAM)
+    )
+    if model.is_fake_delete:
+        stmt = stmt.where(model.is_deleted == 0)
+    if many:
+        # 按 (column, id) 排序, group_rows 分组后每组内顺序稳定
+        stmt = stmt.order_by(col, model.id)
+    if for_update:
+        stmt = stmt.with_for_update()
+    elif not many:
+        stmt = stmt.limit(1)
+    if execution_options:
+        stmt = stmt.execution_options(**dict(execution_options))
+    return stmt
+
+
+def unique_ids(ids: Iterable[Any]) -> List[Any]:
+    """去重并保持首次出现的顺序, 忽略 None"""
+    return [id for id in dict.fromkeys(ids) if id is not None]
+
+
+def chunked(items: List[Any], size: int) -> Iterator[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def sql_fetch_by_keys(
+    db: Session, stmt: Select, keys: Iterable[Any], chunk_size: int, scalars=True
+) -> List[Any]:
+    """执行 key_lookup_statement(many=True) 语句, keys 去重后分块绑定到 KEYS_PARAM"""
+    rows: List[Any] = []
+    for chunk in chunked(unique_ids(keys), chunk_size):
+        result = db.execute(stmt, {KEYS_PARAM: chunk})
+        rows.extend(result.scalars().all() if scalars else result.all())
+    return rows
+
+
+def group_rows(rows: Iterable[Any], column: str) -> Dict[Any, List[Any]]:
+    """{column 值: [row]}, row 为实体或 Row"""
+    index: Dict[Any, List[Any]] = {}
+    for r in rows:
+        index.setdefault(getattr(r, column), []).append(r)
+    return index
+
+
+def index_rows(rows: Iterable[Any], column: str) -> Dict[Any, Any]:
+    """{column 值: row}, 重复时保留第一条"""
+    index: Dict[Any, Any] = {}
+    for r in rows:
+        index.setdefault(getattr(r, column), r)
+    return index
+
+
+def encode_watermark(update_time: datetime, id: int) -> str:
+    return f"{update_time.isoformat()}_{id}"
+
+
+def decode_watermark(watermark: str) -> Tuple[datetime, int]:
+    """watermark 格式错误时抛出 ValueError"""
+    update_time, _, id = watermark.rpartition("_")
+    return datetime.fromisoformat(update_time), int(id)
+
+
+def changed_since_statement(
+    model: Type[ModelType],
+    watermark: Optional[str] = None,
+    cutoff: Optional[datetime] = None,
+    limit: int = 500,
+) -> Select:
+    """
+    (update_time, id) 键集分页查询 watermark 之后变更的行, 包括假删除的行
+    cutoff: 只返回 update_time 早于它的行, 同一秒内稍后提交的行不会被已返回的 watermark 跳过
+    """
+    stmt = select(model)
+    if watermark:
+        update_time, id = decode_watermark(watermark)
+        # update_time >= 作为索引范围条件, 再排除同一时间已返回的行
+        stmt = stmt.where(
+            model.update_time >= update_time,
+            or_(model.update_time > update_time, model.id > id),
+        )
+    if cutoff is not None:
+        stmt = stmt.where(model.update_time < cutoff)
+    return stmt.order_by(model.update_time, model.id).limit(limit)
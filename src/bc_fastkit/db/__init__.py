@@ -0,0 +1,276 @@
+import random
+import time
+from typing import Annotated, Any, Sequence
+
+from fastapi import Depends
+from sqlalchemy import Engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import ORMExecuteState, Session, sessionmaker
+from sqlalchemy.sql import Select
+
+from .engine import (
+    DEFAULT_POOL_OPTIONS,
+    Histogram,
+    PoolStats,
+    create_async_db_engine,
+    create_db_engine,
+    get_pool_stats,
+    pool_status,
+)
+from .outbox import (
+    OUTBOX_OP_CREATE,
+    OUTBOX_OP_REMOVE,
+    OUTBOX_OP_UPDATE,
+    AsyncOutboxRelay,
+    ChangeRecord,
+    MemorySink,
+    OutboxRelay,
+    outbox_metadata,
+    outbox_table,
+)
+from .transaction import call_after_commit, mark_models_written, on_model_committed
+
+# 语句级 execution option: 强制走主库
+USE_PRIMARY_OPTION = "use_primary"
+# session.info 中的键: 本请求内已写入(或显式指定)后, 之后的读也留在主库
+PRIMARY_STICKY_KEY = "bc_fastkit.primary_sticky"
+
+
+# session.info 中的键: 当前事务中已 flush 过写操作
+SESSION_WRITTEN_KEY = "bc_fastkit.session_written"
+# create_sibling_session 复制到新 session 的 session.info 键(会话级设置), 其余为 session 自身的状态
+INHERITED_INFO_KEYS = {PRIMARY_STICKY_KEY}
+# session.info 中的键: 创建该 session 的 sessionmaker
+SESSION_FACTORY_KEY = "bc_fastkit.session_factory"
+
+
+@event.listens_for(Session, "after_flush")
+def mark_session_written(session: Session, flush_context) -> None:
+    session.info[SESSION_WRITTEN_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def mark_session_dml(state: ORMExecuteState) -> None:
+    # session.execute(update/delete/insert) 不经过 flush
+    if state.is_update or state.is_delete or state.is_insert:
+        state.session.info[SESSION_WRITTEN_KEY] = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def clear_session_written(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop(SESSION_WRITTEN_KEY, None)
+
+
+def mark_written(db: Session | AsyncSession, model: Any) -> None:
+    """不经过 flush/ORM 语句的写(如 bulk_insert_mappings)需手动标记, 同 after_flush/do_orm_execute 的标记"""
+    session = db.sync_session if isinstance(db, AsyncSession) else db
+    session.info[SESSION_WRITTEN_KEY] = True
+    mark_models_written(session, [model])
+
+
+def has_uncommitted_writes(db: Session | AsyncSession) -> bool:
+    return bool(db.new or db.dirty or db.deleted or db.info.get(SESSION_WRITTEN_KEY))
+
+
+def remember_session_factory(maker: sessionmaker | async_sessionmaker):
+    """在 maker 创建的 session.info 中记录 maker 本身, create_sibling_session 由它创建同配置的 session"""
+    maker.kw["info"] = {**(maker.kw.get("info") or {}), SESSION_FACTORY_KEY: maker}
+    return maker
+
+
+def can_create_sibling(db: Session | AsyncSession) -> bool:
+    sync_session = db.sync_session if isinstance(db, AsyncSession) else db
+    return (
+        SESSION_FACTORY_KEY in db.info
+        or sync_session.bind is not None
+        or bool(sync_session.binds)
+    )
+
+
+def get_session_options(db: Session | AsyncSession) -> dict:
+    """未记录 sessionmaker 时, 从 db 自身复制 bind/binds 及主要选项"""
+    session = db.sync_session if isinstance(db, AsyncSession) else db
+    # AsyncSession 的 bind/binds 为 async engine, 其 sync_session 的为对应的 sync engine
+    binds = db._async_binds if isinstance(db, AsyncSession) else session.binds
+    return dict(
+        bind=db.bind,
+        binds=dict(binds),
+        autoflush=session.autoflush,
+        expire_on_commit=session.expire_on_commit,
+        twophase=session.twophase,
+        query_cls=session._query_cls,
+        join_transaction_mode=session.join_transaction_mode,
+        execution_options=session.execution_options,
+    )
+
+
+def create_sibling_session(db: Session | AsyncSession) -> Session | AsyncSession:
+    """
+    与 db 同配置(bind/binds/replicas 及 sessionmaker 选项)的独立 session, 用于并发/共享的只读查询,
+    继承 INHERITED_INFO_KEYS 中的设置(语句超时/主库等)
+    db 由 create_*sessionmaker 创建时由原 sessionmaker 创建, 否则复制 db 的 bind/binds 和选项
+    独立 session 使用连接池中的其他连接, 看不到 db 未提交的写
+    """
+    sync_session = db.sync_session if isinstance(db, AsyncSession) else db
+    # 与 db 读同一个从库, 避免不同从库的延迟不一致
+    kwargs = (
+        {"replicas": [sync_session.replica]}
+        if isinstance(sync_session, RoutingSession) and sync_session.replicas
+        else {}
+    )
+    maker = db.info.get(SESSION_FACTORY_KEY)
+    if maker is not None:
+        sibling = maker(**kwargs)
+    elif isinstance(db, AsyncSession):
+        sibling = AsyncSession(
+            sync_session_class=type(sync_session),
+            **get_session_options(db),
+            **kwargs,
+        )
+    else:
+        sibling = type(db)(**get_session_options(db), **kwargs)
+    sibling.info.update({k: v for k, v in db.info.items() if k in INHERITED_INFO_KEYS})
+    return sibling
+
+
+def use_primary(db: Session | AsyncSession) -> None:
+    """之后的所有语句都走主库"""
+    db.info[PRIMARY_STICKY_KEY] = True
+
+
+def is_replica_readable(clause: Any) -> bool:
+    """只有普通 SELECT 可以走从库, 加锁/DML/文本语句以及标记 use_primary 的语句走主库"""
+    if not isinstance(clause, Select):
+        return False
+    if clause._for_update_arg is not None:
+        return False
+    return not clause.get_execution_options().get(USE_PRIMARY_OPTION)
+
+
+class RoutingSession(Session):
+    """
+    读写分离 session
+    只读 SELECT 路由到 replicas 中随机选定的一个(整个 session 固定), 同一请求内的多次读看到同一从库的数据
+    lock/写操作以及同一 session 中写之后的读都走主库(bind)
+    """
+
+    def __init__(self, *args, replicas: Sequence[Engine | AsyncEngine] = (), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = [
+            r.sync_engine if isinstance(r, AsyncEngine) else r for r in replicas
+        ]
+        self._replica = None
+
+    @property
+    def replica(self) -> Engine:
+        if self._replica is None:
+            self._replica = random.choice(self.replicas)
+        return self._replica
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        primary = super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if not self.replicas or self.info.get(PRIMARY_STICKY_KEY):
+            return primary
+        if self._flushing or not is_replica_readable(clause):
+            # 无语句的取连接(如 session.connection())不视为写
+            if self._flushing or clause is not None:
+                self.info[PRIMARY_STICKY_KEY] = True
+            return primary
+        return self.replica
+
+
+def create_routing_sessionmaker(
+    primary: Engine, replicas: Sequence[Engine] = (), **kwargs
+) -> sessionmaker:
+    return remember_session_factory(
+        sessionmaker(bind=primary, class_=RoutingSession, replicas=replicas, **kwargs)
+    )
+
+
+def create_async_routing_sessionmaker(
+    primary: AsyncEngine, replicas: Sequence[AsyncEngine] = (), **kwargs
+) -> async_sessionmaker:
+    return remember_session_factory(
+        async_sessionmaker(
+            bind=primary, sync_session_class=RoutingSession, replicas=replicas, **kwargs
+        )
+    )
+
+
+def create_sessionmaker(engine: Engine, **kwargs) -> sessionmaker:
+    """默认 expire_on_commit=False: 提交后序列化响应不会再次查询"""
+    return remember_session_factory(
+        sessionmaker(bind=engine, **{"expire_on_commit": False, **kwargs})
+    )
+
+
+def create_async_sessionmaker(engine: AsyncEngine, **kwargs) -> async_sessionmaker:
+    return remember_session_factory(
+        async_sessionmaker(bind=engine, **{"expire_on_commit": False, **kwargs})
+    )
+
+
+def create_session_dep(maker: sessionmaker | async_sessionmaker):
+    """
+    由 sessionmaker 生成 FastAPI 依赖, 可直接作为 CRUDRouter.crud 的 session_dep
+    bind 为 create_db_engine 创建的 engine 时记录每个请求的 session 存活时间
+    """
+    bind = maker.kw.get("bind")
+    stats = get_pool_stats(bind) if bind is not None else None
+    if isinstance(maker, async_sessionmaker):
+
+        async def get_async_db():
+            start = time.perf_counter()
+            try:
+                async with maker() as db:
+                    yield db
+            finally:
+                if stats:
+                    stats.session_lifetime.observe(time.perf_counter() - start)
+
+        return Annotated[AsyncSession, Depends(get_async_db)]
+
+    def get_db():
+        start = time.perf_counter()
+        try:
+            with maker() as db:
+                yield db
+        finally:
+            if stats:
+                stats.session_lifetime.observe(time.perf_counter() - start)
+
+    return Annotated[Session, Depends(get_db)]
+
+
+__all__ = [
+    "AsyncOutboxRelay",
+    "ChangeRecord",
+    "DEFAULT_POOL_OPTIONS",
+    "Histogram",
+    "MemorySink",
+    "OUTBOX_OP_CREATE",
+    "OUTBOX_OP_REMOVE",
+    "OUTBOX_OP_UPDATE",
+    "OutboxRelay",
+    "PoolStats",
+    "RoutingSession",
+    "USE_PRIMARY_OPTION",
+    "call_after_commit",
+    "can_create_sibling",
+    "create_sibling_session",
+    "create_async_db_engine",
+    "create_async_routing_sessionmaker",
+    "create_async_sessionmaker",
+    "create_db_engine",
+    "create_routing_sessionmaker",
+    "create_session_dep",
+    "create_sessionmaker",
+    "get_pool_stats",
+    "has_uncommitted_writes",
+    "on_model_committed",
+    "outbox_metadata",
+    "outbox_table",
+    "pool_status",
+    "use_primary",
+]
@@ -0,0 +1,153 @@
+import bisect
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+# MySQL wait_timeout 默认 8 小时, recycle 需小于它; pre_ping 处理被服务端断开的连接
+DEFAULT_POOL_OPTIONS: Dict[str, Any] = {
+    "pool_size": 10,
+    "max_overflow": 10,
+    "pool_timeout": 5,
+    "pool_recycle": 3600,
+    "pool_pre_ping": True,
+}
+# 直方图桶上界(秒)
+DEFAULT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+DEFAULT_LIFETIME_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "buckets": {
+                    **{f"le_{b}": c for b, c in zip(self.buckets, self.counts)},
+                    "inf": self.counts[-1],
+                },
+                "count": self.count,
+                "sum": self.total,
+                "max": self.max,
+            }
+
+
+class PoolStats:
+    """连接池取连接等待时间 / 超时次数 / 每个请求 session 存活时间"""
+
+    def __init__(
+        self,
+        wait_buckets: Sequence[float] = DEFAULT_WAIT_BUCKETS,
+        lifetime_buckets: Sequence[float] = DEFAULT_LIFETIME_BUCKETS,
+    ) -> None:
+        self.wait = Histogram(wait_buckets)
+        self.session_lifetime = Histogram(lifetime_buckets)
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def on_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self, pool: Optional[Pool] = None) -> Dict[str, Any]:
+        res: Dict[str, Any] = {
+            "wait": self.wait.snapshot(),
+            "session_lifetime": self.session_lifetime.snapshot(),
+            "timeouts": self.timeouts,
+        }
+        if isinstance(pool, QueuePool):
+            res.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        return res
+
+
+class InstrumentedPoolMixin:
+    stats: PoolStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            self.stats.on_timeout()
+            raise
+        finally:
+            self.stats.wait.observe(time.perf_counter() - start)
+
+    def recreate(self):
+        # dispose 时重建连接池, 沿用原统计
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def get_pool_stats(engine: Engine | AsyncEngine) -> Optional[PoolStats]:
+    if isinstance(engine, AsyncEngine):
+        engine = engine.sync_engine
+    return getattr(engine.pool, "stats", None)
+
+
+def pool_status(engine: Engine | AsyncEngine) -> Dict[str, Any]:
+    """连接池实时状态, 可直接作为监控接口的返回值"""
+    pool = engine.sync_engine.pool if isinstance(engine, AsyncEngine) else engine.pool
+    stats = get_pool_stats(engine) or PoolStats()
+    return stats.snapshot(pool)
+
+
+def get_engine_options(poolclass: type, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """kwargs 覆盖默认值; 指定非 QueuePool 的 poolclass(如 sqlite 的 StaticPool)时不附加连接池参数"""
+    options = {"poolclass": poolclass, **kwargs}
+    if issubclass(options["poolclass"], QueuePool):
+        options = {**DEFAULT_POOL_OPTIONS, **options}
+    return options
+
+
+def create_db_engine(url: str, stats: Optional[PoolStats] = None, **kwargs) -> Engine:
+    """带默认连接池参数和连接池统计的同步 engine"""
+    engine = create_engine(url, **get_engine_options(InstrumentedQueuePool, kwargs))
+    if isinstance(engine.pool, InstrumentedPoolMixin):
+        engine.pool.stats = stats or PoolStats()
+    return engine
+
+
+def create_async_db_engine(
+    url: str, stats: Optional[PoolStats] = None, **kwargs
+) -> AsyncEngine:
+    """带默认连接池参数和连接池统计的异步 engine(如 mysql+aiomysql)"""
+    engine = create_async_engine(
+        url, **get_engine_options(InstrumentedAsyncQueuePool, kwargs)
+    )
+    if isinstance(engine.sync_engine.pool, InstrumentedPoolMixin):
+        engine.sync_engine.pool.stats = stats or PoolStats()
+    return engine
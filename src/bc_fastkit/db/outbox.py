@@ -0,0 +1,211 @@
+import asyncio
+import inspect
+import logging
+from typing import Any, Awaitable, Callable, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import (
+    JSON,
+    VARCHAR,
+    BigInteger,
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    SmallInteger,
+    Table,
+    delete,
+    func,
+    insert,
+    select,
+)
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_OP_CREATE = 1
+OUTBOX_OP_UPDATE = 2
+OUTBOX_OP_REMOVE = 3
+
+# 独立于 BaseModel 的 metadata, 需要时 outbox_metadata.create_all(engine) 建表
+outbox_metadata = MetaData()
+outbox_table = Table(
+    "outbox",
+    outbox_metadata,
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True),
+    Column("table_name", VARCHAR(64), nullable=False),
+    Column("op", SmallInteger, nullable=False),
+    Column("entity_id", BigInteger, nullable=False),
+    # 更新操作变更的列名, 其余为 NULL
+    Column("columns", JSON, nullable=True),
+    Column(
+        "create_time", DateTime, nullable=False, server_default=func.current_timestamp()
+    ),
+)
+
+
+class ChangeRecord(NamedTuple):
+    id: int
+    table_name: str
+    op: int
+    entity_id: int
+    columns: Optional[List[str]]
+
+
+Sink = Callable[[List[ChangeRecord]], Any | Awaitable[Any]]
+
+
+def is_outbox_enabled(model: Any) -> bool:
+    return bool(getattr(model, "OUTBOX", False))
+
+
+def outbox_rows(
+    model: Any,
+    op: int,
+    ids: Sequence[int],
+    columns: Optional[Sequence[Optional[Sequence[str]]]] = None,
+) -> List[dict]:
+    table_name = model.__table__.name
+    return [
+        {
+            "table_name": table_name,
+            "op": op,
+            "entity_id": id,
+            "columns": list(columns[i]) if columns and columns[i] else None,
+        }
+        for i, id in enumerate(ids)
+    ]
+
+
+def record_changes(
+    db: Session,
+    model: Any,
+    op: int,
+    ids: Sequence[int],
+    columns: Optional[Sequence[Optional[Sequence[str]]]] = None,
+) -> None:
+    """
+    在当前事务中写入变更记录(一次 executemany), 只记录 model.OUTBOX 为真的模型
+    columns 与 ids 一一对应, 为每条更新变更的列名
+    """
+    if ids and is_outbox_enabled(model):
+        db.execute(insert(outbox_table), outbox_rows(model, op, ids, columns))
+
+
+async def async_record_changes(
+    db: AsyncSession,
+    model: Any,
+    op: int,
+    ids: Sequence[int],
+    columns: Optional[Sequence[Optional[Sequence[str]]]] = None,
+) -> None:
+    if ids and is_outbox_enabled(model):
+        await db.execute(insert(outbox_table), outbox_rows(model, op, ids, columns))
+
+
+class MemorySink:
+    """进程内 sink, 保存收到的变更记录, 用于测试或同进程内的消费者"""
+
+    def __init__(self) -> None:
+        self.records: List[ChangeRecord] = []
+
+    def __call__(self, records: List[ChangeRecord]) -> None:
+        self.records.extend(records)
+
+
+def next_batch_statement(batch_size: int):
+    # id 为插入顺序, 不是提交顺序; SKIP LOCKED: 多个 relay 实例互不阻塞, 跳过其他 relay 锁定的记录
+    return (
+        select(*[outbox_table.c[f] for f in ChangeRecord._fields])
+        .order_by(outbox_table.c.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+
+
+class OutboxRelay:
+    """
+    按 id 顺序批量读取变更记录交给 sink, sink 成功后在同一事务中删除(至少一次投递)
+    投递顺序不是提交顺序, id 也不连续:
+    - 晚提交的长事务 id 可能小于已投递的记录, 会在之后的批次中投递, 不会遗漏
+    - 因此同一实体的记录可能乱序(如更新先于新增), 多个 relay 实例时批次之间也会交错
+    - id 不能作为消费进度的水位; sink 应幂等, 把记录视为"实体已变更"的通知并按 entity_id 读取当前数据
+    """
+
+    def __init__(self, maker: sessionmaker, sink: Sink, batch_size: int = 500):
+        self.maker = maker
+        self.sink = sink
+        self.batch_size = batch_size
+
+    def drain_once(self) -> int:
+        with self.maker() as db, db.begin():
+            records = [
+                ChangeRecord(*r)
+                for r in db.execute(next_batch_statement(self.batch_size)).all()
+            ]
+            if records:
+                self.sink(records)
+                db.execute(
+                    delete(outbox_table).where(
+                        outbox_table.c.id.in_([r.id for r in records])
+                    )
+                )
+        return len(records)
+
+    def drain(self) -> int:
+        """投递到没有剩余记录为止, 返回投递条数"""
+        total = 0
+        while n := self.drain_once():
+            total += n
+        return total
+
+
+class AsyncOutboxRelay:
+    """OutboxRelay 的异步版本, 投递顺序的约定相同"""
+
+    def __init__(
+        self, maker: async_sessionmaker, sink: Sink, batch_size: int = 500
+    ) -> None:
+        self.maker = maker
+        self.sink = sink
+        self.batch_size = batch_size
+        self._stopped = asyncio.Event()
+
+    async def drain_once(self) -> int:
+        async with self.maker() as db, db.begin():
+            result = await db.execute(next_batch_statement(self.batch_size))
+            records = [ChangeRecord(*r) for r in result.all()]
+            if records:
+                rs = self.sink(records)
+                if inspect.isawaitable(rs):
+                    await rs
+                await db.execute(
+                    delete(outbox_table).where(
+                        outbox_table.c.id.in_([r.id for r in records])
+                    )
+                )
+        return len(records)
+
+    async def drain(self) -> int:
+        total = 0
+        while n := await self.drain_once():
+            total += n
+        return total
+
+    async def run(self, interval: float = 1) -> None:
+        """后台循环投递, 没有记录时等待 interval 秒; sink 失败时记录日志后重试"""
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            try:
+                n = await self.drain_once()
+            except Exception:
+                logger.exception("outbox 投递失败")
+                n = 0
+            if n < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def stop(self) -> None:
+        self._stopped.set()
@@ -0,0 +1,107 @@
+import logging
+from itertools import chain
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session, SessionTransaction
+
+logger = logging.getLogger(__name__)
+
+# session.info 中的键: [(登记时所在的事务, 回调)], 最外层事务提交后执行
+AFTER_COMMIT_KEY = "bc_fastkit.after_commit"
+
+# 模型 -> 写入该模型的事务提交后调用的回调
+_model_commit_callbacks: Dict[type, List[Callable[[], Any]]] = {}
+
+
+def call_after_commit(
+    db: Session | AsyncSession, fn: Callable[[], Any], once: bool = False
+) -> None:
+    """
+    fn 在 db 最外层事务提交后调用, 如缓存失效/发布事件
+    事务回滚或未提交就关闭时丢弃; 登记时所在的 savepoint(begin_nested)回滚时也丢弃
+    once 时同一事务(savepoint)中已登记过的 fn 不再登记
+    """
+    session = db.sync_session if isinstance(db, AsyncSession) else db
+    transaction = session.get_nested_transaction() or session.get_transaction()
+    pending = session.info.setdefault(AFTER_COMMIT_KEY, [])
+    if once and any(t is transaction and f == fn for t, f in pending):
+        return
+    pending.append((transaction, fn))
+
+
+def on_model_committed(model: type, fn: Callable[[], Any]) -> None:
+    """
+    任何 session 中写入 model(及其子类)的事务提交后调用 fn, 如响应缓存失效
+    写入包括 ORM flush 和 insert/update/delete 语句, 即所有 CRUDBase/cud 函数的写; 回滚时不调用
+    """
+    _model_commit_callbacks.setdefault(model, []).append(fn)
+
+
+def mark_models_written(db: Session | AsyncSession, models: Any) -> None:
+    """不经过 flush/ORM 语句的写(如 bulk_insert_mappings)需手动标记"""
+    session = db.sync_session if isinstance(db, AsyncSession) else db
+    for model in set(models):
+        for cls in model.__mro__:
+            for fn in _model_commit_callbacks.get(cls, ()):
+                call_after_commit(session, fn, once=True)
+
+
+@event.listens_for(Session, "after_flush")
+def track_flushed_models(session: Session, flush_context) -> None:
+    # after_flush 时 new/dirty/deleted 仍是 flush 前的状态
+    if _model_commit_callbacks:
+        objs = chain(session.new, session.dirty, session.deleted)
+        mark_models_written(session, (type(o) for o in objs))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def track_dml_models(state: ORMExecuteState) -> None:
+    if _model_commit_callbacks and (
+        state.is_update or state.is_delete or state.is_insert
+    ):
+        mapper = state.bind_mapper
+        if mapper is not None:
+            mark_models_written(state.session, [mapper.class_])
+
+
+def is_within(
+    transaction: Optional[SessionTransaction], ancestor: SessionTransaction
+) -> bool:
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+@event.listens_for(Session, "after_commit")
+def run_after_commit_callbacks(session: Session) -> None:
+    # savepoint 提交(release)也会触发 after_commit
+    if session.in_nested_transaction():
+        return
+    for _, fn in session.info.pop(AFTER_COMMIT_KEY, []):
+        try:
+            fn()
+        except Exception:
+            logger.exception("提交后回调 %r 执行失败", fn)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def discard_rolled_back_callbacks(
+    session: Session, previous_transaction: SessionTransaction
+) -> None:
+    pending = session.info.get(AFTER_COMMIT_KEY)
+    if pending:
+        session.info[AFTER_COMMIT_KEY] = [
+            (t, fn) for t, fn in pending if not is_within(t, previous_transaction)
+        ]
+
+
+@event.listens_for(Session, "after_transaction_end")
+def clear_after_commit_callbacks(
+    session: Session, transaction: SessionTransaction
+) -> None:
+    if transaction.parent is None:
+        session.info.pop(AFTER_COMMIT_KEY, None)
@@ -27,6 +27,7 @@ from sqlalchemy.sql.sqltypes import JSON
 from ..common.typing import DATE_FORMAT, DATETIME_FORMAT, D, date_re, datetime_re
 from ..common.uitls import classproperty
 from .column import (
+    COLUMN_INFO_LIST_DEFERRED,
     DefaultDecimalColumn,
     DefaultIdColumn,
     DefaultJsonColumn,
@@ -80,6 +81,9 @@ class MappingMixin:
 @as_declarative()
 class BaseModel(MappingMixin):
     FAKE_DELETE_UK_SUFFIX = "_DELETED_"
+    # 为真时 crud/core 的写操作在同一事务中写入 outbox 变更记录(见 db.outbox)
+    # MySQL 上批量新增(db_multi_create)需要逐条 INSERT 取得 id
+    OUTBOX = False
 
     id: Mapped[int] = NotNullColumn(BIGINT, primary_key=True)
     create_time = NotNullColumn(
@@ -157,6 +161,14 @@ class BaseModel(MappingMixin):
     def unique_column_names(cls) -> List[str]:
         return [c for c in cls.column_names if getattr(cls, c).unique]
 
+    @classproperty
+    def list_deferred_column_names(cls) -> List[str]:
+        return sorted(
+            c
+            for c in cls.column_names
+            if getattr(cls, c).info.get(COLUMN_INFO_LIST_DEFERRED)
+        )
+
     # @classmethod
     # def add_relation(
     #     cls,
@@ -273,4 +285,5 @@ __all__ = [
     "DefaultTimeColumn",
     "DATETIME",
     "Index",
+    "COLUMN_INFO_LIST_DEFERRED",
 ]
@@ -24,12 +24,24 @@ def transfer2json_default(data):
     return text(f"({d})")
 
 
-def DefaultJsonColumn(server_default, **kwargs) -> Mapped[dict]:
+# 列 info 标记: 列表查询(search_limit)时延迟加载的大字段
+COLUMN_INFO_LIST_DEFERRED = "list_deferred"
+
+
+def with_list_deferred(kwargs: dict, list_deferred: bool) -> dict:
+    if list_deferred:
+        kwargs["info"] = {**kwargs.get("info", {}), COLUMN_INFO_LIST_DEFERRED: True}
+    return kwargs
+
+
+def DefaultJsonColumn(
+    server_default, list_deferred: bool = False, **kwargs
+) -> Mapped[dict]:
     return mapped_column(
         JSON,
         nullable=False,
         server_default=transfer2json_default(server_default),
-        **kwargs,
+        **with_list_deferred(kwargs, list_deferred),
     )
 
 
@@ -44,9 +56,17 @@ DefaultIdColumn: Callable[..., Mapped[int]] = partial(
 DefaultTypeColumn: Callable[..., Mapped[int]] = partial(
     mapped_column, TINYINT, nullable=False, server_default="0"
 )
-DefaultTextColumn: Callable[..., Mapped[str]] = partial(
-    mapped_column, TEXT, nullable=False, server_default=""
-)
+
+
+def DefaultTextColumn(*args, list_deferred: bool = False, **kwargs) -> Mapped[str]:
+    return mapped_column(
+        TEXT,
+        *args,
+        **with_list_deferred(
+            {"nullable": False, "server_default": "", **kwargs}, list_deferred
+        ),
+    )
+
 
 DefaultDecimalColumn: Callable[..., Mapped[Decimal]] = partial(
     mapped_column, DECIMAL(20, 8), nullable=False, server_default="0.00000000"
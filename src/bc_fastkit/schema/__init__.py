@@ -1,8 +1,27 @@
 # type: ignore
 
+import copy
+import threading
+from collections import OrderedDict
 from datetime import date, datetime
 from decimal import Decimal
-from typing import Annotated, Any, Container, Dict, List, Optional, Tuple, Type, Union
+from functools import lru_cache, wraps
+from operator import itemgetter
+from typing import (
+    Annotated,
+    Any,
+    Callable,
+    Container,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+    get_args,
+    get_origin,
+)
 
 import pandas as pd
 from humps import camel
@@ -10,34 +29,91 @@ from pydantic import (
     BaseModel,
     ConfigDict,
     PlainSerializer,
+    TypeAdapter,
     create_model,
-    field_serializer,
 )
+from pydantic.fields import FieldInfo
 
-from ..common.typing import DATE_FORMAT, DATETIME_FORMAT
 from ..model import get_column_python_type
 
 IGNORE_SUFFIX = " 00:00:00"
 
 USED_TYPE_JSON = "json"
 
-FDecimal = Annotated[
-    Decimal,
-    PlainSerializer(
-        lambda x: float(Decimal(x).quantize(Decimal("0.0000")).normalize()),
-        return_type=float,
-        when_used=USED_TYPE_JSON,
-    ),
-]
+DECIMAL_QUANTUM = Decimal("0.0000")
+
 
+def decimal_parser(x: Any) -> float:
+    if not isinstance(x, Decimal):
+        x = Decimal(x)
+    return float(x.quantize(DECIMAL_QUANTUM))
 
-def datetime_parser(t: datetime):
-    rs = t.strftime(DATETIME_FORMAT)
+
+def datetime_parser(t: datetime) -> str:
+    rs = t.isoformat(" ", "seconds")[:19]
     if rs.endswith(IGNORE_SUFFIX):
         return rs[: -len(IGNORE_SUFFIX)]
     return rs
 
 
+def date_parser(t: date) -> str:
+    if isinstance(t, datetime):
+        return datetime_parser(t)
+    return t.isoformat()
+
+
+FDecimal = Annotated[
+    Decimal,
+    PlainSerializer(decimal_parser, return_type=float, when_used=USED_TYPE_JSON),
+]
+
+FDatetime = Annotated[
+    Union[datetime, date],
+    PlainSerializer(date_parser, return_type=str, when_used=USED_TYPE_JSON),
+]
+
+
+def get_schema_python_type(python_type: Any) -> Any:
+    if python_type in (datetime, date):
+        return Union[datetime, date]
+    return python_type
+
+
+def serialize_common_types(value: Any) -> Any:
+    """原 field_serializer("*") 的逻辑, 用于 Any 字段: 只处理顶层的时间值"""
+    if isinstance(value, date):
+        return date_parser(value)
+    return value
+
+
+DATETIME_SERIALIZER = PlainSerializer(
+    date_parser, return_type=str, when_used=USED_TYPE_JSON
+)
+DECIMAL_SERIALIZER = PlainSerializer(str, return_type=str, when_used=USED_TYPE_JSON)
+ANY_SERIALIZER = PlainSerializer(
+    serialize_common_types, return_type=Any, when_used=USED_TYPE_JSON
+)
+
+
+def with_common_serializer(annotation: Any) -> Any:
+    """
+    裸的 datetime/date/Decimal/Any 字段(含 Optional/Union)挂载与原 field_serializer("*") 一致的序列化器,
+    已用 Annotated 声明的(如 FDecimal/FDatetime)保留自身的序列化器;
+    列表等容器内的值不处理; 字符串形式的前向引用无法判断类型, 保持原样
+    """
+    if annotation in (datetime, date, Union[datetime, date]):
+        return Annotated[annotation, DATETIME_SERIALIZER]
+    if annotation is Decimal:
+        return Annotated[annotation, DECIMAL_SERIALIZER]
+    if annotation is Any:
+        return Annotated[annotation, ANY_SERIALIZER]
+    if get_origin(annotation) is Union:
+        args = tuple(with_common_serializer(arg) for arg in get_args(annotation))
+        if args != get_args(annotation):
+            return Union[args]
+    return annotation
+
+
 class BaseSchema(BaseModel):
     model_config = ConfigDict(
         alias_generator=camel.case,
@@ -45,13 +121,14 @@ class BaseSchema(BaseModel):
         from_attributes=True,
     )
 
-    @field_serializer("*", when_used=USED_TYPE_JSON, check_fields=False)
-    def serialize_common_types(self, value: Any):
-        if isinstance(value, datetime):
-            return datetime_parser(value)
-        if isinstance(value, date):
-            return value.strftime(DATE_FORMAT)
-        return value
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        # 在 pydantic 收集字段前改写注解, 输出与原 field_serializer("*") 一致
+        # (时间为 DATETIME_FORMAT, 零点时只保留日期; Decimal 为字符串), 其余字段走 pydantic 原生序列化
+        # FDecimal 等自带序列化器的字段不改写
+        super().__init_subclass__(**kwargs)
+        annotations = cls.__dict__.get("__annotations__", {})
+        for name, annotation in annotations.items():
+            annotations[name] = with_common_serializer(annotation)
 
 
 class FileSchema(BaseSchema):
@@ -63,7 +140,23 @@ class QueryResponseSchema(BaseSchema):
     data_source: List[Any]
     total: Optional[int]
     query: Optional[Any]
-    update_time: Optional[datetime]
+    update_time: Optional[FDatetime]
+    message: str = ""
+
+
+class BulkItemResultSchema(BaseSchema):
+    index: int
+    id: Optional[int] = None
+    success: bool = True
+    message: str = ""
+    data: Optional[Any] = None
+
+
+class ChangesResponseSchema(BaseSchema):
+    data_source: List[Any]
+    # 下次请求携带的 watermark, 没有变更时与请求的相同
+    watermark: Optional[str] = None
+    has_more: bool = False
     message: str = ""
 
 
@@ -76,17 +169,16 @@ class CRUSchema:
     @property
     def QR(self) -> Type:
         if not hasattr(self, "_QR"):
-            self._QR = create_model(
-                f"tQuery{self.R.__name__}",
-                __base__=QueryResponseSchema,
-                data_source=(List[self.R], []),
-            )
+            self._QR = create_query_response_schema(self.R)
         return self._QR
 
     @QR.setter
     def QR(self, value: Type):
         self._QR = value
 
+    def models(self) -> List[Type]:
+        return [self.C, self.U, self.R, self.QR]
+
 
 class CRUItemSchema(CRUSchema):
     def __init__(
@@ -100,10 +192,8 @@ class CRUItemSchema(CRUSchema):
     @property
     def ItemQR(self) -> Type:
         if not hasattr(self, "_ItemQR"):
-            self._ItemQR = create_model(
-                f"Query{self.ItemR.__name__}",
-                __base__=QueryResponseSchema,
-                data_source=(List[self.ItemR], []),
+            self._ItemQR = create_query_response_schema(
+                self.ItemR, name=f"Query{self.ItemR.__name__}"
             )
         return self._ItemQR
 
@@ -111,7 +201,233 @@ class CRUItemSchema(CRUSchema):
     def ItemQR(self, value: Type):
         self._ItemQR = value
 
+    def models(self) -> List[Type]:
+        return super().models() + [self.ItemC, self.ItemU, self.ItemR, self.ItemQR]
+
+
+def get_json_serializer(field: FieldInfo) -> Optional[Callable[[Any], Any]]:
+    """取出字段(含 Optional 内层注解)上 json 模式生效的 PlainSerializer, 有多个时后声明的生效"""
+    metadata = list(field.metadata)
+    for arg in get_args(field.annotation):
+        metadata.extend(getattr(arg, "__metadata__", ()))
+    for meta in reversed(metadata):
+        if isinstance(meta, PlainSerializer) and meta.when_used in (
+            "always",
+            USED_TYPE_JSON,
+        ):
+            return meta.func
+    return None
+
+
+class RowEncoder:
+    """
+    lean 模式: 按 schema 预编译每个字段的取值与序列化函数,
+    直接把 select 出的行元组编码成与 schema 一致的 JSON 结构(别名/时间格式/FDecimal 精度),
+    跳过 ORM 实例化和 pydantic 校验
+    字段只能是 db_model 的列或普通 property, 且不能有类级别的 serializer/computed_field, 否则构造时报错
+    """
+
+    def __init__(self, schema: Type[BaseModel], db_model: Type) -> None:
+        decorators = schema.__pydantic_decorators__
+        if (
+            decorators.field_serializers
+            or decorators.model_serializers
+            or schema.model_computed_fields
+        ):
+            raise ValueError(f"lean 模式不支持自定义序列化/computed_field: {schema}")
+        self.columns: List[str] = []
+        self.fields: List[Tuple[str, Callable[[Any], Any]]] = []
+        for name, field in schema.model_fields.items():
+            alias = field.serialization_alias or field.alias or name
+            if name in db_model.column_names:
+                getter = itemgetter(len(self.columns))
+                self.columns.append(name)
+            elif isinstance(getattr(db_model, name, None), property):
+                # Row 支持按列名取属性, property 可直接作用于行
+                getter = getattr(db_model, name).fget
+            else:
+                raise ValueError(f"lean 模式无法从行中取值: {schema}->{name}")
+            self.fields.append(
+                (alias, self._compile(getter, get_json_serializer(field)))
+            )
+
+    @staticmethod
+    def _compile(getter: Callable, serializer: Optional[Callable]) -> Callable:
+        if serializer is None:
+            return getter
+
+        def fn(row):
+            value = getter(row)
+            return None if value is None else serializer(value)
+
+        return fn
+
+    def encode(self, rows: Sequence[Any]) -> List[Dict[str, Any]]:
+        fields = self.fields
+        return [{alias: fn(row) for alias, fn in fields} for row in rows]
+
+
+# 工厂缓存的 schema 上限, 按 LRU 淘汰; 请求参数(如 fields)生成的 schema 也在其中, 不会无限增长
+SCHEMA_CACHE_MAXSIZE = 1024
+_SCHEMA_CACHE: "OrderedDict[Any, Any]" = OrderedDict()
+_SCHEMA_CACHE_LOCK = threading.Lock()
+
+
+def _freeze(value: Any) -> Any:
+    """参数转为可哈希的 key, 带上类型: 1 / True / 1.0 / Decimal(1) 相等但生成的 schema 不同"""
+    if isinstance(value, (list, tuple)):
+        return (type(value), tuple(_freeze(v) for v in value))
+    if isinstance(value, (set, frozenset)):
+        return (type(value), frozenset(_freeze(v) for v in value))
+    if isinstance(value, dict):
+        return (dict, tuple(sorted((k, _freeze(v)) for k, v in value.items())))
+    return (type(value), value)
+
+
+def memoize_schema(f):
+    """
+    相同 (model, 参数) 只调用一次 create_model, 参数不可哈希时不缓存, 最多缓存 SCHEMA_CACHE_MAXSIZE 个
+    CRUSchema 每次返回浅拷贝: 其中的模型共享, 调用方修改 QR 等属性不影响缓存和其他调用方
+    """
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        try:
+            key = (f.__name__, _freeze(args), _freeze(kwargs))
+            hash(key)
+        except TypeError:
+            return f(*args, **kwargs)
+        with _SCHEMA_CACHE_LOCK:
+            value = _SCHEMA_CACHE.get(key)
+            if value is not None:
+                _SCHEMA_CACHE.move_to_end(key)
+        if value is None:
+            value = f(*args, **kwargs)
+            with _SCHEMA_CACHE_LOCK:
+                value = _SCHEMA_CACHE.setdefault(key, value)
+                while len(_SCHEMA_CACHE) > SCHEMA_CACHE_MAXSIZE:
+                    _SCHEMA_CACHE.popitem(last=False)
+        return copy.copy(value) if isinstance(value, CRUSchema) else value
+
+    return wrapper
+
+
+def clear_schema_cache():
+    with _SCHEMA_CACHE_LOCK:
+        _SCHEMA_CACHE.clear()
+    get_type_adapter.cache_clear()
+    get_row_encoder.cache_clear()
+
+
+@lru_cache(maxsize=SCHEMA_CACHE_MAXSIZE)
+def get_type_adapter(typ: Any) -> TypeAdapter:
+    return TypeAdapter(typ)
+
+
+@lru_cache(maxsize=SCHEMA_CACHE_MAXSIZE)
+def get_row_encoder(schema: Type[BaseModel], db_model: Type) -> RowEncoder:
+    return RowEncoder(schema, db_model)
+
+
+def dump_json(typ: Any, content: Any) -> bytes:
+    """按 typ 校验一次(支持 ORM 对象)并直接输出 JSON bytes, 与 FastAPI response_model 的输出一致"""
+    adapter = get_type_adapter(typ)
+    return adapter.dump_json(
+        adapter.validate_python(content, from_attributes=True), by_alias=True
+    )
+
+
+def warmup_schemas(*schemas: Union[CRUSchema, Type[BaseModel]]) -> int:
+    """
+    在服务接收流量前预构建 schema 及其 pydantic-core 校验/序列化器, 以及 dump_json 使用的 TypeAdapter
+    :param schemas: 需要预热的 CRUSchema 或 pydantic 模型, 为空时预热所有工厂缓存的 schema
+    :return: 预热的模型数量
+    """
+    with _SCHEMA_CACHE_LOCK:
+        targets = schemas or tuple(_SCHEMA_CACHE.values())
+    models = set()
+    for target in targets:
+        if isinstance(target, CRUSchema):
+            models.update(target.models())
+        else:
+            models.add(target)
+    for model in models:
+        if not model.__pydantic_complete__:
+            model.model_rebuild()
+        get_type_adapter(model)
+    return len(models)
+
+
+def has_own_decorators(schema: Type[BaseModel], base: Type[BaseModel]) -> bool:
+    """schema 自身(而不是基类)声明了 validator/serializer/computed_field"""
+    own, inherited = schema.__pydantic_decorators__, base.__pydantic_decorators__
+    return any(
+        set(getattr(own, kind)) - set(getattr(inherited, kind))
+        for kind in own.__dataclass_fields__
+    )
+
+
+@memoize_schema
+def create_partial_schema(schema: Type[BaseModel], fields: Sequence[str]) -> Type:
+    """
+    按 fields 裁剪 schema, 只保留其中存在的字段(以及基类声明的字段); 无可保留字段时返回原 schema
+    裁剪后的 schema 继承原 schema 的基类(如 create_default_cru_schema 的 r_base)并沿用其 model_config,
+    校验和序列化与原 schema 一致; 原 schema 自身声明了 validator/serializer 时无法裁剪, 返回原 schema
+    """
+    kept = {
+        name: (field.annotation, field)
+        for name, field in schema.model_fields.items()
+        if name in fields
+    }
+    base = schema.__base__
+    if not kept or not issubclass(base, BaseModel) or has_own_decorators(schema, base):
+        return schema
+    namespace = {
+        "__module__": schema.__module__,
+        "__qualname__": f"Partial{schema.__name__}",
+        "__annotations__": {name: annotation for name, (annotation, _) in kept.items()},
+        "model_config": schema.model_config,
+        **{name: field for name, (_, field) in kept.items()},
+    }
+    return type(schema)(f"Partial{schema.__name__}", (base,), namespace)
+
+
+@memoize_schema
+def create_query_response_schema(
+    schema: Type[BaseModel], name: Optional[str] = None
+) -> Type:
+    return create_model(
+        name or f"tQuery{schema.__name__}",
+        __base__=QueryResponseSchema,
+        data_source=(List[schema], []),
+    )
+
+
+@memoize_schema
+def create_bulk_result_schema(schema: Type[BaseModel]) -> Type:
+    return create_model(
+        f"tBulk{schema.__name__}",
+        __base__=BulkItemResultSchema,
+        data=(Optional[schema], None),
+    )
+
+
+@memoize_schema
+def create_changes_response_schema(schema: Type[BaseModel]) -> Type:
+    """增量同步的响应, 数据中带上 is_deleted 以便客户端删除本地数据"""
+    item = create_model(
+        f"tChange{schema.__name__}",
+        __base__=schema,
+        is_deleted=(int, 0),
+    )
+    return create_model(
+        f"tChanges{schema.__name__}",
+        __base__=ChangesResponseSchema,
+        data_source=(List[item], []),
+    )
+
 
+@memoize_schema
 def create_schema_by_model(
     name_: str,
     db_model: Type,
@@ -130,10 +446,7 @@ def create_schema_by_model(
         column = getattr(db_model, attr)
         python_type = get_column_python_type(column)
         assert python_type, f"Could not infer python_type for {column}"
-        if python_type in [datetime, date]:
-            python_type = Union[datetime, date]
-        if python_type is Decimal:
-            python_type = FDecimal
+        python_type = get_schema_python_type(python_type)
         if attr in (required or []):
             fields[attr] = (python_type, ...)
         else:
@@ -150,7 +463,10 @@ def create_schema_by_model(
                     raise ValueError(f"未声明的返回类型:{db_model}->{attr}")
                 if annotations[r_attr] is pd.DataFrame:
                     annotations[r_attr] = List[Any]
-                fields[attr] = (Optional[annotations[r_attr]], None)
+                fields[attr] = (
+                    Optional[get_schema_python_type(annotations[r_attr])],
+                    None,
+                )
     for k, v in _fields.items():
         if not isinstance(v, Tuple):
             raise ValueError(f"错误的field参数:{db_model}->{k}: {v}")
@@ -159,6 +475,7 @@ def create_schema_by_model(
     return pydantic_model
 
 
+@memoize_schema
 def create_default_cru_schema(
     db_model: Type,
     *,
@@ -209,6 +526,7 @@ def create_default_cru_schema(
     return CRUSchema(create_schema, update_schema, response_schema)
 
 
+@memoize_schema
 def create_item_cru_schema(
     db_model: Type,
     *,
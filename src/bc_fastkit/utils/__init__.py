@@ -1,6 +1,11 @@
+from .event_bus import AsyncEventBus
 from .queue import AsyncClosableQueue, QueueClosed
+from .singleflight import AsyncSingleFlight, SingleFlight
 
 __all__ = [
+    "AsyncEventBus",
     "AsyncClosableQueue",
     "QueueClosed",
+    "AsyncSingleFlight",
+    "SingleFlight",
 ]
@@ -0,0 +1,204 @@
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, TypeVar
+
+from .queue import AsyncClosableQueue, QueueClosed
+
+logger = logging.getLogger(__name__)
+
+E = TypeVar("E")
+# 订阅者按批接收同一主题的事件, 可以是协程函数; 普通函数在线程池中执行
+Subscriber = Callable[[List[E]], Any | Awaitable[Any]]
+
+
+class AsyncEventBus(Generic[E]):
+    """
+    基于 AsyncClosableQueue 的进程内事件总线, 发布者不等待订阅者执行
+    - maxsize: 队列容量; 其他线程(同步 session)发布时队列满会阻塞等待(背压), 最多 put_timeout 秒
+      事件循环线程内发布时不能阻塞, 排队等待写入, 超过 max_pending 条时丢弃并计数
+    - concurrency 个后台任务消费, 每次最多取 batch_size 条, 按主题分组后批量交给订阅者
+    - 订阅者异常只记录日志, 不影响其他订阅者和后续事件
+    """
+
+    def __init__(
+        self,
+        *,
+        topic: Callable[[E], Any] = lambda e: e,
+        maxsize: int = 10000,
+        concurrency: int = 1,
+        batch_size: int = 100,
+        put_timeout: float = 5,
+        max_pending: int = 10000,
+    ) -> None:
+        self.topic = topic
+        self.maxsize = maxsize
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self.max_pending = max_pending
+        self.subscribers: Dict[Any, List[Subscriber]] = {}
+        self.queue: Optional[AsyncClosableQueue[E]] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers: List[asyncio.Task] = []
+        self._pending = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def subscribe(self, topic: Any, subscriber: Subscriber) -> None:
+        self.subscribers.setdefault(topic, []).append(subscriber)
+
+    def unsubscribe(self, topic: Any, subscriber: Subscriber) -> None:
+        if subscriber in self.subscribers.get(topic, []):
+            self.subscribers[topic].remove(subscriber)
+
+    @property
+    def running(self) -> bool:
+        return self.queue is not None and not self.queue.closed
+
+    async def start(self) -> None:
+        """在应用的事件循环中启动消费任务, 如 FastAPI lifespan 中"""
+        if self.running:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.queue = AsyncClosableQueue(self.maxsize)
+        self._workers = [
+            asyncio.create_task(self._work()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        """停止接收新事件, 等待已入队的事件处理完"""
+        if self.queue is None:
+            return
+        while self._pending:
+            await asyncio.sleep(0.01)
+        self.queue.close_force()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def publish(self, events: List[E]) -> None:
+        """可在任意线程调用; 总线未启动或已停止时丢弃"""
+        if not events:
+            return
+        if not self.running:
+            self.dropped += len(events)
+            logger.warning("事件总线未运行, 丢弃 %s 条事件", len(events))
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            self._publish_in_loop(events)
+            return
+        # 超时由 _put_all 在事件循环中处理并计数, 这里不取消, 避免与入队竞争导致计数不准
+        deadline = time.monotonic() + self.put_timeout
+        coro = self._put_all(events, deadline=deadline)
+        try:
+            future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        except RuntimeError:
+            coro.close()
+            self.dropped += len(events)
+            logger.warning("事件循环已关闭, 丢弃 %s 条事件", len(events))
+            return
+        try:
+            future.result(self.put_timeout)
+        except Exception:
+            logger.warning("等待事件入队超时", exc_info=True)
+
+    def _publish_in_loop(self, events: List[E]) -> None:
+        queue = self.queue
+        rest = list(events)
+        # 已有排队等待写入的事件时不插队
+        while rest and not self._pending and not queue.full():
+            queue.put_nowait(rest.pop(0))
+            self.published += 1
+        if not rest:
+            return
+        if self._pending + len(rest) > self.max_pending:
+            self.dropped += len(rest)
+            logger.warning("事件队列已满, 丢弃 %s 条事件", len(rest))
+            return
+        self._pending += len(rest)
+        self.loop.create_task(self._put_all(rest, pending=True))
+
+    async def _put_all(
+        self,
+        events: List[E],
+        pending: bool = False,
+        deadline: Optional[float] = None,
+    ) -> None:
+        """依次入队, 队列关闭或超过 deadline(time.monotonic())时丢弃剩余的事件"""
+        put = 0
+        try:
+            for e in events:
+                if deadline is None:
+                    await self.queue.put(e)
+                else:
+                    await asyncio.wait_for(
+                        self.queue.put(e), deadline - time.monotonic()
+                    )
+                put += 1
+                self.published += 1
+        except (QueueClosed, asyncio.TimeoutError):
+            pass
+        finally:
+            if put < len(events):
+                self.dropped += len(events) - put
+                logger.warning("事件入队失败, 丢弃 %s 条事件", len(events) - put)
+            if pending:
+                self._pending -= len(events)
+
+    async def _next_batch(self) -> List[E]:
+        batch = [await self.queue.get()]
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(await self.queue.get())
+        return batch
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                batch = await self._next_batch()
+            except QueueClosed:
+                return
+            try:
+                await self.dispatch(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def dispatch(self, batch: List[E]) -> None:
+        groups: Dict[Any, List[E]] = {}
+        for e in batch:
+            groups.setdefault(self.topic(e), []).append(e)
+        for topic, events in groups.items():
+            for subscriber in self.subscribers.get(topic, []):
+                try:
+                    if inspect.iscoroutinefunction(subscriber):
+                        await subscriber(events)
+                    else:
+                        await self.loop.run_in_executor(None, subscriber, events)
+                    self.delivered += len(events)
+                except Exception:
+                    self.failed += len(events)
+                    logger.exception("事件订阅者 %r 处理失败", subscriber)
+
+    async def join(self) -> None:
+        """等待已发布的事件全部处理完"""
+        while self._pending:
+            await asyncio.sleep(0.01)
+        if self.queue is not None:
+            await self.queue.join()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "pending": self._pending,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
@@ -0,0 +1,68 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class AsyncSingleFlight:
+    """
+    同一 key 的并发调用共享一次进行中的执行, 结果/异常分发给所有调用方
+    fn 在独立的 task 中执行, 任一调用方(包括发起方)被取消不会取消执行, 也不影响其他调用方
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.shared = 0
+
+    async def do(
+        self, key: Hashable, fn: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """返回 (结果, 是否为共享结果)"""
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.shared += 1
+        else:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(partial(self._done, key))
+        return await asyncio.shield(task), shared
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 所有调用方都已取消时, 避免出现 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+
+class SingleFlight:
+    """线程池中运行的同步调用版本"""
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """返回 (结果, 是否为共享结果)"""
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return fut.result(), True
+        try:
+            rs = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(rs)
+            return rs, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
@@ -0,0 +1,137 @@
+from typing import Annotated
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import VARCHAR, create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Mapped, Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from bc_fastkit.api import CRUDRequestHandler, CRUDRouter
+from bc_fastkit.crud import CRUDBase
+from bc_fastkit.model import (
+    BaseModel,
+    DefaultDecimalColumn,
+    DefaultIdColumn,
+    DefaultJsonColumn,
+    DefaultTextColumn,
+    DefaultTypeColumn,
+    NotNullColumn,
+)
+from bc_fastkit.schema import create_default_cru_schema
+
+
+class FooModel(BaseModel):
+    name: Mapped[str] = NotNullColumn(VARCHAR(32), server_default="")
+    price = DefaultDecimalColumn()
+    memo = DefaultTextColumn()
+    extra = DefaultJsonColumn({})
+    is_deleted = DefaultTypeColumn()
+
+
+class BarModel(BaseModel):
+    foo_id = DefaultIdColumn()
+    name: Mapped[str] = NotNullColumn(VARCHAR(32), server_default="")
+    is_deleted = DefaultTypeColumn()
+
+
+# BaseModel 的 update_time 默认值是 MySQL 语法, sqlite 手写建表
+DDL = [
+    "create table foo (id integer primary key autoincrement,"
+    " create_time datetime default CURRENT_TIMESTAMP,"
+    " update_time datetime default CURRENT_TIMESTAMP,"
+    " name varchar(32) default '', price decimal(20,8) default 0,"
+    " memo text default '', extra json default '{}', is_deleted int default 0)",
+    "create table bar (id integer primary key autoincrement,"
+    " create_time datetime default CURRENT_TIMESTAMP,"
+    " update_time datetime default CURRENT_TIMESTAMP,"
+    " foo_id int default 0, name varchar(32) default '', is_deleted int default 0)",
+]
+
+
+def create_test_engine():
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    with engine.begin() as conn:
+        for ddl in DDL:
+            conn.execute(text(ddl))
+    return engine
+
+
+@pytest.fixture
+def engine():
+    engine = create_test_engine()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    with Session(engine, expire_on_commit=False) as db:
+        yield db
+
+
+def make_session_dep(engine, **kwargs):
+    """路由使用的同步 session 依赖, kwargs 为 sessionmaker 参数"""
+    maker = sessionmaker(engine, **kwargs)
+
+    def get_db():
+        with maker() as db:
+            yield db
+
+    return Annotated[Session, Depends(get_db)]
+
+
+@pytest.fixture
+def crud_client(engine):
+    """
+    注册一组 CRUD 路由并返回 (TestClient, 请求处理器), 默认 /foo 上的 CRUDBase(FooModel)
+    router 默认为不提交的 CRUDRouter; session_kwargs 为 sessionmaker 参数, 其余参数传给 router.crud
+    """
+
+    def make(
+        handler=None,
+        *,
+        path="/foo",
+        schema=None,
+        router=None,
+        request_handler_cls=CRUDRequestHandler,
+        session_kwargs=None,
+        **kwargs,
+    ):
+        handler = handler or CRUDBase(FooModel)
+        router = router or CRUDRouter()
+        request_handler = router.crud(
+            path,
+            handler=handler,
+            schema=schema or create_default_cru_schema(handler.model),
+            session_dep=make_session_dep(engine, **(session_kwargs or {})),
+            **kwargs,
+        )(type(f"{handler.model.__name__}Handler", (request_handler_cls,), {}))
+        app = FastAPI()
+        app.include_router(router)
+        return TestClient(app), request_handler
+
+    return make
+
+
+async def create_async_test_engine(url: str = "sqlite+aiosqlite://", **kwargs):
+    engine = create_async_engine(url, **{"poolclass": StaticPool, **kwargs})
+    async with engine.begin() as conn:
+        for ddl in DDL:
+            await conn.execute(text(ddl))
+    return engine
+
+
+async def create_async_test_session(**kwargs) -> AsyncSession:
+    engine = await create_async_test_engine(**kwargs)
+    return AsyncSession(engine, expire_on_commit=False)
+
+
+async def close_async_test_session(db: AsyncSession) -> None:
+    await db.close()
+    await db.bind.dispose()
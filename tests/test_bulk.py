@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from bc_fastkit.api import create_commit_session_router
+from bc_fastkit.crud import AsyncCRUDBase, CRUDBase
+
+from .conftest import FooModel, close_async_test_session, create_async_test_session
+
+
+class RecordingFooCRUD(CRUDBase):
+    def after_update(self, db, *, obj_in, entity, prev):
+        self.prevs.append(prev)
+        return super().after_update(db, obj_in=obj_in, entity=entity, prev=prev)
+
+
+class AsyncRecordingFooCRUD(AsyncCRUDBase):
+    async def after_update(self, db, *, obj_in, entity, prev):
+        self.prevs.append(prev)
+        return await super().after_update(db, obj_in=obj_in, entity=entity, prev=prev)
+
+
+@pytest.fixture
+def bulk_client(crud_client):
+    handler = RecordingFooCRUD(FooModel)
+    handler.prevs = []
+    client, _ = crud_client(handler, router=create_commit_session_router(), bulk=True)
+    return client, handler
+
+
+def test_bulk_routes(bulk_client):
+    client, handler = bulk_client
+    rs = client.post("/foo/bulk", json=[{"name": "a"}, {"name": "b"}]).json()
+    assert [(r["index"], r["success"], r["data"]["name"]) for r in rs] == [
+        (0, True, "a"),
+        (1, True, "b"),
+    ]
+    ids = [r["id"] for r in rs]
+
+    rs = client.put(
+        "/foo/bulk", json=[{"id": ids[0], "name": "x"}, {"id": 99, "name": "y"}]
+    ).json()
+    assert rs[0]["success"] and rs[0]["data"]["name"] == "x"
+    assert (rs[1]["id"], rs[1]["success"], rs[1]["message"]) == (99, False, "不存在")
+    assert [(type(p), p.name) for p in handler.prevs] == [(FooModel, "a")]
+
+    rs = client.request("DELETE", "/foo/bulk", json=[ids[1], 99]).json()
+    assert [(r["id"], r["success"]) for r in rs] == [(ids[1], True), (99, False)]
+    names = [r["name"] for r in client.get("/foo").json()["dataSource"]]
+    assert names == ["x"]
+
+
+@pytest.mark.parametrize("prev_as_entity", [False, True])
+def test_async_update_prev_type(prev_as_entity):
+    async def main():
+        db = await create_async_test_session()
+        handler = AsyncRecordingFooCRUD(FooModel)
+        handler.prev_as_entity = prev_as_entity
+        handler.prevs = []
+        db.add_all([FooModel(name="a"), FooModel(name="b")])
+        await db.commit()
+        rs = await handler.bulk_update(
+            db, obj_ins=[{"id": 2, "name": "y"}, {"id": 1, "name": "x"}]
+        )
+        assert [e.name for e in rs] == ["y", "x"]
+        await handler.update(db, obj_in={"id": 1, "name": "z"})
+        # 默认与原 AsyncCRUDBase.update 一致为 to_dict(), prev_as_entity 时与 CRUDBase 一致为实体副本
+        expected = FooModel if prev_as_entity else dict
+        assert [type(p) for p in handler.prevs] == [expected] * 3
+        assert [p.name if prev_as_entity else p["name"] for p in handler.prevs] == [
+            "b",
+            "a",
+            "x",
+        ]
+        await close_async_test_session(db)
+
+    asyncio.run(main())
@@ -0,0 +1,201 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from bc_fastkit.api import cancel
+from bc_fastkit.db import RoutingSession
+
+from .conftest import FooModel, create_async_test_engine, create_test_engine
+
+
+def capture_kills(engine, kills):
+    """记录发给 engine 的 KILL QUERY, 改为在 sqlite 上可执行的语句"""
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("KILL QUERY"):
+            kills.append((engine, statement))
+            return "select 1", ()
+        return statement, parameters
+
+
+def fake_thread_ids(monkeypatch, ids):
+    monkeypatch.setattr(
+        cancel, "get_connection_thread_id", lambda connection: ids[connection.engine]
+    )
+
+
+def capture_statements(engine, statements):
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+
+@pytest.mark.parametrize("read_replica", [True, False])
+def test_kill_query_uses_engine_of_each_connection(monkeypatch, read_replica):
+    primary, replica = create_test_engine(), create_test_engine()
+    kills = []
+    capture_kills(primary, kills)
+    capture_kills(replica, kills)
+    fake_thread_ids(monkeypatch, {primary: 11, replica: 22})
+    with RoutingSession(bind=primary, replicas=[replica]) as db:
+        db.info[cancel.CANCELLABLE_KEY] = True
+        if read_replica:
+            db.execute(select(FooModel))
+        else:
+            db.execute(text("select 1"))
+        assert asyncio.run(cancel.kill_query(db))
+        expected = (
+            (replica, "KILL QUERY 22") if read_replica else (primary, "KILL QUERY 11")
+        )
+        assert kills == [expected]
+        db.rollback()
+        assert cancel.CONNECTION_THREAD_ID_KEY not in db.info
+        assert not asyncio.run(cancel.kill_query(db))
+
+
+def test_async_kill_query(monkeypatch):
+    async def main():
+        primary = await create_async_test_engine()
+        kills = []
+        capture_kills(primary.sync_engine, kills)
+        fake_thread_ids(monkeypatch, {primary.sync_engine: 7})
+        async with AsyncSession(primary) as db:
+            db.info[cancel.CANCELLABLE_KEY] = True
+            await db.execute(select(FooModel))
+            assert await cancel.kill_query(db)
+        assert kills == [(primary.sync_engine, "KILL QUERY 7")]
+        await primary.dispose()
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def mysql_engine(monkeypatch):
+    """编译/执行仍为 sqlite, 优化器提示是注释, sqlite 可以执行"""
+    engine = create_test_engine()
+    monkeypatch.setattr(engine.dialect, "name", "mysql")
+    yield engine
+    engine.dispose()
+
+
+def test_statement_timeout_hint_on_outermost_select(mysql_engine):
+    statements = []
+    capture_statements(mysql_engine, statements)
+    with Session(mysql_engine) as db:
+        db.info[cancel.STATEMENT_TIMEOUT_KEY] = 1.5
+        query = db.query(FooModel).filter(FooModel.id > 0)
+        query.count()
+        query.limit(2).all()
+        db.execute(text("select 1"))
+    hint = "/*+ MAX_EXECUTION_TIME(1500) */"
+    assert [s.startswith(f"SELECT {hint} ") for s in statements] == [True, True, False]
+    assert [s.count(hint) for s in statements] == [1, 1, 0]
+
+
+def test_statement_timeout_only_for_mysql_dialects(engine):
+    statements = []
+    capture_statements(engine, statements)
+    with Session(engine) as db:
+        db.info[cancel.STATEMENT_TIMEOUT_KEY] = 1
+        db.query(FooModel).all()
+    assert "MAX_EXECUTION_TIME" not in statements[0]
+
+
+def test_with_statement_timeout(mysql_engine, monkeypatch):
+    dialect = mysql_engine.dialect
+    assert (
+        cancel.with_statement_timeout("SELECT 1", dialect, 2)
+        == "SELECT /*+ MAX_EXECUTION_TIME(2000) */ 1"
+    )
+    assert cancel.with_statement_timeout("WITH a AS (...) SELECT 1", dialect, 2) == (
+        "WITH a AS (...) SELECT 1"
+    )
+    monkeypatch.setattr(dialect, "is_mariadb", True, raising=False)
+    assert cancel.with_statement_timeout("SELECT 1", dialect, 2.5) == (
+        "SET STATEMENT max_statement_time=2.5 FOR SELECT 1"
+    )
+
+
+class DisconnectedRequest:
+    async def is_disconnected(self):
+        return True
+
+
+def test_run_cancellable_kills_sync_query_and_returns_499(monkeypatch, engine):
+    kills = []
+    capture_kills(engine, kills)
+    fake_thread_ids(monkeypatch, {engine: 5})
+    killed = threading.Event()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("select 1"):
+            killed.set()
+
+    def work(db):
+        db.execute(select(FooModel)).all()
+        # 模拟执行中的慢查询, 被 KILL 后中止
+        assert killed.wait(5)
+        raise RuntimeError("Query execution was interrupted")
+
+    async def main(db):
+        return await cancel.run_cancellable(
+            DisconnectedRequest(), db, asyncio.to_thread(work, db), poll_interval=0.01
+        )
+
+    with Session(engine) as db:
+        response = asyncio.run(main(db))
+    assert response.status_code == 499
+    assert kills == [(engine, "KILL QUERY 5")]
+
+
+def test_run_cancellable_cancels_async_task_after_kill(monkeypatch):
+    async def main():
+        engine = await create_async_test_engine()
+        kills = []
+        capture_kills(engine.sync_engine, kills)
+        fake_thread_ids(monkeypatch, {engine.sync_engine: 9})
+        cancelled = asyncio.Event()
+
+        async def work(db):
+            await db.execute(select(FooModel))
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async with AsyncSession(engine) as db:
+            response = await cancel.run_cancellable(
+                DisconnectedRequest(),
+                db,
+                work(db),
+                poll_interval=0.01,
+                cancel_timeout=0.01,
+            )
+        assert response.status_code == 499
+        assert cancelled.is_set()
+        assert kills == [(engine.sync_engine, "KILL QUERY 9")]
+        await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_run_cancellable_returns_result_when_connected(db):
+    class ConnectedRequest:
+        async def is_disconnected(self):
+            return False
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "rs"
+
+    result = asyncio.run(
+        cancel.run_cancellable(ConnectedRequest(), db, work(), poll_interval=0.005)
+    )
+    assert result == "rs"
@@ -0,0 +1,124 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from bc_fastkit.crud import AsyncCRUDBase, CRUDBase
+from bc_fastkit.crud.core.query import (
+    changed_since_statement,
+    decode_watermark,
+    encode_watermark,
+)
+from bc_fastkit.db import RoutingSession
+
+from .conftest import DDL, FooModel, close_async_test_session, create_async_test_session
+
+T0 = "2024-01-01 00:00:00.000000"
+
+
+class FooCRUD(CRUDBase):
+    changes_settle_seconds = 0
+
+
+def seed(db: Session, n: int = 7):
+    """id 1-3 同一 update_time, 之后每行递增一秒, id 2 已删除"""
+    db.execute(
+        text("insert into foo (name, update_time) values (:name, :t)"),
+        [{"name": f"n{i}", "t": T0} for i in range(n)],
+    )
+    db.execute(
+        text(
+            "update foo set update_time = strftime('%Y-%m-%d %H:%M:%f000',"
+            " '2024-01-01', '+' || id || ' seconds') where id > 3"
+        )
+    )
+    db.execute(text("update foo set is_deleted = 1 where id = 2"))
+    db.commit()
+
+
+def test_watermark_round_trip():
+    t = datetime(2024, 1, 2, 3, 4, 5, 600)
+    assert decode_watermark(encode_watermark(t, 42)) == (t, 42)
+
+
+@pytest.mark.parametrize("watermark", ["", "bad", "2024-01-01T00:00:00", "x_1"])
+def test_decode_watermark_rejects_malformed(watermark):
+    with pytest.raises(ValueError):
+        decode_watermark(watermark)
+
+
+def test_keyset_predicate():
+    stmt = changed_since_statement(
+        FooModel, encode_watermark(datetime(2024, 1, 1), 3), limit=10
+    )
+    sql = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    assert "foo.update_time >=" in sql
+    assert "foo.update_time >" in sql and "foo.id > 3" in sql
+    assert "ORDER BY foo.update_time, foo.id" in sql
+    assert "is_deleted" not in sql.split("WHERE", 1)[1]
+
+
+def test_search_changed_since_pages_through_ties(db):
+    seed(db)
+    handler = FooCRUD(FooModel)
+    watermark, pages = None, []
+    while True:
+        data, watermark = handler.search_changed_since(db, watermark, limit=3)
+        pages.append([(d.id, d.is_deleted) for d in data])
+        if len(data) < 3:
+            break
+    assert pages == [[(1, 0), (2, 1), (3, 0)], [(4, 0), (5, 0), (6, 0)], [(7, 0)]]
+    assert handler.search_changed_since(db, watermark) == ([], watermark)
+
+
+def test_settle_window_holds_back_recent_rows(db):
+    seed(db)
+    handler = CRUDBase(FooModel)
+    _, watermark = handler.search_changed_since(db)
+    handler.create(db, obj_in={"name": "fresh"})
+    db.commit()
+    assert handler.search_changed_since(db, watermark) == ([], watermark)
+
+
+def test_search_changed_since_reads_primary(engine):
+    with Session(engine) as db:
+        seed(db)
+    lagging = create_engine("sqlite://")
+    with lagging.begin() as conn:
+        for ddl in DDL:
+            conn.execute(text(ddl))
+    with RoutingSession(bind=engine, replicas=[lagging]) as db:
+        assert FooCRUD(FooModel).search(db, q={}) == []
+        data, _ = FooCRUD(FooModel).search_changed_since(db)
+        assert len(data) == 7
+
+
+def test_async_search_changed_since():
+    async def main():
+        db = await create_async_test_session()
+        await db.run_sync(seed)
+        handler = AsyncCRUDBase(FooModel)
+        handler.changes_settle_seconds = 0
+        data, watermark = await handler.search_changed_since(db, limit=2)
+        rest, _ = await handler.search_changed_since(db, watermark, limit=10)
+        assert [d.id for d in data + rest] == [1, 2, 3, 4, 5, 6, 7]
+        await close_async_test_session(db)
+
+    asyncio.run(main())
+
+
+def test_changes_route(engine, crud_client):
+    with Session(engine) as db:
+        seed(db)
+    client, _ = crud_client(FooCRUD(FooModel), changes=True)
+    body = client.get("/foo/changes", params={"limit": 3}).json()
+    assert body["hasMore"]
+    assert [d["isDeleted"] for d in body["dataSource"]] == [0, 1, 0]
+    body = client.get(
+        "/foo/changes", params={"watermark": body["watermark"], "limit": 10}
+    ).json()
+    assert [d["id"] for d in body["dataSource"]] == [4, 5, 6, 7]
+    assert not body["hasMore"]
+    assert client.get("/foo/changes", params={"watermark": "bad"}).status_code == 400
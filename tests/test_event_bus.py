@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+from bc_fastkit.crud import CRUDBase, CUDSubjectMixin
+from bc_fastkit.crud.base.mixin.subject import CRUD_EVENT_AFTER_CREATE
+from bc_fastkit.utils import AsyncEventBus
+
+from .conftest import FooModel
+
+
+class RecordingBus(AsyncEventBus):
+    def __init__(self) -> None:
+        super().__init__()
+        self.batches = []
+
+    def publish(self, events):
+        self.batches.append([e.data["name"] for e in events])
+
+
+class FooSubjectCRUD(CUDSubjectMixin, CRUDBase):
+    pass
+
+
+def make_handler():
+    handler = FooSubjectCRUD(FooModel)
+    handler.event_bus = RecordingBus()
+    handler.attach(lambda events: None, CRUD_EVENT_AFTER_CREATE)
+    return handler
+
+
+def test_events_follow_savepoints_and_publish_once_per_commit(db):
+    handler = make_handler()
+    handler.create(db, obj_in={"name": "a"})
+    with db.begin_nested():
+        handler.create(db, obj_in={"name": "kept"})
+    assert handler.event_bus.batches == []
+    savepoint = db.begin_nested()
+    handler.create(db, obj_in={"name": "rolled back"})
+    savepoint.rollback()
+    db.commit()
+    assert handler.event_bus.batches == [["a", "kept"]]
+
+
+def test_events_are_discarded_when_session_closes_without_commit(db):
+    handler = make_handler()
+    handler.create(db, obj_in={"name": "a"})
+    db.close()
+    handler.create(db, obj_in={"name": "b"})
+    db.commit()
+    assert handler.event_bus.batches == [["b"]]
+
+
+def test_publish_timeout_counts_only_dropped_events():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    release = asyncio.Event()
+
+    async def blocked(events):
+        await release.wait()
+
+    bus = AsyncEventBus(maxsize=1, batch_size=1, put_timeout=0.2)
+    bus.subscribe(1, blocked)
+    try:
+        asyncio.run_coroutine_threadsafe(bus.start(), loop).result()
+        # 第 1 条被消费者取走并阻塞, 第 2 条占满队列, 第 3 条超时丢弃
+        bus.publish([1, 1, 1])
+        deadline = time.monotonic() + 2
+        while bus.published + bus.dropped < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert (bus.published, bus.dropped) == (2, 1)
+    finally:
+        loop.call_soon_threadsafe(release.set)
+        asyncio.run_coroutine_threadsafe(bus.stop(), loop).result(2)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(2)
+        loop.close()
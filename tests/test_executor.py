@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from bc_fastkit.api import create_commit_session_router
+from bc_fastkit.api.executor import SessionExecutor, get_session_executor
+
+
+def test_session_is_pinned_to_one_worker(db):
+    executor = SessionExecutor(max_workers=4)
+
+    async def main():
+        threads = [await executor.run(db, threading.get_ident) for _ in range(5)]
+        with pytest.raises(ZeroDivisionError):
+            await executor.run(db, lambda: 1 / 0)
+        return threads
+
+    threads = asyncio.run(main())
+    assert len(set(threads)) == 1 and threads[0] != threading.get_ident()
+    assert get_session_executor(db) is executor
+    stats = executor.stats.to_dict()
+    assert (stats["submitted"], stats["completed"], stats["failed"]) == (6, 5, 1)
+    assert (stats["active"], stats["pending"]) == (0, 0)
+    assert executor._loads == [0, 0, 0, 0]
+    executor.shutdown()
+
+
+def test_concurrent_sessions_spread_over_workers(engine):
+    executor = SessionExecutor(max_workers=2)
+    release = threading.Event()
+
+    def work():
+        release.wait(5)
+        return threading.get_ident()
+
+    async def main():
+        with Session(engine) as a, Session(engine) as b:
+            tasks = [asyncio.ensure_future(executor.run(s, work)) for s in (a, b)]
+            await asyncio.sleep(0.05)
+            assert executor.stats.active == 2
+            release.set()
+            return await asyncio.gather(*tasks)
+
+    assert len(set(asyncio.run(main()))) == 2
+    executor.shutdown()
+
+
+def test_route_work_and_commit_run_on_same_worker(engine, crud_client):
+    executor = SessionExecutor(max_workers=4)
+    threads = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT"):
+            threads.append(threading.get_ident())
+
+    @event.listens_for(engine, "commit")
+    def record_commit(conn):
+        threads.append(threading.get_ident())
+
+    client, _ = crud_client(router=create_commit_session_router(), executor=executor)
+    assert client.post("/foo", json={"name": "a"}).status_code == 200
+    # INSERT(请求处理)和 commit(commit_session)在同一个工作线程
+    assert len(threads) == 2 and len(set(threads)) == 1
+    assert threads[0] != threading.get_ident()
+    stats = executor.stats.to_dict()
+    assert stats["submitted"] == stats["completed"] >= 2
+    assert stats["failed"] == 0
+    executor.shutdown()
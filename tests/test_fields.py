@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from pydantic import ConfigDict, field_serializer
+from sqlalchemy import inspect
+
+from bc_fastkit import schema as schema_module
+from bc_fastkit.crud import AsyncCRUDBase, CRUDBase
+from bc_fastkit.schema import (
+    BaseSchema,
+    create_default_cru_schema,
+    create_partial_schema,
+)
+
+from .conftest import FooModel, close_async_test_session, create_async_test_session
+
+
+@pytest.fixture
+def seeded(db):
+    for i in range(3):
+        db.add(FooModel(name=f"n{i}", memo=f"m{i}"))
+    db.commit()
+
+
+@pytest.mark.parametrize("lean", [False, True])
+def test_fields_are_normalized(crud_client, seeded, lean):
+    client, handler = crud_client(lean=lean)
+    a = client.get("/foo", params={"fields": "name,id,bogus"}).json()
+    b = client.get("/foo", params={"fields": "id,name"}).json()
+    assert a["dataSource"] == b["dataSource"]
+    assert set(a["dataSource"][0]) == {"id", "name"}
+    assert handler.get_response_schema(["name", "id"]) is handler.get_response_schema(
+        ["id", "name"]
+    )
+
+
+@pytest.mark.parametrize("lean", [False, True])
+def test_invalid_fields_fall_back_to_full_response(crud_client, seeded, lean):
+    client, _ = crud_client(lean=lean)
+    full = client.get("/foo").json()
+    assert client.get("/foo", params={"fields": "bogus"}).json()["dataSource"] == (
+        full["dataSource"]
+    )
+    assert {d["memo"] for d in full["dataSource"]} == {"m0", "m1", "m2"}
+
+
+def test_invalid_fields_do_not_project(db, seeded):
+    handler = CRUDBase(FooModel)
+    data, _ = handler.search_limit(db, q={}, fields=["bogus"])
+    assert not inspect(data[0]).unloaded
+    db.expunge_all()
+    data, _ = handler.search_limit(db, q={}, fields=["name", "key"])
+    assert not inspect(data[0]).unloaded
+    db.expunge_all()
+    data, _ = handler.search_limit(db, q={}, fields=["name"])
+    assert "memo" in inspect(data[0]).unloaded
+
+
+def test_async_invalid_fields_do_not_lazy_load():
+    async def main():
+        db = await create_async_test_session()
+        db.add(FooModel(name="a", memo="m"))
+        await db.commit()
+        data, _ = await AsyncCRUDBase(FooModel).search_limit(db, q={}, fields=["bogus"])
+        assert data[0].memo == "m"
+        await close_async_test_session(db)
+
+    asyncio.run(main())
+
+
+def test_schema_caches_are_bounded(crud_client, seeded, monkeypatch):
+    monkeypatch.setattr(schema_module, "SCHEMA_CACHE_MAXSIZE", 8)
+    client, _ = crud_client()
+    names = ["id", "name", "price", "memo", "extra", "create_time", "update_time"]
+    for i in range(1, 2 ** len(names)):
+        fields = [n for k, n in enumerate(names) if i >> k & 1]
+        assert (
+            client.get("/foo", params={"fields": ",".join(fields)}).status_code == 200
+        )
+    assert len(schema_module._SCHEMA_CACHE) <= 8
+    assert schema_module.get_type_adapter.cache_info().maxsize is not None
+    assert schema_module.get_row_encoder.cache_info().maxsize is not None
+
+
+class SnakeUpperBase(BaseSchema):
+    model_config = ConfigDict(alias_generator=None)
+
+    @field_serializer("name", check_fields=False)
+    def upper(self, value):
+        return value.upper()
+
+
+def test_partial_schema_keeps_source_config_and_serializers(crud_client, seeded):
+    schema = create_default_cru_schema(FooModel, r_base=SnakeUpperBase)
+    client, handler = crud_client(schema=schema)
+    full = client.get("/foo").json()["dataSource"]
+    partial = client.get("/foo", params={"fields": "name,create_time"}).json()
+    assert partial["dataSource"] == [
+        {"name": d["name"], "create_time": d["create_time"]} for d in full
+    ]
+    assert {d["name"] for d in full} == {"N0", "N1", "N2"}
+    assert issubclass(handler.get_response_schema(["name"]), SnakeUpperBase)
+
+
+def test_schema_with_own_serializers_is_not_trimmed():
+    class OwnSchema(create_default_cru_schema(FooModel).R):
+        @field_serializer("name")
+        def upper(self, value):
+            return value.upper()
+
+    assert create_partial_schema(OwnSchema, ("name",)) is OwnSchema
@@ -0,0 +1,39 @@
+import asyncio
+
+from bc_fastkit.crud import AsyncCRUDBase, CRUDBase
+from bc_fastkit.crud.core.query import key_lookup_statement
+
+from .conftest import BarModel, close_async_test_session, create_async_test_session
+
+BARS = [(2, "a"), (1, "b"), (2, "c"), (1, "d"), (3, "e")]
+
+
+def test_many_lookup_is_ordered_by_key_and_id():
+    stmt = key_lookup_statement(BarModel, "foo_id", many=True)
+    assert "ORDER BY bar.foo_id, bar.id" in str(stmt)
+    assert "ORDER BY" not in str(key_lookup_statement(BarModel, "foo_id"))
+
+
+def test_group_by_and_index_by(db):
+    db.add_all([BarModel(foo_id=f, name=n) for f, n in BARS])
+    db.commit()
+    handler = CRUDBase(BarModel)
+    groups = handler.group_by(db, "foo_id", [2, 1, 2, 9])
+    assert {k: [r.name for r in v] for k, v in groups.items()} == {
+        1: ["b", "d"],
+        2: ["a", "c"],
+    }
+    index = handler.index_by(db, "foo_id", [1, 2, 3], columns=["name"])
+    assert {k: r.name for k, r in index.items()} == {1: "b", 2: "a", 3: "e"}
+
+
+def test_async_group_by():
+    async def main():
+        db = await create_async_test_session()
+        db.add_all([BarModel(foo_id=f, name=n) for f, n in BARS])
+        await db.commit()
+        groups = await AsyncCRUDBase(BarModel).group_by(db, "foo_id", [1, 2])
+        assert [r.name for r in groups[2]] == ["a", "c"]
+        await close_async_test_session(db)
+
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from bc_fastkit.common.query import QUERY_TYPE_OVERALL
+from bc_fastkit.crud import (
+    AsyncCRUDBase,
+    AsyncCRUDItemMixin,
+    AsyncCRUDRelationMixin,
+    CRUDBase,
+    CRUDItemMixin,
+    CRUDRelationMixin,
+    Relation,
+)
+
+from .conftest import (
+    BarModel,
+    FooModel,
+    close_async_test_session,
+    create_async_test_session,
+)
+
+BARS = Relation("bars", BarModel, "foo_id")
+
+
+class BarsMixin(CRUDRelationMixin):
+    relations = [BARS]
+
+
+class AsyncBarsMixin(AsyncCRUDRelationMixin):
+    relations = [BARS]
+
+
+class FooItemCRUD(CRUDItemMixin, BarsMixin, CRUDBase):
+    ITEM_COLUMN_NAME = "foo_id"
+
+
+class AsyncFooItemCRUD(AsyncCRUDItemMixin, AsyncBarsMixin, AsyncCRUDBase):
+    ITEM_COLUMN_NAME = "foo_id"
+
+
+@pytest.fixture(autouse=True)
+def item_model(monkeypatch):
+    monkeypatch.setattr(FooModel, "ITEM_MODEL", BarModel, raising=False)
+
+
+@pytest.mark.parametrize("handler_cls", [FooItemCRUD, AsyncFooItemCRUD])
+def test_item_relation_keeps_other_relations(handler_cls):
+    handler = handler_cls(FooModel)
+    assert handler.relations == [BARS, Relation("items", BarModel, "foo_id")]
+
+
+def test_item_mixin_replaces_and_attaches_items(db):
+    handler = FooItemCRUD(FooModel)
+    foo = handler.create(db, obj_in={"name": "a", "items": [{"name": "x"}]})
+    assert [i.name for i in foo.items] == ["x"]
+    foo = handler.update(
+        db, obj_in={"id": foo.id, "items": [{"name": "y"}, {"name": "z"}]}
+    )
+    db.commit()
+    assert [i.name for i in foo.items] == ["y", "z"]
+    assert [i.name for i in handler.get_items(db, foo.id)] == ["y", "z"]
+    data = handler.complete_query_result(
+        db, db.query(FooModel).all(), QUERY_TYPE_OVERALL
+    )
+    assert [i.name for i in data[0].items] == ["y", "z"]
+    assert [b.name for b in data[0].bars] == ["y", "z"]
+
+
+def test_async_item_mixin_replaces_and_attaches_items():
+    async def main():
+        db = await create_async_test_session()
+        handler = AsyncFooItemCRUD(FooModel)
+        foo = await handler.create(db, obj_in={"name": "a", "items": [{"name": "x"}]})
+        assert [i.name for i in foo.items] == ["x"]
+        foo = await handler.update(
+            db, obj_in={"id": foo.id, "items": [{"name": "y"}, {"name": "z"}]}
+        )
+        await db.commit()
+        assert [i.name for i in foo.items] == ["y", "z"]
+        assert [i.name for i in await handler.get_items(db, foo.id)] == ["y", "z"]
+        await close_async_test_session(db)
+
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import VARCHAR, inspect, text
+from sqlalchemy.orm import Mapped
+
+from bc_fastkit.common.query import QUERY_TYPE_PRINT
+from bc_fastkit.crud import CRUDBase
+from bc_fastkit.model import BaseModel, DefaultTextColumn, NotNullColumn
+from bc_fastkit.schema import create_default_cru_schema
+
+
+class DocModel(BaseModel):
+    name: Mapped[str] = NotNullColumn(VARCHAR(32), server_default="")
+    secret: Mapped[str] = NotNullColumn(VARCHAR(32), server_default="")
+    body = DefaultTextColumn(list_deferred=True)
+
+
+class DocCRUD(CRUDBase):
+    def __init__(self, model):
+        super().__init__(model)
+        self.unloaded = []
+
+    def complete_query_result(self, db, data, typ=0, **kwargs):
+        data = super().complete_query_result(db, data, typ, **kwargs)
+        self.unloaded.extend(set(inspect(d).unloaded) for d in data)
+        return data
+
+
+@pytest.fixture
+def client(engine, crud_client):
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "create table doc (id integer primary key autoincrement,"
+                " create_time datetime default CURRENT_TIMESTAMP,"
+                " update_time datetime default CURRENT_TIMESTAMP,"
+                " name varchar(32) default '', secret varchar(32) default '',"
+                " body text default '')"
+            )
+        )
+        conn.execute(
+            text("insert into doc (name, secret, body) values ('a', 's', 'b')")
+        )
+    handler = DocCRUD(DocModel)
+    client, _ = crud_client(
+        handler,
+        path="/doc",
+        schema=create_default_cru_schema(DocModel, r_exclude=["secret"]),
+    )
+    return client, handler
+
+
+def test_list_defers_only_list_deferred_columns(client):
+    client, handler = client
+    row = client.get("/doc").json()["dataSource"][0]
+    assert "body" not in row and row["name"] == "a"
+    assert handler.unloaded == [{"body"}]
+
+
+def test_other_query_types_keep_deferred_columns(client):
+    client, handler = client
+    row = client.get("/doc", params={"typ": QUERY_TYPE_PRINT}).json()["dataSource"][0]
+    assert row["body"] == "b"
+    assert handler.unloaded == [set()]
+
+
+def test_requested_deferred_column_is_returned(client):
+    client, _ = client
+    row = client.get("/doc", params={"fields": "name,body"}).json()["dataSource"][0]
+    assert row == {"name": "a", "body": "b"}
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from bc_fastkit.crud.core.async_cud import (
+    db_async_multi_create,
+    db_async_multi_remove,
+    db_async_remove,
+)
+from bc_fastkit.crud.core.cud import (
+    conflict_statement,
+    db_multi_create,
+    db_multi_remove,
+    db_remove,
+)
+from bc_fastkit.db import (
+    OUTBOX_OP_CREATE,
+    OUTBOX_OP_REMOVE,
+    AsyncOutboxRelay,
+    MemorySink,
+    OutboxRelay,
+    outbox_metadata,
+)
+
+from .conftest import FooModel, close_async_test_session, create_async_test_session
+
+
+@pytest.fixture(autouse=True)
+def outbox_enabled(monkeypatch):
+    monkeypatch.setattr(FooModel, "OUTBOX", True, raising=False)
+
+
+@pytest.fixture
+def relay(engine):
+    outbox_metadata.create_all(engine)
+    return OutboxRelay(sessionmaker(engine), MemorySink())
+
+
+def test_multi_create_records_new_ids_without_orm_entities(db, relay):
+    db_multi_create(db, obj_ins=[{"name": "a"}, {"name": "b"}], model=FooModel)
+    assert len(db.identity_map) == 0
+    db.commit()
+    assert relay.drain() == 2
+    records = relay.sink.records
+    assert [(r.op, r.entity_id) for r in records] == [
+        (OUTBOX_OP_CREATE, 1),
+        (OUTBOX_OP_CREATE, 2),
+    ]
+    assert relay.drain() == 0
+
+
+def test_multi_remove_records_only_existing_rows(db, relay):
+    db_multi_create(db, obj_ins=[{"name": "a"}], model=FooModel)
+    db.commit()
+    relay.drain()
+    assert db_multi_remove(db, ids=[1, 99], model=FooModel) == [1, 99]
+    db_remove(db, id=98, model=FooModel)
+    db.commit()
+    relay.drain()
+    assert [(r.op, r.entity_id) for r in relay.sink.records[1:]] == [
+        (OUTBOX_OP_REMOVE, 1)
+    ]
+
+
+def test_removing_deleted_rows_records_nothing(db, relay):
+    db_multi_create(db, obj_ins=[{"name": "a"}, {"name": "b"}], model=FooModel)
+    db_multi_remove(db, ids=[1], model=FooModel)
+    db.commit()
+    db_multi_remove(db, ids=[1, 2], model=FooModel)
+    db_remove(db, id=1, model=FooModel)
+    db.commit()
+    relay.drain()
+    assert [(r.op, r.entity_id) for r in relay.sink.records[2:]] == [
+        (OUTBOX_OP_REMOVE, 1),
+        (OUTBOX_OP_REMOVE, 2),
+    ]
+
+
+def test_conflict_statement_uses_primary_and_unique_keys():
+    assert conflict_statement(FooModel, {"name": "a"}) is None
+    stmt = conflict_statement(FooModel, {"id": 1, "name": "a"})
+    assert "foo.id = " in str(stmt)
+
+
+def test_async_multi_create_records_new_ids():
+    async def main():
+        db = await create_async_test_session()
+        async with db.bind.begin() as conn:
+            await conn.run_sync(outbox_metadata.create_all)
+        await db_async_multi_create(
+            db, obj_ins=[{"name": "a"}, {"name": "b"}], model=FooModel
+        )
+        await db.commit()
+        sink = MemorySink()
+        relay = AsyncOutboxRelay(lambda: type(db)(db.bind), sink)
+        assert await relay.drain() == 2
+        assert [r.entity_id for r in sink.records] == [1, 2]
+        await close_async_test_session(db)
+
+    asyncio.run(main())
+
+
+def test_async_removing_deleted_rows_records_nothing():
+    async def main():
+        db = await create_async_test_session()
+        async with db.bind.begin() as conn:
+            await conn.run_sync(outbox_metadata.create_all)
+        await db_async_multi_create(
+            db, obj_ins=[{"name": "a"}, {"name": "b"}], model=FooModel
+        )
+        await db_async_multi_remove(db, ids=[1], model=FooModel)
+        await db.commit()
+        await db_async_multi_remove(db, ids=[1, 2], model=FooModel)
+        await db_async_remove(db, id=1, model=FooModel)
+        await db.commit()
+        sink = MemorySink()
+        await AsyncOutboxRelay(lambda: type(db)(db.bind), sink).drain()
+        assert [(r.op, r.entity_id) for r in sink.records[2:]] == [
+            (OUTBOX_OP_REMOVE, 1),
+            (OUTBOX_OP_REMOVE, 2),
+        ]
+        await close_async_test_session(db)
+
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import StaticPool
+
+from bc_fastkit.db import (
+    DEFAULT_POOL_OPTIONS,
+    Histogram,
+    PoolStats,
+    create_async_db_engine,
+    create_async_sessionmaker,
+    create_db_engine,
+    create_session_dep,
+    create_sessionmaker,
+    get_pool_stats,
+    pool_status,
+)
+from bc_fastkit.db.engine import (
+    InstrumentedAsyncQueuePool,
+    InstrumentedQueuePool,
+    get_engine_options,
+)
+
+
+def test_histogram_buckets():
+    h = Histogram([0.01, 0.001])
+    for v in (0.001, 0.002, 0.5):
+        h.observe(v)
+    snapshot = h.snapshot()
+    assert snapshot["buckets"] == {"le_0.001": 1, "le_0.01": 1, "inf": 1}
+    assert (snapshot["count"], snapshot["max"]) == (3, 0.5)
+    assert snapshot["sum"] == pytest.approx(0.503)
+
+
+def test_default_pool_options_reach_engine(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/a.db")
+    pool = engine.pool
+    assert isinstance(pool, InstrumentedQueuePool)
+    assert pool.size() == DEFAULT_POOL_OPTIONS["pool_size"]
+    assert pool._max_overflow == DEFAULT_POOL_OPTIONS["max_overflow"]
+    assert pool._timeout == DEFAULT_POOL_OPTIONS["pool_timeout"]
+    assert pool._recycle == DEFAULT_POOL_OPTIONS["pool_recycle"]
+    assert pool._pre_ping is DEFAULT_POOL_OPTIONS["pool_pre_ping"]
+    engine.dispose()
+    # dispose 重建的连接池沿用原统计
+    assert engine.pool is not pool and engine.pool.stats is pool.stats
+
+
+def test_engine_options_skip_pool_options_for_other_pools():
+    assert get_engine_options(InstrumentedQueuePool, {"pool_size": 1}) == {
+        **DEFAULT_POOL_OPTIONS,
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": 1,
+    }
+    assert get_engine_options(InstrumentedQueuePool, {"poolclass": StaticPool}) == {
+        "poolclass": StaticPool
+    }
+
+
+def test_checkout_wait_and_timeout_are_recorded(tmp_path):
+    stats = PoolStats()
+    engine = create_db_engine(
+        f"sqlite:///{tmp_path}/a.db",
+        stats=stats,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    assert get_pool_stats(engine) is stats
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+        assert pool_status(engine)["checked_out"] == 1
+        with pytest.raises(TimeoutError):
+            engine.connect()
+    status = pool_status(engine)
+    assert (status["timeouts"], status["wait"]["count"]) == (1, 2)
+    assert status["wait"]["max"] >= 0.05
+    assert (status["size"], status["checked_in"], status["checked_out"]) == (1, 1, 0)
+    engine.dispose()
+
+
+def test_async_checkout_wait_and_timeout_are_recorded(tmp_path):
+    async def main():
+        engine = create_async_db_engine(
+            f"sqlite+aiosqlite:///{tmp_path}/a.db",
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=0.05,
+        )
+        assert isinstance(engine.sync_engine.pool, InstrumentedAsyncQueuePool)
+        async with engine.connect() as conn:
+            await conn.execute(text("select 1"))
+            with pytest.raises(TimeoutError):
+                await engine.connect().start()
+        status = pool_status(engine)
+        assert (status["timeouts"], status["wait"]["count"]) == (1, 2)
+        await engine.dispose()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("is_async", [False, True])
+def test_session_dep_records_session_lifetime(tmp_path, is_async):
+    if is_async:
+        engine = create_async_db_engine(f"sqlite+aiosqlite:///{tmp_path}/a.db")
+        session_dep = create_session_dep(create_async_sessionmaker(engine))
+    else:
+        engine = create_db_engine(f"sqlite:///{tmp_path}/a.db")
+        session_dep = create_session_dep(create_sessionmaker(engine))
+    app = FastAPI()
+
+    @app.get("/")
+    def index(db: session_dep):
+        return {}
+
+    with TestClient(app) as client:
+        client.get("/")
+        client.get("/")
+    assert get_pool_stats(engine).session_lifetime.count == 2
+    if is_async:
+        asyncio.run(engine.dispose())
+    else:
+        engine.dispose()
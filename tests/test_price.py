@@ -0,0 +1,128 @@
+import asyncio
+import copy
+import random
+from decimal import Decimal
+
+import pytest
+
+from bc_fastkit.common.price import (
+    TAX_TYP_TAX_CONTAIN,
+    TAX_TYP_TAX_EXCLUDE,
+    compute_bill_prices,
+)
+from bc_fastkit.crud import AsyncBillPriceMixIn, BillPriceMixIn
+
+
+def legacy_bill_prices(obj_in):
+    """原 BillPriceMixIn.update_obj_in_meta_price 的计算(去掉币种查询)"""
+    items = obj_in["items"]
+    for item in items:
+        item["currency_rate"] = obj_in["currency_rate"]
+        item["currency_id"] = obj_in["currency_id"]
+        item["discount"] = obj_in["discount"]
+        item["tax_typ"] = obj_in["tax_typ"]
+        tax_rate = Decimal((1 + item["tax_rate"] / 100))
+        if "price" not in item and all(
+            i in item for i in ["untaxed_price", "tax_rate"]
+        ):
+            item["taxed_price"] = item["untaxed_price"] * tax_rate
+        elif obj_in["tax_typ"] == TAX_TYP_TAX_CONTAIN:
+            item["untaxed_price"] = item["price"] / tax_rate
+            item["taxed_price"] = item["price"]
+        else:
+            item["untaxed_price"] = item["price"]
+            item["taxed_price"] = item["price"] * tax_rate
+    if not obj_in.get("untaxed_amount"):
+        obj_in["untaxed_amount"] = obj_in["discount"] * sum(
+            [i["untaxed_price"] * i["quantity"] for i in items]
+        )
+    if not obj_in.get("taxed_amount"):
+        obj_in["taxed_amount"] = obj_in["discount"] * sum(
+            [i["taxed_price"] * i["quantity"] for i in items]
+        )
+    return obj_in
+
+
+def make_bill(rng: random.Random, tax_typ: int):
+    items = []
+    for _ in range(rng.randint(1, 50)):
+        item = {
+            "tax_rate": rng.choice([Decimal(0), Decimal("6.5"), 9, 13.0]),
+            # 超过 DECIMAL(20, 8) 的小数位, 原实现不舍入
+            "quantity": Decimal(rng.randint(1, 10**12)).scaleb(-10),
+        }
+        price = Decimal(rng.randint(1, 10**14)).scaleb(-rng.randint(2, 12))
+        item["untaxed_price" if rng.random() < 0.2 else "price"] = price
+        items.append(item)
+    return {
+        "currency_id": 1,
+        "currency_rate": Decimal("7.1"),
+        "discount": Decimal(rng.randint(8000, 10000)).scaleb(-4),
+        "tax_typ": tax_typ,
+        "items": items,
+    }
+
+
+def exact(obj_in):
+    """Decimal 的 == 不区分 1.0 与 1.00, 比较 repr 以确认结果逐位一致(不比较键的顺序)"""
+    if isinstance(obj_in, dict):
+        return {k: exact(v) for k, v in obj_in.items()}
+    if isinstance(obj_in, list):
+        return [exact(v) for v in obj_in]
+    return repr(obj_in)
+
+
+@pytest.mark.parametrize("tax_typ", [TAX_TYP_TAX_CONTAIN, TAX_TYP_TAX_EXCLUDE])
+def test_bill_prices_match_legacy_arithmetic(tax_typ):
+    rng = random.Random(tax_typ)
+    for _ in range(50):
+        bill = make_bill(rng, tax_typ)
+        expected = legacy_bill_prices(copy.deepcopy(bill))
+        assert exact(compute_bill_prices(bill)) == exact(expected)
+
+
+def test_prices_beyond_eight_decimals_are_not_rounded():
+    bill = {
+        "currency_id": 1,
+        "currency_rate": Decimal(1),
+        "discount": Decimal(1),
+        "tax_typ": TAX_TYP_TAX_EXCLUDE,
+        "items": [
+            {"tax_rate": Decimal(10), "price": Decimal("0.123456789012"), "quantity": 2}
+        ],
+    }
+    rs = compute_bill_prices(bill)
+    assert rs["items"][0]["taxed_price"] == Decimal("0.1358024679132")
+    assert rs["untaxed_amount"] == Decimal("0.246913578024")
+
+
+def test_given_amounts_are_kept():
+    bill = make_bill(random.Random(0), TAX_TYP_TAX_EXCLUDE)
+    bill["untaxed_amount"] = Decimal(1)
+    rs = compute_bill_prices(bill)
+    assert rs["untaxed_amount"] == Decimal(1)
+    assert rs["taxed_amount"] > 0
+
+
+class RateBillPrice(BillPriceMixIn):
+    def get_currency_rate(self, db, currency_id):
+        return Decimal("7.2")
+
+
+class AsyncRateBillPrice(AsyncBillPriceMixIn):
+    async def get_currency_rate(self, db, currency_id):
+        return Decimal("7.2")
+
+
+def test_price_mixins_apply_currency_rate():
+    bill = make_bill(random.Random(1), TAX_TYP_TAX_EXCLUDE)
+    rs = RateBillPrice().update_obj_in_meta_price(None, copy.deepcopy(bill))
+    async_rs = asyncio.run(
+        AsyncRateBillPrice().update_obj_in_meta_price(None, copy.deepcopy(bill))
+    )
+    assert exact(rs) == exact(async_rs)
+    assert {i["currency_rate"] for i in rs["items"]} == {Decimal("7.2")}
+    # 缺少表头价格字段时不计算
+    assert RateBillPrice().update_obj_in_meta_price(None, {"items": []}) == {
+        "items": []
+    }
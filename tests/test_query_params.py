@@ -0,0 +1,83 @@
+import json
+from datetime import date
+
+import pytest
+
+from bc_fastkit.common.query import CommonQueryParams
+from bc_fastkit.common.uitls import (
+    deep_hump2underline,
+    deep_underline2hump,
+    hump2underline,
+    json_loads,
+    underline2hump,
+)
+
+NESTED = {
+    "fooBar": {"innerKey": [{"deepKey": 1}, "keepValue"]},
+    "idList": [[1, 2], []],
+}
+NESTED_UNDERLINE = {
+    "foo_bar": {"inner_key": [{"deep_key": 1}, "keepValue"]},
+    "id_list": [[1, 2], []],
+}
+
+
+def test_parse_q_converts_nested_keys_and_drops_empty_conditions():
+    q = json.dumps({**NESTED, "emptyStr": "", "emptyList": [], "zero": 0})
+    assert CommonQueryParams(q=q).q == {**NESTED_UNDERLINE, "zero": 0}
+    assert CommonQueryParams(q=None).q == {}
+    # dict 原样使用
+    assert CommonQueryParams(q={"fooBar": 1}).q == {"fooBar": 1}
+
+
+def test_parse_order_by_and_fields():
+    common = CommonQueryParams(
+        orderBy="-createTime, +fooBar,,name", fields="id, createTime,"
+    )
+    assert common.order_by == ["-create_time", "+foo_bar", "name"]
+    assert common.fields == ["id", "create_time"]
+    assert CommonQueryParams(orderBy=",,", fields=" ").order_by is None
+    assert CommonQueryParams(fields=" ,").fields is None
+
+
+def test_cache_key_is_normalized():
+    a = CommonQueryParams(
+        q='{"fooBar": 1, "name": "x"}', orderBy="-id", fields="id,name"
+    )
+    b = CommonQueryParams(
+        q='{"name": "x", "foo_bar": 1}', orderBy=" -id", fields="id, name"
+    )
+    assert a.cache_key() == b.cache_key()
+    assert a.cache_key() != CommonQueryParams(q=a.q, skip=20).cache_key()
+    # q 中的非 JSON 类型按 str 序列化
+    assert "2024-01-02" in CommonQueryParams(q={"day": date(2024, 1, 2)}).cache_key()
+
+
+def test_to_dict_converts_back_to_hump():
+    common = CommonQueryParams(q=json.dumps(NESTED), fields="createTime")
+    assert common.to_dict() == {
+        "q": NESTED,
+        "skip": 0,
+        "limit": 20,
+        "typ": 0,
+        "fields": ["createTime"],
+    }
+
+
+def test_deep_conversions_and_key_cache():
+    assert deep_hump2underline(NESTED) == NESTED_UNDERLINE
+    assert deep_underline2hump(NESTED_UNDERLINE) == NESTED
+    hump2underline.cache_clear()
+    underline2hump.cache_clear()
+    for _ in range(3):
+        assert hump2underline("createTime") == "create_time"
+        assert underline2hump("create_time") == "createTime"
+    assert (hump2underline.cache_info().hits, underline2hump.cache_info().hits) == (
+        2,
+        2,
+    )
+
+
+@pytest.mark.parametrize("raw", ['{"a": [1, {"b": null}]}', b'{"a": [1, {"b": null}]}'])
+def test_json_loads_accepts_str_and_bytes(raw):
+    assert json_loads(raw) == {"a": [1, {"b": None}]}
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from sqlalchemy import VARCHAR
+from sqlalchemy.orm import Mapped
+
+from bc_fastkit.common.query import QUERY_TYPE_OVERALL
+from bc_fastkit.crud import CRUDBase, CRUDRelationMixin, Relation
+from bc_fastkit.crud.core.async_cud import db_async_multi_replace
+from bc_fastkit.crud.core.cud import db_multi_replace, plan_replacement
+from bc_fastkit.model import BaseModel, NotNullColumn, UniqueConstraint
+
+from .conftest import (
+    BarModel,
+    FooModel,
+    close_async_test_session,
+    create_async_test_session,
+)
+
+
+def bars(*names):
+    return [BarModel(id=i, foo_id=1, name=n) for i, n in enumerate(names, 1)]
+
+
+def test_plan_replacement_matches_ids_then_reuses_rows():
+    updates, creates, remove_ids = plan_replacement(
+        bars("x", "y", "z"), [{"id": 2, "name": "y"}, {"name": "w"}], BarModel
+    )
+    # id 2 无变化不更新, 新数据复用旧行 1, 多余的旧行 3 删除
+    assert (updates, creates, remove_ids) == ([{"name": "w", "id": 1}], [], [3])
+
+    updates, creates, remove_ids = plan_replacement(
+        bars("x"), [{"id": 9, "name": "x"}, {"name": "v"}], BarModel
+    )
+    assert (updates, creates, remove_ids) == ([], [{"name": "v"}], [])
+
+
+class BazModel(BaseModel):
+    __table_args__ = (UniqueConstraint("code"), UniqueConstraint("name"))
+
+    code: Mapped[str] = NotNullColumn(VARCHAR(32))
+    name: Mapped[str] = NotNullColumn(VARCHAR(32))
+
+
+def bazs(*pairs):
+    return [BazModel(id=i, code=c, name=n) for i, (c, n) in enumerate(pairs, 1)]
+
+
+def test_plan_replacement_requires_unique_columns_when_ambiguous():
+    old, new = bazs(("a", "x"), ("b", "y")), [{"code": "b", "name": "z"}]
+    with pytest.raises(ValueError):
+        plan_replacement(old, new, BazModel)
+    # 按 code 配对: 更新旧行 2, 删除旧行 1
+    assert plan_replacement(old, new, BazModel, unique_columns=["code"]) == (
+        [{"name": "z", "id": 2}],
+        [],
+        [1],
+    )
+    # 空列表: 不按唯一约束配对, 按顺序复用旧行 1
+    assert plan_replacement(old, new, BazModel, unique_columns=[]) == (
+        [{"code": "b", "name": "z", "id": 1}],
+        [],
+        [2],
+    )
+
+
+def test_db_multi_replace(db):
+    db.add_all(bars("x", "y", "z"))
+    db.commit()
+    old = db.query(BarModel).all()
+    created = db_multi_replace(
+        db,
+        old_entities=old,
+        new_objs=[{"foo_id": 1, "name": n} for n in ("a", "y", "b", "c", "d")],
+        model=BarModel,
+    )
+    db.commit()
+    assert [(e.id, e.name) for e in created] == [(4, "c"), (5, "d")]
+    rows = db.query(BarModel).filter(BarModel.is_deleted == 0).order_by(BarModel.id)
+    assert [(e.id, e.name) for e in rows] == [
+        (1, "a"),
+        (2, "y"),
+        (3, "b"),
+        (4, "c"),
+        (5, "d"),
+    ]
+    # 被更新的旧实体已 expire, 读取时为新值
+    assert [e.name for e in old] == ["a", "y", "b"]
+
+
+def test_async_db_multi_replace_removes_extra_rows():
+    async def main():
+        db = await create_async_test_session()
+        db.add_all(bars("x", "y", "z"))
+        await db.commit()
+        old = [await db.get(BarModel, i) for i in (1, 2, 3)]
+        created = await db_async_multi_replace(
+            db,
+            old_entities=old,
+            new_objs=[{"id": 3, "foo_id": 1, "name": "z2"}],
+            model=BarModel,
+            return_created=False,
+        )
+        await db.commit()
+        assert created == []
+        for e in old:
+            await db.refresh(e)
+        assert [(e.name, e.is_deleted) for e in old] == [("x", 1), ("y", 1), ("z2", 0)]
+        await close_async_test_session(db)
+
+    asyncio.run(main())
+
+
+class FooRelationCRUD(CRUDRelationMixin, CRUDBase):
+    relations = [Relation("bars", BarModel, "foo_id")]
+
+
+def test_relation_mixin_replaces_and_attaches_children(db):
+    handler = FooRelationCRUD(FooModel)
+    foo = handler.create(
+        db, obj_in={"name": "a", "bars": [{"name": "x"}, {"name": "y"}]}
+    )
+    handler.update(db, obj_in={"id": foo.id, "bars": [{"name": "y"}, {"name": "z"}]})
+    db.commit()
+    data = handler.complete_query_result(
+        db, db.query(FooModel).all(), QUERY_TYPE_OVERALL
+    )
+    assert [b.name for b in data[0].bars] == ["y", "z"]
@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text, update
+from sqlalchemy.orm import sessionmaker
+
+from bc_fastkit.api import CRUDRequestHandler, create_commit_session_router
+from bc_fastkit.api.cache import ResponseCache
+from bc_fastkit.crud import CRUDBase
+from bc_fastkit.crud.core.cud import db_multi_create
+from bc_fastkit.db import call_after_commit
+
+from .conftest import FooModel, close_async_test_session, create_async_test_session
+
+
+def test_call_after_commit_runs_once_after_commit(db):
+    calls = []
+    call_after_commit(db, lambda: calls.append(1))
+    db.execute(text("insert into foo (name) values ('a')"))
+    assert calls == []
+    db.commit()
+    assert calls == [1]
+    db.execute(text("select 1"))
+    db.commit()
+    assert calls == [1]
+
+
+def test_call_after_commit_discarded_on_rollback_and_close(db):
+    calls = []
+    db.execute(text("select 1"))
+    call_after_commit(db, lambda: calls.append("rollback"))
+    db.rollback()
+    db.execute(text("select 1"))
+    call_after_commit(db, lambda: calls.append("close"))
+    db.close()
+    db.execute(text("select 1"))
+    db.commit()
+    assert calls == []
+
+
+def test_call_after_commit_follows_savepoints(db):
+    calls = []
+    db.execute(text("select 1"))
+    with db.begin_nested():
+        call_after_commit(db, lambda: calls.append("released"))
+    nested = db.begin_nested()
+    call_after_commit(db, lambda: calls.append("rolled back"))
+    nested.rollback()
+    assert calls == []
+    db.commit()
+    assert calls == ["released"]
+
+
+def test_call_after_commit_async():
+    async def main():
+        db = await create_async_test_session()
+        calls = []
+        call_after_commit(db, lambda: calls.append(1))
+        await db.execute(text("insert into foo (name) values ('a')"))
+        await db.commit()
+        assert calls == [1]
+        await close_async_test_session(db)
+
+    asyncio.run(main())
+
+
+def test_response_cache_ignores_results_started_before_clear():
+    cache = ResponseCache(ttl=60)
+    generation = cache.generation
+    cache.clear()
+    cache.set("k", b"stale", generation=generation)
+    assert cache.get("k") is None
+    cache.set("k", b"fresh", generation=cache.generation)
+    assert cache.get("k").body == b"fresh"
+
+
+class NoSuperFooCRUD(CRUDBase):
+    def after_create(self, db, *, obj_in, entity):
+        return entity
+
+
+@pytest.fixture
+def cached_client(crud_client):
+    def make(handler, request_handler_cls=CRUDRequestHandler):
+        client, request_handler = crud_client(
+            handler,
+            router=create_commit_session_router(),
+            request_handler_cls=request_handler_cls,
+            session_kwargs={"expire_on_commit": False},
+            cache_ttl=60,
+        )
+        return client, request_handler.response_cache
+
+    return make
+
+
+def test_cache_invalidated_after_committed_write(cached_client):
+    client, cache = cached_client(NoSuperFooCRUD(FooModel))
+    assert client.get("/foo").json()["total"] == 0
+    assert client.get("/foo").json()["total"] == 0
+    assert cache.hits == 1
+    assert client.post("/foo", json={"name": "a"}).status_code == 200
+    assert len(cache) == 0
+    assert client.get("/foo").json()["total"] == 1
+
+
+class FailingFooCRUD(CRUDBase):
+    def after_create(self, db, *, obj_in, entity):
+        raise ValueError("failed after insert")
+
+
+def test_cache_kept_when_write_fails(cached_client):
+    client, cache = cached_client(FailingFooCRUD(FooModel))
+    client = TestClient(client.app, raise_server_exceptions=False)
+    client.get("/foo")
+    assert client.post("/foo", json={"name": "a"}).status_code == 500
+    assert len(cache) == 1
+    assert client.get("/foo").json()["total"] == 0
+
+
+def test_cache_invalidated_by_writes_outside_the_routes(engine, cached_client):
+    client, cache = cached_client(CRUDBase(FooModel))
+    maker = sessionmaker(engine)
+    client.get("/foo")
+    with maker() as db:
+        CRUDBase(FooModel).create(db, obj_in={"name": "a"})
+        db.rollback()
+    assert len(cache) == 1
+    with maker() as db:
+        db_multi_create(db, obj_ins=[{"name": "a"}, {"name": "b"}], model=FooModel)
+        db.commit()
+    assert len(cache) == 0
+    assert client.get("/foo").json()["total"] == 2
+    with maker() as db:
+        db.execute(update(FooModel).where(FooModel.id == 1).values(name="x"))
+        db.commit()
+    names = {d["name"] for d in client.get("/foo").json()["dataSource"]}
+    assert names == {"x", "b"}
+
+
+def test_cache_key_includes_caller_identity(cached_client):
+    client, cache = cached_client(CRUDBase(FooModel))
+    client.get("/foo", headers={"Authorization": "Bearer a"})
+    client.get("/foo", headers={"Authorization": "Bearer b"})
+    assert (len(cache), cache.hits) == (2, 0)
+    client.get("/foo", headers={"Authorization": "Bearer a"})
+    assert cache.hits == 1
+
+
+class ScopedFooCRUD(CRUDBase):
+    def complete_query(self, db, query, typ=..., **kwargs):
+        return super().complete_query(db, query, typ, **kwargs)
+
+
+class TenantFooHandler(CRUDRequestHandler):
+    def cache_key_extra(self, request):
+        return request.headers.get("x-tenant")
+
+
+def test_scoped_query_requires_cache_key_extra(cached_client):
+    with pytest.raises(ValueError):
+        cached_client(ScopedFooCRUD(FooModel))
+    client, cache = cached_client(ScopedFooCRUD(FooModel), TenantFooHandler)
+    client.get("/foo", headers={"X-Tenant": "1"})
+    client.get("/foo", headers={"X-Tenant": "2"})
+    assert len(cache) == 2
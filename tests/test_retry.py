@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+
+from bc_fastkit.api import commit_session
+from bc_fastkit.api.retry import MYSQL_DEADLOCK, MYSQL_LOCK_WAIT_TIMEOUT, RetryPolicy
+
+
+def db_error(code=None, invalidated=False) -> OperationalError:
+    orig = Exception(code, "error") if code else Exception("gone away")
+    return OperationalError("COMMIT", {}, orig, connection_invalidated=invalidated)
+
+
+@pytest.mark.parametrize(
+    "error, committing, expected",
+    [
+        (db_error(MYSQL_DEADLOCK), False, True),
+        (db_error(MYSQL_LOCK_WAIT_TIMEOUT), True, True),
+        (db_error(1062), False, False),
+        (db_error(invalidated=True), False, True),
+        (db_error(invalidated=True), True, False),
+        (ValueError("x"), False, False),
+    ],
+)
+def test_is_transient(error, committing, expected):
+    assert RetryPolicy().is_transient(error, committing) is expected
+
+
+def test_should_retry_stops_at_max_attempts():
+    policy = RetryPolicy(max_attempts=2)
+    assert policy.should_retry(db_error(MYSQL_DEADLOCK), 1)
+    assert not policy.should_retry(db_error(MYSQL_DEADLOCK), 2)
+    assert policy.stats() == {"retries": 1, "giveups": 1}
+
+
+def run_endpoint(db, body_errors=(), commit_errors=()):
+    body_errors, commit_errors = list(body_errors), list(commit_errors)
+    calls = []
+
+    async def endpoint(db):
+        calls.append(1)
+        if body_errors:
+            raise body_errors.pop(0)
+        return "ok"
+
+    def commit():
+        if commit_errors:
+            raise commit_errors.pop(0)
+
+    db.commit = commit
+    wrapped = commit_session(endpoint, RetryPolicy(base_delay=0))
+    try:
+        return asyncio.run(wrapped(db=db)), len(calls)
+    except HTTPException as e:
+        return e, len(calls)
+
+
+def test_commit_session_retries_deadlock(db):
+    assert run_endpoint(db, body_errors=[db_error(MYSQL_DEADLOCK)]) == ("ok", 2)
+    assert run_endpoint(db, commit_errors=[db_error(MYSQL_DEADLOCK)]) == ("ok", 2)
+    assert run_endpoint(db, body_errors=[db_error(invalidated=True)]) == ("ok", 2)
+
+
+def test_commit_session_does_not_retry_invalidated_commit(db):
+    res, calls = run_endpoint(db, commit_errors=[db_error(invalidated=True)])
+    assert isinstance(res, HTTPException) and calls == 1
@@ -0,0 +1,80 @@
+import asyncio
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bc_fastkit.db import (
+    RoutingSession,
+    create_async_routing_sessionmaker,
+    create_routing_sessionmaker,
+    create_sibling_session,
+)
+
+from .conftest import FooModel, create_async_test_engine, create_test_engine
+
+
+def test_routing_session_keeps_one_replica():
+    primary = create_test_engine()
+    replicas = [create_test_engine() for _ in range(4)]
+    with RoutingSession(bind=primary, replicas=replicas) as db:
+        binds = {db.get_bind(clause=select(FooModel)) for _ in range(20)}
+        assert len(binds) == 1 and binds <= set(replicas)
+        db.execute(text("select 1"))
+        assert db.get_bind(clause=select(FooModel)) is primary
+
+
+def test_sibling_session_reads_same_replica():
+    async def main():
+        primary = await create_async_test_engine()
+        replicas = [await create_async_test_engine() for _ in range(4)]
+        db = AsyncSession(
+            bind=primary, sync_session_class=RoutingSession, replicas=replicas
+        )
+        sibling = create_sibling_session(db)
+        assert sibling.sync_session.replicas == [db.sync_session.replica]
+        for e in [primary, *replicas]:
+            await e.dispose()
+
+    asyncio.run(main())
+
+
+def test_sibling_session_uses_originating_sessionmaker():
+    primary = create_test_engine()
+    replicas = [create_test_engine() for _ in range(4)]
+    maker = create_routing_sessionmaker(
+        primary, replicas, autoflush=False, info={"tenant": 1}
+    )
+    with maker() as db, create_sibling_session(db) as sibling:
+        assert type(sibling) is type(db)
+        assert sibling.bind is primary
+        assert sibling.replicas == [db.replica]
+        assert not sibling.autoflush
+        assert sibling.info["tenant"] == 1
+
+
+def test_async_sibling_session_uses_originating_sessionmaker():
+    async def main():
+        primary = await create_async_test_engine()
+        replicas = [await create_async_test_engine() for _ in range(2)]
+        maker = create_async_routing_sessionmaker(
+            primary, replicas, expire_on_commit=True
+        )
+        async with maker() as db, create_sibling_session(db) as sibling:
+            assert sibling.bind is primary
+            assert isinstance(sibling.sync_session, RoutingSession)
+            assert sibling.sync_session.replicas == [db.sync_session.replica]
+            assert sibling.sync_session.expire_on_commit
+        for e in [primary, *replicas]:
+            await e.dispose()
+
+    asyncio.run(main())
+
+
+def test_sibling_session_copies_binds():
+    primary, replica = create_test_engine(), create_test_engine()
+    with RoutingSession(binds={FooModel: primary}, replicas=[replica]) as db:
+        sibling = create_sibling_session(db)
+        assert sibling.bind is None
+        assert sibling.get_bind(FooModel.__mapper__) is primary
+        assert sibling.replicas == [db.replica]
+        sibling.close()
@@ -0,0 +1,59 @@
+from decimal import Decimal
+from typing import Optional
+
+import pytest
+
+from bc_fastkit import schema as schema_module
+from bc_fastkit.schema import (
+    create_default_cru_schema,
+    create_item_cru_schema,
+    create_schema_by_model,
+    warmup_schemas,
+)
+
+from .conftest import BarModel, FooModel
+
+
+def test_cached_cru_schema_is_not_shared_between_callers():
+    first = create_default_cru_schema(FooModel, r_exclude=["memo"])
+    second = create_default_cru_schema(FooModel, r_exclude=["memo"])
+    assert first is not second
+    assert first.R is second.R
+    assert first.QR is second.QR
+    first.QR = first.R
+    assert second.QR is not first.R
+    assert create_default_cru_schema(FooModel, r_exclude=["memo"]).QR is second.QR
+
+
+@pytest.mark.parametrize("default", [True, 1.0, Decimal(1)])
+def test_equal_arguments_of_other_types_build_other_schemas(default):
+    def build(value):
+        return create_schema_by_model(
+            "KeyedFooSchema", FooModel, extra=(Optional[type(value)], value)
+        )
+
+    one = build(1)
+    other = build(default)
+    assert other is not one
+    assert other.model_fields["extra"].default is default
+    assert build(1) is one
+
+
+def test_item_query_response_is_memoized(monkeypatch):
+    monkeypatch.setattr(FooModel, "ITEM_MODEL", BarModel, raising=False)
+    first = create_item_cru_schema(FooModel)
+    second = create_item_cru_schema(FooModel)
+    assert first is not second
+    assert first.ItemQR is second.ItemQR
+    assert first.ItemQR.__name__ == f"Query{first.ItemR.__name__}"
+
+
+def test_warmup_builds_type_adapters():
+    schema_module.clear_schema_cache()
+    schema = create_default_cru_schema(FooModel)
+    assert warmup_schemas() == 4
+    assert schema_module.get_type_adapter.cache_info().currsize == 4
+    for model in schema.models():
+        assert model.__pydantic_complete__
+        schema_module.get_type_adapter(model)
+    assert schema_module.get_type_adapter.cache_info().hits == 4
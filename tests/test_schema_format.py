@@ -0,0 +1,106 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+import pytest
+from pydantic import create_model, field_serializer
+from sqlalchemy import select
+
+from bc_fastkit.schema import (
+    BaseSchema,
+    FDecimal,
+    QueryResponseSchema,
+    RowEncoder,
+    create_default_cru_schema,
+    get_row_encoder,
+)
+
+from .conftest import FooModel
+
+
+class HandWrittenSchema(BaseSchema):
+    amount: Decimal
+    rate: FDecimal
+    created: datetime
+    day: date
+    closed: Optional[datetime] = None
+    history: List[datetime] = []
+    extra: Any = None
+    meta: Dict[str, Any] = {}
+    ratio: Optional[FDecimal] = None
+
+
+def test_hand_written_schema_keeps_wire_format():
+    s = HandWrittenSchema(
+        amount=Decimal("1.23456"),
+        rate=Decimal("2.50000"),
+        created=datetime(2024, 1, 2, 3, 4, 5, 123),
+        day=date(2024, 1, 2),
+        closed=datetime(2024, 1, 1),
+        history=[datetime(2024, 1, 1)],
+        extra=datetime(2024, 1, 2, 3, 4, 5),
+        meta={"at": datetime(2024, 1, 1), "amount": Decimal("1.5")},
+        ratio=Decimal("3.14159"),
+    )
+    # 与原 field_serializer("*") 的输出一致; FDecimal 使用自身的序列化器
+    assert json.loads(s.model_dump_json()) == {
+        "amount": "1.23456",
+        "rate": 2.5,
+        "created": "2024-01-02 03:04:05",
+        "day": "2024-01-02",
+        "closed": "2024-01-01",
+        "history": ["2024-01-01T00:00:00"],
+        "extra": "2024-01-02 03:04:05",
+        "meta": {"at": "2024-01-01T00:00:00", "amount": "1.5"},
+        "ratio": 3.1416,
+    }
+    assert s.model_dump()["created"] == datetime(2024, 1, 2, 3, 4, 5, 123)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (date(2024, 5, 6), "2024-05-06"),
+        (datetime(2024, 5, 6, 7, 8, 9), "2024-05-06 07:08:09"),
+        (Decimal("1.0"), "1.0"),
+        ([datetime(2024, 5, 6)], ["2024-05-06T00:00:00"]),
+        (1, 1),
+    ],
+)
+def test_any_fields_format_only_top_level_times(value, expected):
+    rs = QueryResponseSchema(data_source=[], total=None, query=value, update_time=None)
+    assert json.loads(rs.model_dump_json())["query"] == expected
+
+
+def test_default_schema_and_row_encoder_agree(db):
+    schema = create_default_cru_schema(FooModel).R
+    db.add(FooModel(name="a", price=Decimal("1.5")))
+    db.commit()
+    entity = db.query(FooModel).one()
+    entity.create_time = datetime(2024, 1, 2, 3, 4, 5)
+    entity.update_time = datetime(2024, 1, 2)
+    db.commit()
+    expected = json.loads(schema.model_validate(entity).model_dump_json(by_alias=True))
+    assert Decimal(expected["price"]) == Decimal("1.5")
+    assert expected["createTime"] == "2024-01-02 03:04:05"
+    assert expected["updateTime"] == "2024-01-02"
+
+    encoder = get_row_encoder(schema, FooModel)
+    rows = db.execute(select(*[getattr(FooModel, c) for c in encoder.columns])).all()
+    assert encoder.encode(rows) == [expected]
+
+
+def test_row_encoder_refuses_fields_it_cannot_encode():
+    schema = create_default_cru_schema(FooModel).R
+    unknown = create_model("UnknownFoo", __base__=schema, closed=(Optional[int], None))
+    with pytest.raises(ValueError):
+        RowEncoder(unknown, FooModel)
+
+    class SerializedFoo(schema):
+        @field_serializer("name")
+        def upper(self, value):
+            return value.upper()
+
+    with pytest.raises(ValueError):
+        RowEncoder(SerializedFoo, FooModel)
@@ -0,0 +1,86 @@
+import datetime
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from bc_fastkit.api import CRUDRequestHandler, create_commit_session_router
+from bc_fastkit.common import query
+from bc_fastkit.crud import CRUDBase
+from bc_fastkit.schema import create_default_cru_schema
+
+from .conftest import FooModel, create_test_engine, make_session_dep
+
+CREATE_TIME = datetime.datetime(2024, 1, 2, 3, 4, 5)
+MIDNIGHT = datetime.datetime(2024, 1, 3)
+
+
+class FixedDatetime(datetime.datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2024, 1, 4, 5, 6, 7)
+
+
+@pytest.fixture(autouse=True)
+def fixed_times(monkeypatch):
+    """
+    数据库默认时间精确到秒, 固定为 Python 端的值使两次请求的响应可逐字节比较
+    查询响应的 updateTime 为请求时间, 同样固定
+    """
+    monkeypatch.setattr(query, "datetime", FixedDatetime)
+
+    def before_insert(mapper, connection, target):
+        target.create_time = CREATE_TIME
+        # 零点的时间序列化为日期
+        target.update_time = MIDNIGHT
+
+    event.listen(FooModel, "before_insert", before_insert)
+    yield
+    event.remove(FooModel, "before_insert", before_insert)
+
+
+@pytest.fixture
+def client():
+    """/once 与 /default 除 serialize_once 外相同, 各自使用独立的数据库"""
+    router = create_commit_session_router()
+    schema = create_default_cru_schema(FooModel)
+    engines = []
+    for prefix, serialize_once in (("/once", True), ("/default", False)):
+        engine = create_test_engine()
+        engines.append(engine)
+        router.crud(
+            f"{prefix}/foo",
+            handler=CRUDBase(FooModel),
+            schema=schema,
+            session_dep=make_session_dep(engine),
+            serialize_once=serialize_once,
+        )(type("FooHandler", (CRUDRequestHandler,), {}))
+    app = FastAPI()
+    app.include_router(router)
+    yield TestClient(app)
+    for engine in engines:
+        engine.dispose()
+
+
+def same_response(client, method, path, **kwargs):
+    once = client.request(method, f"/once{path}", **kwargs)
+    default = client.request(method, f"/default{path}", **kwargs)
+    assert once.status_code == default.status_code == 200
+    assert once.content == default.content
+    return once.json()
+
+
+def test_serialize_once_matches_response_model_bytes(client):
+    foo = {"name": "a", "price": "1.23456789", "memo": "m", "extra": {"k": [1, "v"]}}
+    created = same_response(client, "POST", "/foo", json=foo)
+    assert created["createTime"] == "2024-01-02 03:04:05"
+    same_response(client, "POST", "/foo", json={"name": "b"})
+    assert created["updateTime"] == "2024-01-03"
+    same_response(client, "PUT", "/foo", json={"id": created["id"], "price": "9.5"})
+    rs = same_response(client, "GET", "/foo")
+    assert (rs["total"], rs["updateTime"]) == (2, "2024-01-04 05:06:07")
+    q = json.dumps({"name": "a"})
+    rs = same_response(client, "GET", "/foo", params={"q": q, "typ": 1})
+    assert [d["name"] for d in rs["dataSource"]] == ["a"]
@@ -0,0 +1,124 @@
+import asyncio
+
+from sqlalchemy import text, update
+
+from bc_fastkit.api.cancel import (
+    CANCELLABLE_KEY,
+    CONNECTION_THREAD_ID_KEY,
+    STATEMENT_TIMEOUT_KEY,
+)
+from bc_fastkit.crud import AsyncCRUDBase
+from bc_fastkit.crud.core.cud import db_multi_create
+from bc_fastkit.db import create_sibling_session, has_uncommitted_writes, use_primary
+
+from .conftest import FooModel, close_async_test_session, create_async_test_session
+
+
+def test_core_dml_marks_session_written(db):
+    db.execute(text("insert into foo (name) values ('a')"))
+    db.commit()
+    db.execute(update(FooModel).values(name="b"))
+    db.flush()
+    assert has_uncommitted_writes(db)
+    db.commit()
+    assert not has_uncommitted_writes(db)
+
+
+def test_orm_flush_marks_session_written(db):
+    db.add(FooModel(name="a"))
+    db.flush()
+    assert has_uncommitted_writes(db)
+    db.rollback()
+    assert not has_uncommitted_writes(db)
+
+
+def test_bulk_insert_marks_session_written(db):
+    db_multi_create(db, obj_ins=[{"name": "a"}], model=FooModel)
+    assert has_uncommitted_writes(db)
+    db.commit()
+    assert not has_uncommitted_writes(db)
+
+
+class ChunkedFooCRUD(AsyncCRUDBase):
+    gets_chunk_size = 2
+
+
+def spy_concurrent(handler):
+    calls = []
+    gets_concurrently = handler.gets_concurrently
+
+    async def spy(db, chunks):
+        calls.append(chunks)
+        return await gets_concurrently(db, chunks)
+
+    handler.gets_concurrently = spy
+    return calls
+
+
+def test_async_gets_is_sequential_unless_requested_or_after_writes():
+    async def main():
+        db = await create_async_test_session()
+        handler = ChunkedFooCRUD(FooModel)
+        calls = spy_concurrent(handler)
+        for i in range(5):
+            db.add(FooModel(name=f"n{i}"))
+        await db.commit()
+        assert [e.id for e in await handler.gets(db, [5, 4, 3, 2, 1])] == [
+            5,
+            4,
+            3,
+            2,
+            1,
+        ]
+        await db.execute(update(FooModel).values(name="x"))
+        entities = await handler.gets(db, [5, 4, 3, 2, 1], concurrent=True)
+        assert [e.id for e in entities] == [5, 4, 3, 2, 1]
+        assert {e.name for e in entities} == {"x"}
+        assert calls == []
+        await close_async_test_session(db)
+
+    asyncio.run(main())
+
+
+def test_async_gets_concurrently_inside_transaction_keeps_session_identities():
+    async def main():
+        db = await create_async_test_session()
+        handler = ChunkedFooCRUD(FooModel)
+        calls = spy_concurrent(handler)
+        for i in range(5):
+            db.add(FooModel(name=f"n{i}"))
+        await db.commit()
+        # 批量补全的典型场景: 主查询之后(事务已开始)再按 id 查询
+        loaded = await handler.get(db, 1)
+        assert db.in_transaction()
+        async with db.bind.begin() as conn:
+            await conn.execute(text("update foo set name = 'changed'"))
+        entities = await handler.gets_dict(db, [5, 4, 3, 2, 1], concurrent=True)
+        assert calls == [[[5, 4], [3, 2], [1]]]
+        assert list(entities) == [5, 4, 3, 2, 1]
+        assert entities[1] is loaded
+        assert loaded.name == "n0"
+        assert {entities[i].name for i in (2, 3, 4, 5)} == {"changed"}
+        await close_async_test_session(db)
+
+    asyncio.run(main())
+
+
+def test_sibling_session_inherits_info():
+    async def main():
+        db = await create_async_test_session()
+        use_primary(db)
+        db.info[STATEMENT_TIMEOUT_KEY] = 3
+        db.info[CANCELLABLE_KEY] = True
+        db.info[CONNECTION_THREAD_ID_KEY] = {}
+        db.add(FooModel(name="a"))
+        await db.flush()
+        sibling = create_sibling_session(db)
+        assert sibling.info[STATEMENT_TIMEOUT_KEY] == 3
+        assert CANCELLABLE_KEY not in sibling.info
+        assert CONNECTION_THREAD_ID_KEY not in sibling.info
+        assert not has_uncommitted_writes(sibling)
+        await sibling.close()
+        await close_async_test_session(db)
+
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from bc_fastkit.crud import CRUDBase
+from bc_fastkit.db import RoutingSession
+from bc_fastkit.utils import AsyncSingleFlight
+
+from .conftest import FooModel
+
+
+def test_leader_cancellation_does_not_cancel_followers():
+    async def main():
+        flight = AsyncSingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await release.wait()
+            return "rs"
+
+        leader = asyncio.create_task(flight.do("k", fn))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", fn))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await follower == ("rs", True)
+        assert leader.cancelled()
+        assert calls == [1]
+        assert flight._calls == {}
+
+    asyncio.run(main())
+
+
+def test_exception_is_shared_and_key_released():
+    async def main():
+        flight = AsyncSingleFlight()
+        release = asyncio.Event()
+
+        async def fn():
+            await release.wait()
+            raise ValueError("boom")
+
+        callers = [asyncio.create_task(flight.do("k", fn)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert all(isinstance(e, ValueError) for e in results)
+        assert flight.shared == 2
+        assert flight._calls == {}
+
+    asyncio.run(main())
+
+
+class CoalescedFooCRUD(CRUDBase):
+    coalesce_search = True
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    used = []
+    do_search_limit = CoalescedFooCRUD.do_search_limit
+
+    def record(self, db, q, **kwargs):
+        used.append(db)
+        return do_search_limit(self, db, q, **kwargs)
+
+    monkeypatch.setattr(CoalescedFooCRUD, "do_search_limit", record)
+    return used
+
+
+def test_lean_search_runs_in_sibling_session(db, sessions):
+    handler = CoalescedFooCRUD(FooModel)
+    db.add(FooModel(name="a"))
+    db.commit()
+    data, total = handler.search_limit(db, {}, lean=True, columns=["id", "name"])
+    assert total == 1
+    assert [tuple(row) for row in data] == [(1, "a")]
+    assert sessions[0] is not db
+
+
+def test_entities_and_uncommitted_writes_are_not_coalesced(db, sessions):
+    handler = CoalescedFooCRUD(FooModel)
+    db.add(FooModel(name="a"))
+    db.commit()
+    handler.search_limit(db, {})
+    db.add(FooModel(name="b"))
+    db.flush()
+    data, total = handler.search_limit(db, {}, lean=True, columns=["name"])
+    assert total == 2
+    assert sessions == [db, db]
+
+
+def test_search_with_binds_only_is_coalesced(engine, sessions):
+    handler = CoalescedFooCRUD(FooModel)
+    # 仅配置 binds 的 session(bind 为 None)同样可以创建独立 session
+    with RoutingSession(binds={FooModel: engine}) as db:
+        db.add(FooModel(name="a"))
+        db.commit()
+        data, total = handler.search_limit(db, {}, lean=True, columns=["name"])
+    assert total == 1
+    assert sessions[0] is not db
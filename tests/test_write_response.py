@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import text
+
+from bc_fastkit.api import create_commit_session_router
+from bc_fastkit.api.base import WRITE_RESPONSE_ENTITY
+from bc_fastkit.crud import AsyncCRUDBase, CRUDBase
+
+from .conftest import FooModel, close_async_test_session, create_async_test_session
+
+# sqlite 没有 ON UPDATE, 用触发器模拟数据库维护的 update_time
+ON_UPDATE_TRIGGER = (
+    "create trigger foo_on_update after update of name on foo begin"
+    " update foo set update_time = '2030-01-01 00:00:00' where id = new.id; end"
+)
+UPDATED_AT = datetime(2030, 1, 1)
+
+
+def test_update_returns_database_maintained_columns(db):
+    db.execute(text(ON_UPDATE_TRIGGER))
+    handler = CRUDBase(FooModel)
+    entity = handler.create(db, obj_in={"name": "a"})
+    assert entity.update_time != UPDATED_AT
+    assert (
+        handler.update(db, obj_in={"id": entity.id, "name": "b"}).update_time
+        == UPDATED_AT
+    )
+
+
+def test_async_update_returns_database_maintained_columns():
+    async def main():
+        db = await create_async_test_session()
+        await db.execute(text(ON_UPDATE_TRIGGER))
+        handler = AsyncCRUDBase(FooModel)
+        entity = await handler.create(db, obj_in={"name": "a"})
+        updated = await handler.update(db, obj_in={"id": entity.id, "name": "b"})
+        assert updated.update_time == UPDATED_AT
+        await close_async_test_session(db)
+
+    asyncio.run(main())
+
+
+def test_entity_write_response_has_fresh_update_time(engine, crud_client):
+    with engine.begin() as conn:
+        conn.execute(text(ON_UPDATE_TRIGGER))
+    client, _ = crud_client(
+        router=create_commit_session_router(),
+        session_kwargs={"expire_on_commit": False},
+        write_response=WRITE_RESPONSE_ENTITY,
+    )
+    id = client.post("/foo", json={"name": "a"}).json()["id"]
+    rs = client.put("/foo", json={"id": id, "name": "b"}).json()
+    assert (rs["name"], rs["updateTime"]) == ("b", "2030-01-01")